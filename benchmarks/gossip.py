@@ -0,0 +1,99 @@
+"""
+Consensus latency of a mark_3 node as the number of peers grows, asking
+the peers one at a time against all together
+
+Every peer is a local HTTP server answering GET /chain after a fixed
+latency, one peer in ten never answers.
+
+Run with: python -m benchmarks.gossip [latency in ms]
+"""
+import json
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from blockchains.mark_3 import app
+from blockchains.mark_3.blockchain import Blockchain
+
+
+PEER_COUNTS = (1, 5, 10, 25, 50)
+TIMEOUT = 1
+DEADLINE = 2
+
+
+def make_handler(body, latency, dead):
+
+    class ChainHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if dead:
+                # Hang up after the client gave up waiting
+                time.sleep(TIMEOUT * 2)
+                return
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ChainHandler
+
+
+def start_peers(number, body, latency):
+    """
+    :return: The running servers
+    """
+    servers = []
+    for peer in range(number):
+        handler = make_handler(body, latency, dead=peer % 10 == 9)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def measure(nodes, max_workers):
+    """
+    :return: Seconds for a consensus round
+    """
+    blockchain = Blockchain()
+    start_time = time.perf_counter()
+    chains = app.do_gossip(nodes,
+                           timeout=TIMEOUT,
+                           deadline=DEADLINE if max_workers > 1 else None,
+                           max_workers=max_workers)
+    blockchain.evaluate_consensus(chains)
+    return time.perf_counter() - start_time
+
+
+def main(latency=20):
+    peer_blockchain = Blockchain()
+    for block in range(10):
+        peer_blockchain.add_transaction(f'Transaction {block}')
+        peer_blockchain.mine()
+    body = json.dumps({'chain': [block.to_dict()
+                                 for block in peer_blockchain.get_chain()],
+                       'is_valid': True}).encode()
+
+    print(f'{"peers":>5} {"one at a time":>14} {"parallel":>9}')
+    for peer_count in PEER_COUNTS:
+        servers = start_peers(peer_count, body, latency / 1000)
+        nodes = [f'127.0.0.1:{server.server_address[1]}'
+                 for server in servers]
+        sequential = measure(nodes, max_workers=1)
+        parallel = measure(nodes, max_workers=app.GOSSIP_MAX_WORKERS)
+        print(f'{peer_count:>5} {sequential * 1000:>12.0f}ms '
+              f'{parallel * 1000:>7.0f}ms')
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
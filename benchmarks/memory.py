@@ -0,0 +1,58 @@
+"""
+Memory taken by the blocks of a chain, in bytes per Block, with blocks
+and transactions as plain dicts against the slotted Block and
+Transaction classes
+
+Run with: python -m benchmarks.memory [blocks]
+"""
+import sys
+import tracemalloc
+
+from blockchains.mark_1.block import Block
+from blockchains.mark_1.transaction import Transaction
+
+
+def dict_blocks(number, transactions):
+    return [{
+        'index': index,
+        'timestamp': 1231006505.0,
+        'transactions': [{'data': 'Transaction'}
+                         for transaction in range(transactions)],
+        'previous_hash': 64 * 'a',
+    } for index in range(number)]
+
+
+def slotted_blocks(number, transactions):
+    return [Block({
+        'index': index,
+        'timestamp': 1231006505.0,
+        'transactions': [Transaction(data='Transaction')
+                         for transaction in range(transactions)],
+        'previous_hash': 64 * 'a',
+    }) for index in range(number)]
+
+
+def measure(make_blocks, number, transactions):
+    """
+    :return: Bytes allocated per Block
+    """
+    tracemalloc.start()
+    blocks = make_blocks(number, transactions)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del blocks
+    return allocated / number
+
+
+def main(blocks=100000):
+    print(f'{"transactions":>12} {"dict":>10} {"slotted":>10} {"saved":>7}')
+    for transactions in (1, 10, 100):
+        number = max(blocks // transactions, 1)
+        before = measure(dict_blocks, number, transactions)
+        after = measure(slotted_blocks, number, transactions)
+        print(f'{transactions:>12} {before:>10.0f} {after:>10.0f} '
+              f'{1 - after / before:>6.0%}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
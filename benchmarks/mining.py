@@ -0,0 +1,105 @@
+"""
+Proof of Work mining throughput, in hashes per second per core, and
+nonce trials per second of the midstate hasher against hashing the
+whole serialized Block for each nonce, on a legacy Block and on the
+header of a Merkle Block as the Blockchain mines it
+
+Run with: python -m benchmarks.mining [attempts per process]
+"""
+import multiprocessing
+import sys
+import time
+
+from blockchains.mark_1 import mining
+from blockchains.mark_1 import validation
+
+
+# Nothing solves it: every worker tries exactly its share of attempts
+UNSOLVABLE_DIFFICULTY = 256
+
+
+def sample_block(transactions=100, merkle=False):
+    block = {
+        'index': 2,
+        'timestamp': 1231006505.0,
+        'transactions': [{'data': f'Transaction {transaction}'}
+                         for transaction in range(transactions)],
+        'previous_hash': 64 * 'a',
+    }
+    if merkle:
+        block['merkle_root'] = validation.get_merkle_root(
+            block['transactions'])
+    return block
+
+
+def measure(processes, attempts, block):
+    """
+    Time a fixed number of nonce attempts for each process
+
+    :param processes: Number of worker processes
+    :param attempts: Attempts per process
+    :param block: Block to mine
+    :return: Hashes per second, in total
+    """
+    tasks = [(block, UNSOLVABLE_DIFFICULTY, first, processes, attempts)
+             for first in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        start_time = time.perf_counter()
+        pool.map(mining._search_worker, tasks)
+        elapsed_time = time.perf_counter() - start_time
+    return processes * attempts / elapsed_time
+
+
+def measure_full_block_hashing(attempts, block):
+    """
+    Time a fixed number of nonce attempts serializing the whole Block
+
+    :param attempts: Attempts
+    :param block: Block to mine
+    :return: Hashes per second
+    """
+    block = dict(block)
+    start_time = time.perf_counter()
+    for nonce in range(attempts):
+        block['nonce'] = nonce
+        validation.get_hash_of(block)
+    return attempts / (time.perf_counter() - start_time)
+
+
+def measure_midstate_hashing(attempts, block):
+    """
+    Time a fixed number of nonce attempts with the midstate hasher
+
+    :param attempts: Attempts
+    :param block: Block to mine
+    :return: Hashes per second
+    """
+    start_time = time.perf_counter()
+    mining.search_nonces(block, UNSOLVABLE_DIFFICULTY, attempts=attempts)
+    return attempts / (time.perf_counter() - start_time)
+
+
+def main(attempts=20000):
+    print(f'{"transactions":>12} {"full block":>12} {"midstate":>12} '
+          f'{"speedup":>8} {"merkle":>12} {"speedup":>8}')
+    for transactions in (1, 10, 100, 1000):
+        block = sample_block(transactions)
+        full_block = measure_full_block_hashing(attempts // 10, block)
+        midstate = measure_midstate_hashing(attempts // 10, block)
+        merkle = measure_midstate_hashing(attempts // 10,
+                                          sample_block(transactions, True))
+        print(f'{transactions:>12} {full_block:>12.0f} {midstate:>12.0f} '
+              f'{midstate / full_block:>7.1f}x {merkle:>12.0f} '
+              f'{merkle / full_block:>7.1f}x')
+    print()
+
+    block = sample_block(merkle=True)
+    print(f'{"processes":>9} {"hashes/s":>12} {"hashes/s/core":>14}')
+    for processes in range(1, multiprocessing.cpu_count() + 1):
+        hashes_per_second = measure(processes, attempts, block)
+        print(f'{processes:>9} {hashes_per_second:>12.0f} '
+              f'{hashes_per_second / processes:>14.0f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
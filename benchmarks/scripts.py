@@ -0,0 +1,46 @@
+"""
+Scripting VM: transactions per second sharing one locking script, with
+the compiled-script cache and compiling every script again
+
+Run with: python -m benchmarks.scripts [transactions]
+"""
+import sys
+import time
+
+from blockchains.mark_2.blockchain import Blockchain
+
+
+UNLOCK_SCRIPT = 'signature = "{}"'
+
+LOCK_SCRIPT = '''
+keys = {'alice': 'a1', 'bob': 'b2', 'carol': 'c3'}
+owners = sorted(name for name, key in keys.items() if key == signature)
+output = owners[0] if owners else None
+'''
+
+
+def measure(transactions, script_cache_size):
+    """
+    :return: Transactions added per second
+    """
+    blockchain = Blockchain(script_cache_size=script_cache_size)
+    start_time = time.perf_counter()
+    for transaction in range(transactions):
+        blockchain.add_transaction(
+            UNLOCK_SCRIPT.format(('a1', 'b2', 'c3', 'x')[transaction % 4]),
+            LOCK_SCRIPT)
+    elapsed_time = time.perf_counter() - start_time
+    return transactions / elapsed_time, blockchain.script_cache.get_stats()
+
+
+def main(transactions=20000):
+    uncached, _ = measure(transactions, 0)
+    cached, stats = measure(transactions, 256)
+    print(f'{transactions} transactions')
+    print(f'compiled every time: {uncached:.0f}/s')
+    print(f'compiled once: {cached:.0f}/s, speedup: {cached / uncached:.1f}x')
+    print(f'cache: {stats}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
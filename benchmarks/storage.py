@@ -0,0 +1,89 @@
+"""
+Block store reads: cold start time, block-by-index lookups and the
+/chain body built from the raw bytes against decoding and encoding again
+
+Run with: python -m benchmarks.storage [blocks]
+"""
+import json
+import random
+import sys
+import tempfile
+import time
+
+from blockchains.mark_1.block import Block
+from blockchains.mark_1.storage import BlockStore
+
+
+def sample_blocks(number, transactions=10):
+    previous_hash = '0'
+    for index in range(1, number + 1):
+        block = Block({
+            'index': index,
+            'timestamp': 1231006505.0 + index,
+            'transactions': [{'data': f'Transaction {transaction}'}
+                             for transaction in range(transactions)],
+            'previous_hash': previous_hash,
+        })
+        previous_hash = block.hash
+        yield block
+
+
+def measure_cold_start(path):
+    """
+    :return: Seconds to open a store
+    """
+    start_time = time.perf_counter()
+    store = BlockStore(path)
+    elapsed_time = time.perf_counter() - start_time
+    store.close()
+    return elapsed_time
+
+
+def measure_lookups(store, lookups):
+    """
+    :return: Block-by-index lookups per second
+    """
+    positions = [random.randrange(len(store)) for _ in range(lookups)]
+    start_time = time.perf_counter()
+    for position in positions:
+        store.read_raw(position)
+    return lookups / (time.perf_counter() - start_time)
+
+
+def measure_raw_chain_body(store):
+    """
+    :return: Seconds to build the chain body joining the raw blocks
+    """
+    start_time = time.perf_counter()
+    b'{"chain": [' + b', '.join(store.iter_raw()) + b']}'
+    return time.perf_counter() - start_time
+
+
+def measure_decoded_chain_body(store):
+    """
+    :return: Seconds to build the chain body decoding every Block
+    """
+    start_time = time.perf_counter()
+    json.dumps({'chain': [block.to_dict() for block in store]}).encode()
+    return time.perf_counter() - start_time
+
+
+def main(blocks=100000):
+    with tempfile.TemporaryDirectory() as path:
+        with BlockStore(path, sync_every=10000) as store:
+            store.extend(sample_blocks(blocks))
+
+        print(f'{blocks} blocks')
+        print(f'cold start: {measure_cold_start(path) * 1000:.2f} ms')
+        with BlockStore(path) as store:
+            lookups = measure_lookups(store, 100000)
+            print(f'lookups by index: {lookups:.0f}/s')
+            raw = measure_raw_chain_body(store)
+            decoded = measure_decoded_chain_body(store)
+            print(f'chain body, raw: {raw * 1000:.0f} ms, '
+                  f'decoded: {decoded * 1000:.0f} ms, '
+                  f'speedup: {decoded / raw:.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
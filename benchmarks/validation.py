@@ -0,0 +1,72 @@
+"""
+Validation of the candidate chains collected by the consensus: blocks
+per second checking the links sequentially and split into segments
+across a pool of processes, by number of processes
+
+Run with: python -m benchmarks.validation [blocks] [candidates]
+"""
+import multiprocessing
+import sys
+import time
+
+from blockchains.mark_1 import validation
+
+
+def sample_chain(number, transactions=10):
+    """
+    A chain as received from a peer, plain dicts never hashed before
+    """
+    chain = []
+    previous_hash = '0'
+    for index in range(1, number + 1):
+        block = {
+            'index': index,
+            'timestamp': 1231006505.0 + index,
+            'transactions': [{'data': f'Transaction {transaction}'}
+                             for transaction in range(transactions)],
+            'previous_hash': previous_hash,
+        }
+        previous_hash = validation.get_hash_of(block)
+        chain.append(block)
+    return chain
+
+
+def measure_sequential(chains):
+    """
+    :return: Seconds to check every chain in turn, in process
+    """
+    start_time = time.perf_counter()
+    for chain in chains:
+        assert validation.find_invalid_link(chain) is None
+    return time.perf_counter() - start_time
+
+
+def measure_parallel(chains, processes):
+    """
+    :return: Seconds to check every chain across a pool of processes
+    """
+    start_time = time.perf_counter()
+    positions = validation.find_invalid_links(chains, processes)
+    elapsed_time = time.perf_counter() - start_time
+    assert positions == [None] * len(chains)
+    return elapsed_time
+
+
+def main(blocks=20000, candidates=1):
+    chains = [sample_chain(blocks) for _ in range(candidates)]
+    total_blocks = blocks * candidates
+    sequential = measure_sequential(chains)
+    print(f'{candidates} x {blocks} blocks, '
+          f'{multiprocessing.cpu_count()} cores')
+    print(f'{"processes":>9} {"blocks/s":>10} {"speedup":>8}')
+    print(f'{"-":>9} {total_blocks / sequential:>10.0f} {1:>7.1f}x')
+    processes = 2
+    while processes <= max(multiprocessing.cpu_count(), 2):
+        parallel = measure_parallel(chains, processes)
+        print(f'{processes:>9} {total_blocks / parallel:>10.0f} '
+              f'{sequential / parallel:>7.1f}x')
+        processes *= 2
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
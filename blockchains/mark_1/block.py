@@ -0,0 +1,169 @@
+from collections.abc import MutableMapping
+
+from . import encoding
+from . import validation
+from .transaction import BaseTransaction, TransactionList
+
+
+# Keys of the Block schemas, kept in slots
+FIELDS = (
+    'index',
+    'timestamp',
+    'transactions',
+    'previous_hash',
+    'merkle_root',
+    'nonce',
+)
+_FIELDS = frozenset(FIELDS)
+
+
+class Block(MutableMapping):
+    """
+    A sealed Block of the Blockchain
+
+    Its fields are kept in slots instead of a dict per Block, any other
+    key in a small dict on the side. It reads and writes like a dict and
+    to_dict() returns the plain dict it is hashed and serialized as.
+    It memoizes its own hash and, until the hash is known, the encoded
+    text of its transactions.
+    Any change, made through the mapping interface or to the nested
+    transactions, drops the memoized hash and calls on_change, e.g. set by
+    the Blockchain holding the Block to forget what it validated.
+    """
+
+    __slots__ = FIELDS + ('_extra', '_hash', '_encoded_transactions',
+                          'on_change', )
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        self._hash = None
+        self._encoded_transactions = None
+        # Function without arguments called on any change
+        self.on_change = None
+        self.update(*args, **kwargs)
+
+    def __reduce__(self):
+        # Copies and pickles carry the content only, the hash is recomputed
+        return (self.__class__, (dict(self), ))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+    # Mapping interface
+
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        self._invalidate_key(key)
+        if key == 'transactions' and isinstance(value, list):
+            # Their changes drop the memoized hash too
+            value = TransactionList(value, self.invalidate_hash)
+        if key in _FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+        self._invalidate_key(key)
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        """
+        Return the Block as a plain dict, hashing as the Block does
+
+        :return: The dict, with the transactions as plain dicts too
+        """
+        block = dict(self)
+        if 'transactions' in block:
+            block['transactions'] = [
+                transaction.to_dict()
+                if isinstance(transaction, BaseTransaction) else
+                dict(transaction) if isinstance(transaction, dict) else
+                transaction
+                for transaction in block['transactions']
+            ]
+        return block
+
+    # Memoization
+
+    @property
+    def hash(self):
+        """
+        Return the SHA-256 hash of the Block, computed once and memoized
+        """
+        if self._hash is None:
+            if validation.is_a_merkle_block(self):
+                # Only the header is hashed
+                self._hash = validation.get_hash_of(self)
+            else:
+                self._hash = validation.get_hash_of(self,
+                                                    self.encoded_transactions)
+                # Not worth its memory once the hash is known
+                self._encoded_transactions = None
+        return self._hash
+
+    @property
+    def encoded_transactions(self):
+        """
+        Return the canonical text of the transactions, encoded once
+        """
+        if self._encoded_transactions is None and 'transactions' in self:
+            self._encoded_transactions = encoding.encode_transactions(
+                self['transactions'])
+        return self._encoded_transactions
+
+    def invalidate_hash(self):
+        """
+        Drop the memoized hash, it will be computed again when needed
+        """
+        self._hash = None
+        self._encoded_transactions = None
+        self._changed()
+
+    def _invalidate_key(self, key):
+        """
+        Drop what is memoized about a single key of the Block
+
+        :param key: The changed key
+        """
+        if key == 'transactions':
+            self.invalidate_hash()
+        else:
+            # The encoded transactions are still good
+            self._hash = None
+            self._changed()
+
+    def _changed(self):
+        on_change = self.on_change
+        if on_change is not None:
+            on_change()
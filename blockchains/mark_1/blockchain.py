@@ -1,59 +1,350 @@
+from collections.abc import Mapping
 from time import time
 
+from . import mining
+from . import ndjson
 from . import validation
+from .block import Block
+from .chain_index import ChainIndex
+from .mempool import Mempool
+from .storage import BlockStore
+from .transaction import Transaction
 
 
 class Blockchain:
-    def __init__(self):
-        self._chain = []
-        self.current_transactions = []
+    # Arguments of add_transaction, the fields of a submitted transaction
+    transaction_fields = ('data', )
+
+    def __init__(self,
+                 merkle=False,
+                 difficulty=0,
+                 mining_processes=1,
+                 store=None,
+                 mempool=None,
+                 block_size=None):
+        """
+        :param merkle: Seal the blocks in the Merkle format, with a header
+                       committing to the transactions through their root
+        :param difficulty: Proof of Work difficulty, as the number of
+                           leading zero bits required in every block hash.
+                           The blocks with a Proof of Work are always
+                           sealed in the Merkle format
+        :param mining_processes: Number of processes searching the nonce
+        :param store: BlockStore persisting the chain, kept in memory if
+                      not given
+        :param mempool: Mempool of the pending transactions, unbounded if
+                        not given
+        :param block_size: Maximum number of transactions in a new Block,
+                           every pending one if None
+        """
+        self._chain_index = None
+        self._chain = store if store is not None else []
+        self._mempool = mempool if mempool is not None else Mempool()
+        self.block_size = block_size
         self.genesis_previous_hash = '0'
+        self.merkle = merkle
+        self.difficulty = difficulty
+        self.mining_processes = mining_processes
+
+        # Create the genesis block, unless the stored chain already has it
+        if not len(self._blocks):
+            self.mine()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # The blocks of a copy report their changes to the copy
+        if not isinstance(self._blocks, BlockStore):
+            self._watch_blocks(self._blocks)
+
+    @property
+    def _chain(self):
+        """
+        Return the raw list of blocks
+
+        Whoever reaches for it can change it, so the validation watermark
+        is dropped and the next check starts again from the genesis block.
+        """
+        self._reset_validation()
+        return self._blocks
+
+    @_chain.setter
+    def _chain(self, chain):
+        """
+        Replace the raw list of blocks, dropping the validation watermark
+
+        A persisted chain is rewritten in its store.
+
+        :param chain: The new list of blocks
+        """
+        blocks = getattr(self, '_blocks', None)
+        if isinstance(blocks, BlockStore) and chain is not blocks:
+            blocks.replace(chain)
+        else:
+            self._blocks = chain
+            if not isinstance(chain, BlockStore):
+                self._watch_blocks(chain)
+        self._reset_validation()
 
-        # Create the genesis block
-        self.mine()
+    @property
+    def difficulty(self):
+        """
+        Return the Proof of Work difficulty, 0 if mining without work
+        """
+        return self._difficulty
+
+    @difficulty.setter
+    def difficulty(self, difficulty):
+        """
+        Set the Proof of Work difficulty of a new Blockchain
+
+        The blocks don't record the difficulty they were mined at, so it
+        can't change once the chain has blocks: they would be validated
+        against a target they were not mined for.
+
+        :param difficulty: Number of leading zero bits, from 0 to 256
+        """
+        if not 0 <= difficulty <= mining.MAX_DIFFICULTY:
+            raise ValueError(f'Difficulty out of range 0-'
+                             f'{mining.MAX_DIFFICULTY}: {difficulty}')
+        if (difficulty != getattr(self, '_difficulty', difficulty) and
+                len(self._blocks)):
+            raise ValueError('The difficulty of a chain with blocks can\'t '
+                             'change')
+        self._difficulty = difficulty
+        self._reset_validation()
+
+    @property
+    def current_transactions(self):
+        """
+        Return the Mempool of the transactions waiting to be mined
+        """
+        return self._mempool
+
+    @current_transactions.setter
+    def current_transactions(self, transactions):
+        """
+        Replace the pending transactions, keeping the Mempool settings
+
+        :param transactions: Iterable of transactions
+        """
+        if transactions is not self._mempool:
+            self._mempool.clear()
+            self._mempool.extend(transactions)
 
     @property
     def genesis_block(self):
         """
         Return the Genesis Block of the Blockchain
         """
-        return self._chain[0] if len(self._chain) else None
+        return self._blocks[0] if len(self._blocks) else None
 
     @property
     def last_block(self):
         """
         Return the last Block of the Blockchain
         """
-        return self._chain[-1] if len(self._chain) else None
+        return self._blocks[-1] if len(self._blocks) else None
 
     def is_valid(self):
         """
         Determine the blockchain is valid
 
+        Only the blocks appended since the last successful check are
+        validated, using their memoized hashes: the blocks below the
+        watermark are trusted as long as the last of them still hashes to
+        the cached value. Otherwise every Block is hashed again.
+
         :return: True if valid, False if not
         """
-        return validation.is_a_valid_chain(self._chain)
+        watermark = self._check_chain()
+        if watermark is None:
+            self._reset_validation()
+            return False
+
+        self._validated_height, self._validated_hash = watermark
+        return True
+
+    def _check_chain(self):
+        """
+        Validate the blocks appended since the last successful check,
+        without moving the watermark
+
+        :return: The new watermark, as the height of the chain and the
+                 hash of its last Block, None if not valid
+        """
+        chain = self._blocks
+        height = self.get_validated_height()
+        if height:
+            start, hash_of = height, self.get_hash_of
+        else:
+            start, hash_of = 1, validation.get_hash_of
+
+        if validation.find_invalid_link(
+                chain,
+                start=start,
+                hash_of=hash_of,
+                difficulty=self.difficulty) is not None:
+            return None
+        return (len(chain),
+                self.get_hash_of(chain[-1]) if len(chain) else None)
+
+    def get_validated_height(self):
+        """
+        Return the height up to which the chain is known to be valid,
+        from the last check only, without validating anything
+
+        :return: Number of blocks below the validated watermark, 0 if the
+                 watermark doesn't hold anymore
+        """
+        chain = self._blocks
+        height = self._validated_height
+        if (0 < height <= len(chain) and
+                self.get_hash_of(chain[height - 1]) == self._validated_hash):
+            return height
+        return 0
+
+    def _reset_validation(self):
+        """
+        Forget the validated watermark and the lookup index of the chain
+        """
+        self._validated_height = 0
+        self._validated_hash = None
+        self._chain_index = None
+
+    def _watch_blocks(self, blocks):
+        """
+        Forget what was validated as soon as one of the blocks changes,
+        e.g. one returned by get_chain(): the blocks are not copied
+
+        :param blocks: Iterable of the blocks of the chain
+        """
+        on_change = self._reset_validation
+        for block in blocks:
+            if isinstance(block, Block):
+                block.on_change = on_change
+
+    @property
+    def _index(self):
+        """
+        Return the lookup index of the blocks and transactions by hash
+
+        It is built from the chain the first time it is needed, and again
+        after the chain was changed from outside. It is published once
+        complete, readers never see it half built.
+        """
+        index = self._chain_index
+        if index is None:
+            index = ChainIndex()
+            self._fill_index(index, self._blocks)
+            self._chain_index = index
+        return index
+
+    def _update_index(self, height, blocks, block_hashes=None):
+        """
+        Roll the lookup index back to a height, then forward with the
+        blocks appended after it, if the index is built
+
+        :param height: Number of blocks kept in the index
+        :param blocks: Iterable of the new blocks
+        :param block_hashes: Iterable of their hashes, when already known
+        """
+        index = self._chain_index
+        if index is None:
+            return
+        index.truncate(height)
+        self._fill_index(index, blocks, block_hashes)
+
+    def _fill_index(self, index, blocks, block_hashes=None):
+        """
+        Append blocks to a lookup index
+
+        :param index: ChainIndex
+        :param blocks: Iterable of the blocks
+        :param block_hashes: Iterable of their hashes, when already known
+        """
+        if block_hashes is None:
+            block_hashes = (self.get_hash_of(block) for block in blocks)
+        for block, block_hash in zip(blocks, block_hashes):
+            index.append(block_hash,
+                         (validation.get_transaction_hash(transaction)
+                          for transaction in block['transactions']))
 
     def get_chain(self):
         """
         Return the chain with the blocks in the right order
 
+        Changing one of its blocks, even a transaction of it, drops the
+        validated watermark: the chain is validated again as a whole.
+
         :return: The chain
         """
-        return self._chain
+        return self._blocks
+
+    def export(self, from_index=1, to_index=None):
+        """
+        Export a range of the chain as NDJSON, one Block per line
+
+        :param from_index: Index of the first Block, from 1 for the genesis
+        :param to_index: Index of the last Block, the last one if None
+        :return: Generator of lines, as bytes
+        """
+        return ndjson.dump_blocks(self._blocks,
+                                  max(from_index, 1) - 1,
+                                  to_index)
 
     def add_transaction(self, data):
         """
         Creates a new transaction to go into the next mined Block
 
         :param data: Data
-        :return: The transaction
+        :return: The pending transaction, None if the Mempool is full
+        """
+        return self._mempool.add(Transaction(data=data))
+
+    def add_transactions(self, items):
+        """
+        Creates many transactions to go into the next mined Block
+
+        Every item is checked first: the valid ones are added in order,
+        the others are reported by their position.
+
+        :param items: Iterable of dicts with the arguments of
+                      add_transaction
+        :return: The added transactions and the dict of errors, by
+                 position of the item
+        """
+        fields = self.transaction_fields
+        arguments = []
+        errors = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, Mapping):
+                errors[position] = 'Not an object'
+            elif not all(field in item for field in fields):
+                errors[position] = 'Missing values'
+            else:
+                argument = {field: item[field] for field in fields}
+                error = self._check_transaction_arguments(argument)
+                if error is None:
+                    arguments.append((position, argument))
+                else:
+                    errors[position] = error
+        transactions = []
+        for position, argument in arguments:
+            transaction = self.add_transaction(**argument)
+            if transaction is None:
+                errors[position] = 'Mempool full'
+            else:
+                transactions.append(transaction)
+        return transactions, dict(sorted(errors.items()))
+
+    def _check_transaction_arguments(self, arguments):
+        """
+        Check the arguments of add_transaction given for a new transaction
+
+        :param arguments: dict of the arguments, by field
+        :return: The error or None if valid
         """
-        transaction = {
-            'data': data,
-        }
-        self.current_transactions.append(transaction)
-        return transaction
+        return None
 
     def mine(self):
         """
@@ -61,7 +352,7 @@ class Blockchain:
 
         :return: The created block
         """
-        if not len(self._chain):
+        if not len(self._blocks):
             return self._create_genesis_block()
         elif self.is_valid():
             return self._new_block()
@@ -74,7 +365,7 @@ class Blockchain:
 
         :return: New Block or None if Blockchain not empty
         """
-        if not len(self._chain):
+        if not len(self._blocks):
             previous_hash = self.genesis_previous_hash
             genesis_block_data = {
                 'data': ('The Times 03/Jan/2009 ' +
@@ -94,26 +385,151 @@ class Blockchain:
         :return: New Block or None if no current transactions
         """
 
-        if (len(self.current_transactions)):
-            block = {
-                'index': len(self._chain) + 1,
-                'timestamp': time(),
-                'transactions': self.current_transactions,
-                'previous_hash': (previous_hash or
-                                  self.get_hash_of(self.last_block)),
-            }
-
-            # Reset the current list of transactions
-            self.current_transactions = []
-
-            self._chain.append(block)
+        if (len(self._mempool)):
+            block = self._assemble_block(previous_hash)
+            self._seal_block(block)
+            self._append_block(block)
             return block
         return None
 
+    def _assemble_block(self, previous_hash=None):
+        """
+        Create the next Block with the oldest current transactions, removed
+        from the pending ones, without its Proof of Work
+
+        :param previous_hash: Hash of previous Block
+        :return: New Block
+        """
+        block = Block({
+            'index': len(self._blocks) + 1,
+            'timestamp': time(),
+            # At most block_size transactions, the oldest ones
+            'transactions': self._mempool.take(self.block_size),
+            'previous_hash': (previous_hash or
+                              self.get_hash_of(self.last_block)),
+        })
+        # The nonce is searched on the header only: in the legacy format
+        # the transactions are encoded after it, hashed again on every try
+        if self.merkle or self.difficulty:
+            block['merkle_root'] = validation.get_merkle_root(
+                block['transactions'])
+        return block
+
+    def _seal_block(self, block, stop_event=None):
+        """
+        Search the nonce solving the Proof of Work of a new Block
+
+        :param block: New Block
+        :param stop_event: Event cancelling the search once set
+        :return: True if sealed, False if cancelled
+        """
+        if self.difficulty:
+            nonce = mining.search_nonce(block,
+                                        self.difficulty,
+                                        self.mining_processes,
+                                        stop_event)
+            if nonce is None:
+                return False
+            block['nonce'] = nonce
+        return True
+
+    def _append_block(self, block):
+        """
+        Append a new Block to the Blockchain
+
+        :param block: New Block
+        """
+        self._blocks.append(block)
+        self._watch_blocks((block, ))
+        self._update_index(len(self._blocks) - 1, (block, ))
+
     def get_hash_of(self, block):
         """
         Creates a SHA-256 hash of a Block
 
+        Sealed blocks return their memoized hash.
+
         :param block: block
         """
+        if isinstance(block, Block):
+            return block.hash
         return validation.get_hash_of(block)
+
+    def get_transaction_proof(self, index, position):
+        """
+        Return the proof of inclusion of a transaction in a Merkle Block
+
+        :param index: Index of the Block, starting from 1 for the genesis
+        :param position: Position of the transaction in the Block
+        :return: The proof or None if there is no such transaction or the
+                 Block is in the legacy format
+        """
+        if not 0 < index <= len(self._blocks):
+            return None
+        block = self._blocks[index - 1]
+        if (not validation.is_a_merkle_block(block) or
+                not 0 <= position < len(block['transactions'])):
+            return None
+        return validation.get_transaction_proof(block['transactions'],
+                                                position)
+
+    def get_block_index(self, block_hash):
+        """
+        Return the index of the Block with the given hash, in O(1)
+
+        :param block_hash: Hash of the Block
+        :return: The index, starting from 1 for the genesis, or None if
+                 there is no such Block
+        """
+        return self._index.get_height(block_hash)
+
+    def get_transaction_location(self, transaction_hash):
+        """
+        Return where the transaction with the given hash is in the chain,
+        in O(1)
+
+        :param transaction_hash: Hash of the transaction
+        :return: Tuple of the index of its Block, starting from 1 for the
+                 genesis, and of its position in the Block, or None if
+                 there is no such transaction
+        """
+        return self._index.get_transaction_location(transaction_hash)
+
+    def get_transaction(self, transaction_hash):
+        """
+        Return the transaction with the given hash and where it is in the
+        chain, in O(1)
+
+        :param transaction_hash: Hash of the transaction
+        :return: Tuple of the transaction, of the index of its Block and of
+                 its position in the Block, or None if there is no such
+                 transaction
+        """
+        location = self._index.get_transaction_location(transaction_hash)
+        if location is None:
+            return None
+        index, position = location
+        transaction = self._blocks[index - 1]['transactions'][position]
+        return transaction, index, position
+
+    def get_block(self, index):
+        """
+        Return the Block with the given index
+
+        :param index: Index of the Block, starting from 1 for the genesis
+        :return: The Block or None if there is no such Block
+        """
+        if 0 < index <= len(self._blocks):
+            return self._blocks[index - 1]
+        return None
+
+    def get_block_hash(self, index):
+        """
+        Return the hash of the Block with the given index
+
+        :param index: Index of the Block, starting from 1 for the genesis
+        :return: The hash or None if there is no such Block
+        """
+        if 0 < index <= len(self._blocks):
+            return self.get_hash_of(self._blocks[index - 1])
+        return None
@@ -0,0 +1,69 @@
+class ChainIndex(object):
+    """
+    Lookup index of a chain: the height of every Block by hash and the
+    height and position of every transaction by hash
+
+    It follows the chain at its tip: blocks are appended and truncated,
+    so a rollback only touches the blocks after the fork point.
+    A transaction found in many blocks is indexed at the first one.
+    """
+
+    def __init__(self):
+        # Block hash -> height
+        self._heights = {}
+        # Transaction hash -> (height, position)
+        self._transactions = {}
+        # Hash of the Block and of its transactions, by height
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, block_hash, transaction_hashes):
+        """
+        Index the next Block of the chain
+
+        :param block_hash: Hash of the Block
+        :param transaction_hashes: Hashes of its transactions, in order
+        """
+        height = len(self._entries) + 1
+        transaction_hashes = tuple(transaction_hashes)
+        self._entries.append((block_hash, transaction_hashes))
+        self._heights.setdefault(block_hash, height)
+        for position, transaction_hash in enumerate(transaction_hashes):
+            self._transactions.setdefault(transaction_hash,
+                                          (height, position))
+
+    def truncate(self, height):
+        """
+        Drop the blocks after a height
+
+        :param height: Number of blocks kept
+        """
+        for block_hash, transaction_hashes in self._entries[height:]:
+            if self._heights.get(block_hash, 0) > height:
+                del self._heights[block_hash]
+            for transaction_hash in transaction_hashes:
+                location = self._transactions.get(transaction_hash)
+                if location is not None and location[0] > height:
+                    del self._transactions[transaction_hash]
+        del self._entries[height:]
+
+    def get_height(self, block_hash):
+        """
+        Return the height of a Block
+
+        :param block_hash: Hash of the Block
+        :return: The height, from 1 for the genesis, None if not indexed
+        """
+        return self._heights.get(block_hash)
+
+    def get_transaction_location(self, transaction_hash):
+        """
+        Return where a transaction is in the chain
+
+        :param transaction_hash: Hash of the transaction
+        :return: Tuple of the height of its Block and its position in the
+                 Block, None if not indexed
+        """
+        return self._transactions.get(transaction_hash)
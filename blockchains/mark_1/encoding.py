@@ -0,0 +1,159 @@
+import json
+
+from json.encoder import encode_basestring_ascii
+
+
+def _to_dict(value):
+    """
+    Turn the blocks and transactions into the plain dicts they encode as
+    """
+    to_dict = getattr(value, 'to_dict', None)
+    if to_dict is None:
+        raise TypeError(f'Object of type {value.__class__.__name__} '
+                        f'is not JSON serializable')
+    return to_dict()
+
+
+# The canonical encoding is the one of json.dumps(value, sort_keys=True):
+# the encoder is built once instead of once per call. Blocks and
+# transactions are encoded as their plain dicts.
+_encode = json.JSONEncoder(sort_keys=True, default=_to_dict).encode
+
+# Sorted keys of the Block schemas already seen, with their encoded prefix
+_key_orders = {}
+_KEY_ORDERS_MAX_SIZE = 256
+
+
+def _encode_float(value):
+    if value != value or value in (float('inf'), float('-inf')):
+        return _encode(value)
+    return float.__repr__(value)
+
+
+# Scalars encoded without going through the generic encoder
+_scalar_encoders = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: _encode_float,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+}
+
+
+def _key_order_of(block):
+    """
+    Return the sorted keys of a Block with their encoded prefixes
+
+    :param block: block
+    :return: Tuple of (key, prefix) pairs, None if the keys are not strings
+    """
+    schema = tuple(block)
+    key_order = _key_orders.get(schema)
+    if key_order is None:
+        if not all(type(key) is str for key in schema):
+            return None
+        key_order = tuple((key, f'{encode_basestring_ascii(key)}: ')
+                          for key in sorted(schema))
+        if len(_key_orders) < _KEY_ORDERS_MAX_SIZE:
+            _key_orders[schema] = key_order
+    return key_order
+
+
+def encode_value(value):
+    """
+    Encode any JSON value in its canonical form
+
+    :param value: value
+    :return: The canonical JSON text
+    """
+    scalar_encoder = _scalar_encoders.get(type(value))
+    if scalar_encoder:
+        return scalar_encoder(value)
+    return _encode(value)
+
+
+def encode_transactions(transactions):
+    """
+    Encode the list of transactions of a Block in its canonical form
+
+    :param transactions: transactions
+    :return: The canonical JSON text
+    """
+    return _encode(transactions)
+
+
+def _encode_parts(key_order, block, encoded_transactions, header_only):
+    """
+    Encode a Block as a list of text parts, one for each value
+
+    :return: The list of parts and the position of the value of each key
+    """
+    parts = ['{']
+    positions = {}
+    for key, prefix in key_order:
+        if key == 'transactions' and header_only:
+            continue
+        if len(parts) > 1:
+            parts.append(', ')
+        parts.append(prefix)
+        positions[key] = len(parts)
+        if key == 'transactions' and encoded_transactions is not None:
+            parts.append(encoded_transactions)
+        else:
+            parts.append(encode_value(block[key]))
+    parts.append('}')
+    return parts, positions
+
+
+def encode_block(block, encoded_transactions=None, header_only=False):
+    """
+    Encode a Block in its canonical form, byte-identical to
+    json.dumps(block, sort_keys=True).encode()
+
+    :param block: block
+    :param encoded_transactions: Canonical text of the transactions of the
+                                 Block, when already known
+    :param header_only: Leave the transactions out of the encoding
+    :return: The canonical JSON bytes
+    """
+    key_order = _key_order_of(block)
+    if key_order is None:
+        if header_only:
+            block = {key: value for key, value in block.items()
+                     if key != 'transactions'}
+        return _encode(block).encode()
+
+    # Joined once at the end, the transactions text is never copied twice
+    parts = _encode_parts(key_order,
+                          block,
+                          encoded_transactions,
+                          header_only)[0]
+    return ''.join(parts).encode()
+
+
+def encode_block_around(block,
+                        key,
+                        encoded_transactions=None,
+                        header_only=False):
+    """
+    Encode a Block leaving out the value of one of its keys, so that
+    prefix + encoded value + suffix is the canonical encoding of the Block
+    for any value of that key
+
+    :param block: block, holding the key
+    :param key: The key whose value is left out
+    :param encoded_transactions: Canonical text of the transactions of the
+                                 Block, when already known
+    :param header_only: Leave the transactions out of the encoding
+    :return: The prefix and suffix bytes
+    """
+    key_order = _key_order_of(block)
+    if key_order is None:
+        raise ValueError('The keys of the Block must be strings')
+    parts, positions = _encode_parts(key_order,
+                                     block,
+                                     encoded_transactions,
+                                     header_only)
+    position = positions[key]
+    return (''.join(parts[:position]).encode(),
+            ''.join(parts[position + 1:]).encode())
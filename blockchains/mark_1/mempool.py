@@ -0,0 +1,215 @@
+import hashlib
+
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import islice
+
+from . import encoding
+
+
+# Eviction policies of a full Mempool
+EVICT_OLDEST = 'oldest'
+REJECT_NEWEST = 'newest'
+EVICTION_POLICIES = (EVICT_OLDEST, REJECT_NEWEST, )
+
+
+class Mempool(Sequence):
+    """
+    The pending transactions, waiting to be mined
+
+    The transactions are indexed by hash: a transaction already pending is
+    found in O(1) and not added twice. The pool can be bounded in number
+    of transactions and in bytes of their canonical encoding, once full
+    either the oldest transactions are evicted or the new ones rejected.
+    It reads like the list of the pending transactions, oldest first.
+    """
+
+    def __init__(self,
+                 transactions=(),
+                 max_count=None,
+                 max_bytes=None,
+                 eviction=EVICT_OLDEST):
+        """
+        :param transactions: Iterable of transactions to add
+        :param max_count: Maximum number of transactions, unbounded if None
+        :param max_bytes: Maximum size of the transactions, unbounded if
+                          None
+        :param eviction: Policy once full, EVICT_OLDEST or REJECT_NEWEST
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f'Unknown eviction policy: {eviction!r}')
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        # Transaction hash -> (transaction, size), the oldest first
+        self._transactions = OrderedDict()
+        self.size_bytes = 0
+        self.evictions = 0
+        self.rejections = 0
+        for transaction in transactions:
+            self.add(transaction)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({list(self)!r})'
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __iter__(self):
+        for transaction, _ in self._transactions.values():
+            yield transaction
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(self)[position]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('Transaction position out of range')
+        if position == len(self) - 1:
+            key = next(reversed(self._transactions))
+            return self._transactions[key][0]
+        return next(islice(self, position, None))
+
+    def __contains__(self, transaction):
+        return self._hash_and_size(transaction)[0] in self._transactions
+
+    def __eq__(self, other):
+        if isinstance(other, (Mempool, list, tuple)):
+            return len(self) == len(other) and all(
+                transaction == other_transaction
+                for transaction, other_transaction in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    @staticmethod
+    def _hash_and_size(transaction):
+        # The hash of validation.get_transaction_hash, from a single encoding
+        encoded_transaction = encoding.encode_value(transaction).encode()
+        return (hashlib.sha256(encoded_transaction).hexdigest(),
+                len(encoded_transaction))
+
+    def get(self, transaction_hash):
+        """
+        Return a pending transaction by hash
+
+        :param transaction_hash: Hash of the transaction
+        :return: The transaction or None if not pending
+        """
+        entry = self._transactions.get(transaction_hash)
+        return entry[0] if entry else None
+
+    def add(self, transaction):
+        """
+        Add a transaction, unless it is already pending
+
+        :param transaction: transaction
+        :return: The pending transaction, the given one or the one already
+                 pending with the same hash, None if the pool is full
+        """
+        transaction_hash, size = self._hash_and_size(transaction)
+        entry = self._transactions.get(transaction_hash)
+        if entry is not None:
+            return entry[0]
+
+        if (self.max_count == 0 or
+                self.max_bytes is not None and size > self.max_bytes):
+            # Never fits
+            self.rejections += 1
+            return None
+        while self._transactions and self._is_full(size):
+            if self.eviction == REJECT_NEWEST:
+                self.rejections += 1
+                return None
+            _, (_, evicted_size) = self._transactions.popitem(last=False)
+            self.size_bytes -= evicted_size
+            self.evictions += 1
+
+        self._transactions[transaction_hash] = (transaction, size)
+        self.size_bytes += size
+        return transaction
+
+    def _is_full(self, size):
+        """
+        Determine if a transaction of the given size doesn't fit anymore
+        """
+        return ((self.max_count is not None and
+                 len(self._transactions) + 1 > self.max_count) or
+                (self.max_bytes is not None and
+                 self.size_bytes + size > self.max_bytes))
+
+    def extend(self, transactions):
+        """
+        Add many transactions
+
+        :param transactions: Iterable of transactions
+        """
+        for transaction in transactions:
+            self.add(transaction)
+
+    def restore(self, transactions):
+        """
+        Put back transactions taken for a Block that wasn't mined, in
+        front of the pending ones and in their order
+
+        They held their place in the pool before being taken: none is
+        evicted or rejected for them, even if the pool is full meanwhile.
+
+        :param transactions: Iterable of transactions, oldest first
+        """
+        for transaction in reversed(list(transactions)):
+            transaction_hash, size = self._hash_and_size(transaction)
+            if transaction_hash not in self._transactions:
+                self._transactions[transaction_hash] = (transaction, size)
+                self.size_bytes += size
+            self._transactions.move_to_end(transaction_hash, last=False)
+
+    def select(self, limit=None):
+        """
+        Return the oldest pending transactions, without removing them
+
+        :param limit: Maximum number of transactions, all if None
+        :return: List of transactions
+        """
+        return list(islice(self, limit))
+
+    def take(self, limit=None):
+        """
+        Remove and return the oldest pending transactions, e.g. to go into
+        a new Block
+
+        :param limit: Maximum number of transactions, all if None
+        :return: List of transactions
+        """
+        if limit is None or limit >= len(self._transactions):
+            transactions = list(self)
+            self.clear()
+            return transactions
+        transactions = []
+        for _ in range(limit):
+            _, (transaction, size) = self._transactions.popitem(last=False)
+            self.size_bytes -= size
+            transactions.append(transaction)
+        return transactions
+
+    def clear(self):
+        """
+        Remove every pending transaction
+        """
+        self._transactions.clear()
+        self.size_bytes = 0
+
+    def get_stats(self):
+        """
+        Return the counters of the pool
+
+        :return: dict of pending transactions, bytes, evictions and
+                 rejections
+        """
+        return {
+            'transactions': len(self._transactions),
+            'bytes': self.size_bytes,
+            'evictions': self.evictions,
+            'rejections': self.rejections,
+        }
@@ -0,0 +1,94 @@
+import hashlib
+
+
+# Leaves and inner nodes are hashed with a different prefix, so an inner
+# node can never be passed off as a leaf (RFC 6962)
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+LEFT = 'left'
+RIGHT = 'right'
+
+
+def _hash_leaf(leaf_hash):
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(leaf_hash)).digest()
+
+
+def _hash_node(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level):
+    """
+    Hash the nodes of a level in pairs
+
+    An odd node out is promoted to the next level as it is: it is never
+    paired with a copy of itself, so two different lists of leaves can't
+    share the same root.
+
+    :param level: Nodes of the level
+    :return: Nodes of the next level
+    """
+    next_level = [_hash_node(level[position], level[position + 1])
+                  for position in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        next_level.append(level[-1])
+    return next_level
+
+
+def get_root(leaf_hashes):
+    """
+    Compute the Merkle root of a list of leaves
+
+    :param leaf_hashes: Hex digests of the leaves, in order
+    :return: Hex digest of the root
+    """
+    level = [_hash_leaf(leaf_hash) for leaf_hash in leaf_hashes]
+    if not level:
+        return hashlib.sha256(b'').hexdigest()
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def get_proof(leaf_hashes, position):
+    """
+    Compute the proof of inclusion of a leaf: the sibling of each node on
+    the path from the leaf to the root, O(log n) long
+
+    :param leaf_hashes: Hex digests of the leaves, in order
+    :param position: Position of the leaf
+    :return: List of (side, hex digest) of the siblings, bottom up
+    """
+    if not 0 <= position < len(leaf_hashes):
+        raise IndexError('Leaf position out of range')
+    proof = []
+    level = [_hash_leaf(leaf_hash) for leaf_hash in leaf_hashes]
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            side = LEFT if sibling < position else RIGHT
+            proof.append((side, level[sibling].hex()))
+        level = _next_level(level)
+        position //= 2
+    return proof
+
+
+def verify_proof(leaf_hash, proof, root):
+    """
+    Determine if a leaf is included in the tree with the given root
+
+    :param leaf_hash: Hex digest of the leaf
+    :param proof: Proof of inclusion, as computed by get_proof
+    :param root: Hex digest of the root
+    :return: True if included, False if not
+    """
+    node = _hash_leaf(leaf_hash)
+    for side, sibling in proof:
+        if side == LEFT:
+            node = _hash_node(bytes.fromhex(sibling), node)
+        elif side == RIGHT:
+            node = _hash_node(node, bytes.fromhex(sibling))
+        else:
+            return False
+    return node.hex() == root
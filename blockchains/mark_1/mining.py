@@ -0,0 +1,164 @@
+import hashlib
+import multiprocessing
+
+from itertools import count, islice
+
+from . import encoding
+from . import validation
+
+
+# Attempts between two checks of the stop event in a worker
+STOP_CHECK_INTERVAL = 1024
+# Seconds between two checks of the stop event while a pool searches
+STOP_POLL_INTERVAL = 0.1
+# Highest difficulty, every bit of the SHA-256 digest
+MAX_DIFFICULTY = 256
+
+# Event shared by the workers of a pool, set once a nonce is found
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+class MidstateHasher(object):
+    """
+    Hash a Block for many values of its nonce, serializing it only once
+
+    The canonical encoding is split around the nonce value: the SHA-256
+    state after the prefix is computed once and copied for each nonce,
+    so every attempt only hashes the nonce and the suffix. The keys are
+    sorted, so the suffix of a legacy Block holds all its transactions:
+    only the header of a Merkle Block is short after the nonce.
+    """
+
+    def __init__(self, block):
+        """
+        :param block: block
+        """
+        block = dict(block, nonce=0)
+        header_only = validation.is_a_merkle_block(block)
+        prefix, self._suffix = encoding.encode_block_around(
+            block, 'nonce', header_only=header_only)
+        self._midstate = hashlib.sha256(prefix)
+
+    def digest(self, nonce):
+        """
+        Return the SHA-256 digest of the Block with the given nonce
+
+        :param nonce: nonce
+        """
+        hasher = self._midstate.copy()
+        hasher.update(b'%d' % nonce)
+        hasher.update(self._suffix)
+        return hasher.digest()
+
+    def hexdigest(self, nonce):
+        """
+        Return the SHA-256 hash of the Block with the given nonce
+
+        :param nonce: nonce
+        """
+        return self.digest(nonce).hex()
+
+
+def get_target(difficulty):
+    """
+    Return the digest bound solving the Proof of Work for a difficulty
+
+    :param difficulty: Number of leading zero bits required in the hash
+    :return: Digests lower than the target solve the Proof of Work
+    """
+    if difficulty > MAX_DIFFICULTY:
+        raise ValueError(f'Difficulty above {MAX_DIFFICULTY}: {difficulty}')
+    if difficulty <= 0:
+        return None
+    return (1 << (256 - difficulty)).to_bytes(32, 'big')
+
+
+def search_nonces(block,
+                  difficulty,
+                  first=0,
+                  step=1,
+                  attempts=None,
+                  stop_event=None):
+    """
+    Try the nonces first, first + step, first + 2 * step, ... on a Block
+
+    :param block: block
+    :param difficulty: Number of leading zero bits required in the hash
+    :param first: First nonce to try
+    :param step: Distance between two tried nonces
+    :param attempts: Maximum number of nonces to try, unbounded if None
+    :param stop_event: Event stopping the search once set, the one of the
+                       pool in a worker
+    :return: The first nonce solving the Block, None if not found
+    """
+    target = get_target(difficulty)
+    if target is None:
+        return first
+    if stop_event is None:
+        stop_event = _stop_event
+    digest = MidstateHasher(block).digest
+    nonces = islice(count(first, step), attempts)
+    for attempt, nonce in enumerate(nonces, 1):
+        # Big-endian digests compare as the numbers they represent
+        if digest(nonce) < target:
+            return nonce
+        if (not attempt % STOP_CHECK_INTERVAL and
+                stop_event is not None and stop_event.is_set()):
+            return None
+    return None
+
+
+def _search_worker(arguments):
+    return search_nonces(*arguments)
+
+
+def search_nonce(block, difficulty, processes=1, stop_event=None):
+    """
+    Search the nonce solving a Block for the given difficulty
+
+    With more than one process the nonce space is interleaved across a
+    pool of workers: worker k tries k, k + processes, k + 2 * processes, ...
+    The first solution found stops every worker.
+
+    :param block: block
+    :param difficulty: Number of leading zero bits required in the hash
+    :param processes: Number of worker processes
+    :param stop_event: Event cancelling the search once set, e.g. a
+                       threading.Event set by another thread
+    :return: A nonce solving the Block, None if cancelled
+    """
+    if processes <= 1:
+        return search_nonces(block, difficulty, stop_event=stop_event)
+
+    pool_stop_event = multiprocessing.Event()
+    tasks = [(dict(block), difficulty, first, processes)
+             for first in range(processes)]
+    pool = multiprocessing.Pool(processes,
+                                initializer=_init_worker,
+                                initargs=(pool_stop_event, ))
+    try:
+        nonces = pool.imap_unordered(_search_worker, tasks)
+        while True:
+            try:
+                nonce = nonces.next(timeout=STOP_POLL_INTERVAL)
+            except multiprocessing.TimeoutError:
+                if stop_event is not None and stop_event.is_set():
+                    # Relayed to the workers
+                    pool_stop_event.set()
+                continue
+            except StopIteration:
+                return None
+            if nonce is not None:
+                return nonce
+    finally:
+        # The stopped workers return at once and the pool is joined:
+        # terminating it could kill a worker holding the lock of the
+        # task queue, leaving the pool hung
+        pool_stop_event.set()
+        pool.close()
+        pool.join()
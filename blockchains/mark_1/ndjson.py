@@ -0,0 +1,42 @@
+import json
+
+from . import encoding
+from .block import Block
+from .storage import BlockStore, BlockStoreSnapshot
+
+
+MIMETYPE = 'application/x-ndjson'
+
+
+def dump_blocks(blocks, start=0, stop=None):
+    """
+    Encode a range of blocks as NDJSON, one Block per line in its
+    canonical encoding
+
+    The blocks are encoded one at a time: the memory used doesn't depend
+    on the number of blocks. Stored blocks are copied from their bytes.
+
+    :param blocks: List of blocks, BlockStore or BlockStoreSnapshot
+    :param start: Position of the first Block
+    :param stop: Position after the last Block, the end if None
+    :return: Generator of lines, as bytes
+    """
+    if isinstance(blocks, (BlockStore, BlockStoreSnapshot)):
+        for raw_block in blocks.iter_raw(start, stop):
+            yield b''.join((raw_block, b'\n'))
+        return
+    for position in range(*slice(start, stop).indices(len(blocks))):
+        yield encoding.encode_block(blocks[position]) + b'\n'
+
+
+def load_blocks(lines):
+    """
+    Decode NDJSON lines into sealed blocks, one at a time, as they arrive
+
+    :param lines: Iterable of lines, as bytes or text; blank ones are
+                  skipped
+    :return: Generator of blocks
+    """
+    for line in lines:
+        if line.strip():
+            yield Block(json.loads(line))
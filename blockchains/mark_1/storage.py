@@ -0,0 +1,534 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+
+from contextlib import nullcontext
+
+from . import encoding
+from .block import Block
+
+
+# Every record of the segment is: length, CRC-32 of the payload, payload
+RECORD_HEADER = struct.Struct('<II')
+# Every entry of the index is the offset of a record in the segment
+INDEX_ENTRY = struct.Struct('<Q')
+
+# The journal of a replacement is: position of the first replaced Block,
+# number of records, then the new records as in the segment
+JOURNAL_HEADER = struct.Struct('<QQ')
+
+SEGMENT_FILE_NAME = 'blocks.seg'
+INDEX_FILE_NAME = 'blocks.idx'
+JOURNAL_FILE_NAME = 'blocks.jnl'
+
+
+def _map(file):
+    """
+    Memory-map the whole content of a file, read only
+
+    :param file: file
+    :return: The map or None if the file is empty
+    """
+    file.flush()
+    if not os.fstat(file.fileno()).st_size:
+        return None
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class StaleSnapshotError(RuntimeError):
+    """
+    The store was truncated since the snapshot was taken
+    """
+
+
+def _sync_directory(path):
+    """
+    Flush to the disk the files created, renamed or removed in a directory
+
+    :param path: Directory
+    """
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _pack_record(payload):
+    """
+    Return a record of the segment holding the payload
+    """
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class BlockStore(object):
+    """
+    Persistent, append-only store of sealed blocks
+
+    Blocks are written, in their canonical encoding, to a segment file and
+    the offset of each record to a fixed-width index file. Both files are
+    memory-mapped for reading: a Block is found by position in O(1) and
+    its bytes are copied straight from the mapped segment, without
+    loading the chain.
+    Writes are fsync-ed in batches: after a crash the store is recovered
+    by dropping the torn record at the tail of the segment, if any. The
+    blocks replacing others are written to a journal first, replayed
+    after a crash: a replacement is never left half done.
+
+    It behaves like the list of blocks of a Blockchain: only the last
+    Block is kept in memory.
+    """
+
+    def __init__(self, path, sync_every=100):
+        """
+        :param path: Directory of the store, created if missing
+        :param sync_every: Number of appended blocks between two fsync
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.sync_every = sync_every
+        self._segment = open(os.path.join(path, SEGMENT_FILE_NAME), 'a+b')
+        self._index = open(os.path.join(path, INDEX_FILE_NAME), 'a+b')
+        self._journal_path = os.path.join(path, JOURNAL_FILE_NAME)
+        self._segment_map = None
+        self._index_map = None
+        self._length = 0
+        self._end = 0
+        # Number of truncations, expiring the snapshots
+        self.generation = 0
+        self._unsynced = 0
+        self._last_block = None
+        self._recover()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Recovery
+
+    def _read_record_at(self, offset, size):
+        """
+        Read the payload of the record at the given offset of the segment
+
+        :return: The payload or None if the record is torn or corrupted
+        """
+        if offset + RECORD_HEADER.size > size:
+            return None
+        header = os.pread(self._segment.fileno(), RECORD_HEADER.size, offset)
+        length, checksum = RECORD_HEADER.unpack(header)
+        if offset + RECORD_HEADER.size + length > size:
+            return None
+        payload = os.pread(self._segment.fileno(),
+                           length,
+                           offset + RECORD_HEADER.size)
+        if zlib.crc32(payload) != checksum:
+            return None
+        return payload
+
+    def _read_offset_at(self, position):
+        entry = os.pread(self._index.fileno(),
+                         INDEX_ENTRY.size,
+                         position * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(entry)[0]
+
+    def _recover(self):
+        """
+        Bring the segment and the index back to the last whole record
+
+        Only the tail of the files is read, whatever the chain length.
+        """
+        segment_size = os.fstat(self._segment.fileno()).st_size
+        index_size = os.fstat(self._index.fileno()).st_size
+        # A torn index entry is dropped
+        self._length = index_size // INDEX_ENTRY.size
+
+        # Indexed records lost with the tail of the segment are dropped
+        payload = None
+        while self._length:
+            offset = self._read_offset_at(self._length - 1)
+            payload = self._read_record_at(offset, segment_size)
+            if payload is not None:
+                break
+            self._length -= 1
+        self._end = (offset + RECORD_HEADER.size + len(payload)
+                     if self._length else 0)
+        if self._length * INDEX_ENTRY.size != index_size:
+            self._index.truncate(self._length * INDEX_ENTRY.size)
+
+        # Whole records written after the last index entry are indexed
+        while True:
+            payload = self._read_record_at(self._end, segment_size)
+            if payload is None:
+                break
+            self._index.write(INDEX_ENTRY.pack(self._end))
+            self._length += 1
+            self._end += RECORD_HEADER.size + len(payload)
+
+        if self._end != segment_size:
+            self._segment.truncate(self._end)
+        self.sync()
+        self._replay_journal()
+
+    def _read_journal(self):
+        """
+        Read the journal of a replacement, if any
+
+        :return: Position of the first replaced Block and the payloads of
+                 the new records, None if there is no whole journal
+        """
+        try:
+            with open(self._journal_path, 'rb') as journal:
+                content = journal.read()
+        except FileNotFoundError:
+            return None
+        if len(content) < JOURNAL_HEADER.size:
+            return None
+        start, count = JOURNAL_HEADER.unpack_from(content)
+        payloads = []
+        offset = JOURNAL_HEADER.size
+        for _ in range(count):
+            if offset + RECORD_HEADER.size > len(content):
+                return None
+            length, checksum = RECORD_HEADER.unpack_from(content, offset)
+            offset += RECORD_HEADER.size
+            payload = content[offset:offset + length]
+            if len(payload) != length or zlib.crc32(payload) != checksum:
+                return None
+            payloads.append(payload)
+            offset += length
+        return start, payloads
+
+    def _replay_journal(self):
+        """
+        Complete the replacement interrupted by a crash, if any, from its
+        journal
+        """
+        temporary_path = self._journal_path + '.tmp'
+        if os.path.exists(temporary_path):
+            # Never committed: the replacement didn't start
+            os.remove(temporary_path)
+        journal = self._read_journal()
+        if journal is not None and journal[0] <= self._length:
+            self._apply(*journal)
+        if os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+            _sync_directory(self.path)
+
+    # Writes
+
+    def append(self, block):
+        """
+        Append a sealed Block to the store
+
+        :param block: block
+        """
+        self._append_payload(self._encode(block))
+        self._last_block = block
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    @staticmethod
+    def _encode(block):
+        """
+        Return the canonical encoding of a Block, the payload of its record
+        """
+        if isinstance(block, Block):
+            return encoding.encode_block(block, block.encoded_transactions)
+        return encoding.encode_block(block)
+
+    def _append_payload(self, payload):
+        """
+        Write the record of a payload at the end of the segment, and its
+        offset at the end of the index
+        """
+        self._segment.write(_pack_record(payload))
+        self._index.write(INDEX_ENTRY.pack(self._end))
+        self._length += 1
+        self._end += RECORD_HEADER.size + len(payload)
+
+    def extend(self, blocks):
+        """
+        Append many sealed blocks to the store
+
+        :param blocks: Iterable of blocks
+        """
+        for block in blocks:
+            self.append(block)
+
+    def truncate(self, length):
+        """
+        Drop the blocks after the given length
+
+        :param length: Number of blocks to keep
+        """
+        if length >= self._length:
+            return
+        self.generation += 1
+        self._end = self._offset_at(length)
+        self._length = length
+        self._segment.flush()
+        self._segment.truncate(self._end)
+        self._index.flush()
+        self._index.truncate(length * INDEX_ENTRY.size)
+        # The reads return copies: no view of the maps outlives them
+        self._close_maps()
+        self._last_block = None
+        self.sync()
+
+    def pop(self):
+        """
+        Remove and return the last Block
+
+        :return: The last Block
+        """
+        block = self[-1]
+        self.truncate(len(self) - 1)
+        return block
+
+    def replace(self, blocks, start=0):
+        """
+        Replace the blocks from a position with new ones
+
+        The first new blocks already stored in their place are kept, only
+        the ones after the fork point are rewritten. They are written to
+        a journal and flushed to the disk before any stored Block is
+        dropped: after a crash the journal is replayed, the store holds
+        either the old blocks or the new ones.
+
+        :param blocks: Iterable of blocks
+        :param start: Position of the first replaced Block
+        """
+        payloads = [self._encode(block) for block in blocks]
+        shared = 0
+        while (shared < len(payloads) and start + shared < self._length and
+               self.read_raw(start + shared) == payloads[shared]):
+            shared += 1
+        start += shared
+        payloads = payloads[shared:]
+        if not payloads:
+            self.truncate(start)
+            return
+
+        # The kept blocks are on the disk, the journal is committed by its
+        # rename once whole on the disk too
+        self.sync()
+        temporary_path = self._journal_path + '.tmp'
+        with open(temporary_path, 'wb') as journal:
+            journal.write(JOURNAL_HEADER.pack(start, len(payloads)))
+            for payload in payloads:
+                journal.write(_pack_record(payload))
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary_path, self._journal_path)
+        _sync_directory(self.path)
+
+        self._apply(start, payloads)
+
+        os.remove(self._journal_path)
+        _sync_directory(self.path)
+
+    def _apply(self, start, payloads):
+        """
+        Replace the blocks from a position with new records, and flush
+        them to the disk
+
+        :param start: Position of the first replaced Block
+        :param payloads: Payloads of the new records
+        """
+        self.truncate(start)
+        for payload in payloads:
+            self._append_payload(payload)
+        self._last_block = None
+        self.sync()
+
+    def sync(self):
+        """
+        Flush the pending writes to the disk
+        """
+        for file in (self._segment, self._index):
+            file.flush()
+            os.fsync(file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """
+        Flush the pending writes and close the store
+        """
+        if not self._segment.closed:
+            self.sync()
+            self._close_maps()
+            self._segment.close()
+            self._index.close()
+
+    def snapshot(self, lock=None):
+        """
+        Return a snapshot of the blocks stored so far
+
+        :param lock: Callable returning the context manager held around
+                     each read of the snapshot, e.g. to keep the writers
+                     out
+        :return: BlockStoreSnapshot
+        """
+        return BlockStoreSnapshot(self, lock)
+
+    def _close_maps(self):
+        for file_map in (self._segment_map, self._index_map):
+            if file_map is not None:
+                file_map.close()
+        self._segment_map = self._index_map = None
+
+    # Reads
+
+    def __len__(self):
+        return self._length
+
+    def _offset_at(self, position):
+        """
+        Return the offset in the segment of the record at a position
+
+        :param position: Position of the Block
+        """
+        end = (position + 1) * INDEX_ENTRY.size
+        if self._index_map is None or len(self._index_map) < end:
+            # The index grew since it was mapped
+            self._index_map = _map(self._index)
+        return INDEX_ENTRY.unpack_from(self._index_map,
+                                       position * INDEX_ENTRY.size)[0]
+
+    def _position_of(self, position):
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError('Block position out of range')
+        return position
+
+    def read_raw(self, position):
+        """
+        Return the canonical encoding of the Block at a position, copied
+        from the memory-mapped segment
+
+        A copy, not a view of the map: it stays valid when the store is
+        truncated, e.g. while it is sent to a client.
+
+        :param position: Position of the Block, negative from the end
+        :return: The canonical JSON bytes
+        """
+        offset = self._offset_at(self._position_of(position))
+        start = offset + RECORD_HEADER.size
+        if self._segment_map is None or len(self._segment_map) < start:
+            # The segment grew since it was mapped: records are appended
+            # whole, so the new map holds the payload too
+            self._segment_map = _map(self._segment)
+        length = RECORD_HEADER.unpack_from(self._segment_map, offset)[0]
+        return self._segment_map[start:start + length]
+
+    def iter_raw(self, start=0, stop=None):
+        """
+        Iterate over the canonical encoding of a range of blocks
+
+        :param start: Position of the first Block
+        :param stop: Position after the last Block, the end if None
+        :return: Iterator of the canonical JSON bytes
+        """
+        for position in range(*slice(start, stop).indices(self._length)):
+            yield self.read_raw(position)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[item]
+                    for item in range(*position.indices(self._length))]
+        position = self._position_of(position)
+        if position == self._length - 1:
+            if self._last_block is None:
+                self._last_block = self._decode(position)
+            return self._last_block
+        return self._decode(position)
+
+    def _decode(self, position):
+        return Block(json.loads(self.read_raw(position)))
+
+    def __iter__(self):
+        for position in range(self._length):
+            yield self[position]
+
+
+class BlockStoreSnapshot(object):
+    """
+    The blocks of a BlockStore up to its length when the snapshot was taken
+
+    The blocks appended later are not seen. Once the store is truncated,
+    e.g. to replace its blocks with a peer's ones, the snapshot expires:
+    reading it raises StaleSnapshotError instead of mixing two chains.
+    It reads like the BlockStore.
+    """
+
+    def __init__(self, store, lock=None):
+        """
+        :param store: BlockStore
+        :param lock: Callable returning the context manager held around
+                     each read
+        """
+        self._store = store
+        self._lock = lock or nullcontext
+        self._length = len(store)
+        self._generation = store.generation
+
+    def __len__(self):
+        return self._length
+
+    def _position_of(self, position):
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError('Block position out of range')
+        return position
+
+    def _read(self, read, position):
+        """
+        Read a Block of the store, if not truncated since the snapshot
+
+        :param read: Method of the store reading a position
+        :param position: Position of the Block, negative from the end
+        """
+        position = self._position_of(position)
+        with self._lock():
+            if self._store.generation != self._generation:
+                raise StaleSnapshotError(
+                    'The store was truncated since the snapshot')
+            return read(position)
+
+    def read_raw(self, position):
+        """
+        Return the canonical encoding of the Block at a position
+
+        :param position: Position of the Block, negative from the end
+        :return: The canonical JSON bytes
+        """
+        return self._read(self._store.read_raw, position)
+
+    def iter_raw(self, start=0, stop=None):
+        """
+        Iterate over the canonical encoding of a range of blocks
+
+        :param start: Position of the first Block
+        :param stop: Position after the last Block, the end if None
+        :return: Iterator of the canonical JSON bytes
+        """
+        for position in range(*slice(start, stop).indices(self._length)):
+            yield self.read_raw(position)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[item]
+                    for item in range(*position.indices(self._length))]
+        return self._read(self._store.__getitem__, position)
+
+    def __iter__(self):
+        for position in range(self._length):
+            yield self[position]
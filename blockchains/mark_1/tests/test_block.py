@@ -0,0 +1,231 @@
+import copy
+import json
+import pickle
+import pytest
+
+from unittest import mock
+
+from .. import validation
+from ..block import Block as BlockSUT
+from ..transaction import Transaction
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def sample_block():
+    return BlockSUT({
+        'index': 2,
+        'timestamp': 1231006505.0,
+        'transactions': [
+            {
+                'data': 'Chancellor on brink of second bailout for banks',
+            },
+        ],
+        'previous_hash': 64 * 'a',
+    })
+
+
+# Tests
+
+class TestHashProperty(object):
+    """
+    Test the memoized hash of a Block
+    """
+
+    def test_matches_the_content_hash(self, sample_block):
+        # Arrange
+        expected_hash = validation.get_hash_of(dict(sample_block))
+        # Act
+        retrieved_value = sample_block.hash
+        # Assert
+        assert retrieved_value == expected_hash
+
+    def test_is_computed_once(self, sample_block):
+        # Arrange
+        with mock.patch.object(validation, 'get_hash_of',
+                               wraps=validation.get_hash_of) as mock_hash:
+            # Act
+            sample_block.hash
+            sample_block.hash
+            # Assert
+            assert mock_hash.call_count == 1
+
+    def test_matches_the_hash_of_the_dict(self, sample_block):
+        # Arrange
+        sample_block['transactions'] = [Transaction(data='Chancellor')]
+        expected_hash = validation.get_hash_of(sample_block.to_dict())
+        # Act
+        retrieved_value = sample_block.hash
+        # Assert
+        assert retrieved_value == expected_hash
+
+
+class TestToDictMethod(object):
+    """
+    Test the plain dict of a Block
+    """
+
+    def test_on_block(self, sample_block):
+        # Arrange
+        sample_block['transactions'] = [Transaction(data='Chancellor')]
+        # Act
+        retrieved_value = sample_block.to_dict()
+        # Assert
+        assert type(retrieved_value) is dict
+        assert type(retrieved_value['transactions'][0]) is dict
+        assert retrieved_value == sample_block
+        assert json.loads(json.dumps(retrieved_value)) == sample_block
+
+    def test_keeps_the_unknown_keys(self, sample_block):
+        # Arrange
+        sample_block['memo'] = 'Chancellor'
+        # Act
+        retrieved_value = sample_block.to_dict()
+        # Assert
+        assert retrieved_value['memo'] == 'Chancellor'
+        assert sample_block.hash == validation.get_hash_of(retrieved_value)
+
+
+class TestMappingInterface(object):
+    """
+    Test that a Block reads and writes like a dict
+    """
+
+    def test_items(self, sample_block):
+        # Arrange
+        # Act
+        # Assert
+        assert len(sample_block) == 4
+        assert 'nonce' not in sample_block
+        assert sample_block.get('nonce') is None
+        assert sample_block['index'] == sample_block.index == 2
+        with pytest.raises(KeyError):
+            sample_block['nonce']
+
+    def test_delete(self, sample_block):
+        # Arrange
+        sample_block['nonce'] = 23
+        # Act
+        del sample_block['nonce']
+        # Assert
+        assert 'nonce' not in sample_block
+        with pytest.raises(KeyError):
+            del sample_block['nonce']
+
+    def test_has_no_instance_dict(self, sample_block):
+        # Arrange
+        # Act
+        # Assert
+        assert not hasattr(sample_block, '__dict__')
+
+
+class TestHashInvalidation(object):
+    """
+    Test that changing a Block drops its memoized hash
+    """
+
+    def test_on_item_assignment(self, sample_block):
+        # Arrange
+        previous_hash = sample_block.hash
+        # Act
+        sample_block['index'] = 23
+        # Assert
+        assert sample_block.hash != previous_hash
+        assert sample_block.hash == validation.get_hash_of(sample_block)
+
+    def test_on_update(self, sample_block):
+        # Arrange
+        previous_hash = sample_block.hash
+        # Act
+        sample_block.update(timestamp=0.0)
+        # Assert
+        assert sample_block.hash != previous_hash
+
+    def test_on_explicit_invalidation(self, sample_block):
+        # Arrange
+        previous_hash = sample_block.hash
+        sample_block['transactions'][0]['data'] = 'Tampered'
+        # Act
+        sample_block.invalidate_hash()
+        # Assert
+        assert sample_block.hash != previous_hash
+
+    def test_on_nested_transaction_change(self, sample_block):
+        # Arrange
+        previous_hash = sample_block.hash
+        # Act
+        sample_block['transactions'][0]['data'] = 'Tampered'
+        # Assert
+        assert sample_block.hash != previous_hash
+        assert sample_block.hash == validation.get_hash_of(sample_block)
+
+    def test_on_transaction_object_change(self, sample_block):
+        # Arrange
+        sample_block['transactions'] = [Transaction(data='Original')]
+        previous_hash = sample_block.hash
+        # Act
+        sample_block['transactions'][0]['data'] = 'Tampered'
+        # Assert
+        assert sample_block.hash != previous_hash
+
+    def test_on_transactions_list_change(self, sample_block):
+        # Arrange
+        previous_hash = sample_block.hash
+        # Act
+        sample_block['transactions'].append({'data': 'Appended'})
+        # Assert
+        assert sample_block.hash != previous_hash
+        assert sample_block.hash == validation.get_hash_of(sample_block)
+
+    def test_reported_to_on_change(self, sample_block):
+        # Arrange
+        sample_block.on_change = mock.Mock()
+        # Act
+        sample_block['transactions'][0]['data'] = 'Tampered'
+        # Assert
+        sample_block.on_change.assert_called_with()
+
+    def test_transaction_shared_between_blocks(self, sample_block):
+        # Arrange
+        other_block = BlockSUT(sample_block)
+        previous_hash = sample_block.hash
+        # Act
+        other_block['transactions'][0]['data'] = 'Tampered'
+        # Assert
+        assert sample_block.hash == previous_hash
+        assert other_block.hash != previous_hash
+
+
+class TestCopy(object):
+    """
+    Test copies and pickles of a Block
+    """
+
+    def test_deepcopy(self, sample_block):
+        # Arrange
+        sample_block.hash
+        # Act
+        retrieved_value = copy.deepcopy(sample_block)
+        # Assert
+        assert isinstance(retrieved_value, BlockSUT)
+        assert retrieved_value == sample_block
+        assert retrieved_value.hash == sample_block.hash
+
+    def test_deepcopy_holds_its_transactions(self, sample_block):
+        # Arrange
+        previous_hash = sample_block.hash
+        retrieved_value = copy.deepcopy(sample_block)
+        # Act
+        retrieved_value['transactions'][0]['data'] = 'Tampered'
+        # Assert
+        assert sample_block.hash == previous_hash
+        assert retrieved_value.hash != previous_hash
+
+    def test_pickle(self, sample_block):
+        # Arrange
+        # Act
+        retrieved_value = pickle.loads(pickle.dumps(sample_block))
+        # Assert
+        assert isinstance(retrieved_value, BlockSUT)
+        assert retrieved_value == sample_block
@@ -1,3 +1,4 @@
+import copy
 import pytest
 import random
 import time
@@ -6,7 +7,9 @@ from calendar import timegm
 from freezegun import freeze_time
 from unittest import mock
 
+from .. import validation
 from ..blockchain import Blockchain as BlockchainSUT
+from ..mempool import Mempool, REJECT_NEWEST
 
 
 # Fixtures
@@ -265,6 +268,97 @@ class TestIsValidMethod(object):
         assert retrieved_value == True
 
 
+class TestIsValidWatermark(object):
+    """
+    Test the incremental validation of the blockchain
+    """
+
+    def test_watermark_on_validated_chain(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        # Act
+        sut.is_valid()
+        # Assert
+        assert sut._validated_height == len(sut.get_chain())
+        assert sut._validated_hash == sut.get_hash_of(sut.last_block)
+
+    def test_only_new_blocks_are_validated(self,
+                                           w_sample_blocks_f,
+                                           sample_transaction_f):
+        # Arrange
+        sut = w_sample_blocks_f(20)
+        sut.is_valid()
+        sut.add_transaction(**sample_transaction_f())
+        sut.mine()
+        with mock.patch.object(validation, 'get_hash_of',
+                               wraps=validation.get_hash_of) as mock_hash:
+            # Act
+            retrieved_value = sut.is_valid()
+            # Assert
+            assert retrieved_value == True
+            assert mock_hash.call_count <= 4
+
+    def test_reset_on_chain_replacement(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        sut.is_valid()
+        # Act
+        sut._chain = []
+        # Assert
+        assert sut._validated_height == 0
+        assert sut._validated_hash == None
+
+    def test_reset_on_direct_chain_access(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        sut.is_valid()
+        # Act
+        sut._chain.pop()
+        # Assert
+        assert sut._validated_height == 0
+        assert sut.is_valid() == True
+
+    def test_on_block_manipulated_below_watermark(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(5)
+        sut.is_valid()
+        # Act
+        sut._chain[1]['index'] = 23
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_returned_block_manipulated(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(5)
+        sut.is_valid()
+        # Act
+        sut.get_chain()[1]['index'] = 23
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_returned_transaction_manipulated(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(5)
+        sut.is_valid()
+        # Act
+        sut.get_chain()[2]['transactions'][0]['data'] = 'Tampered'
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_block_of_a_copy_manipulated(self, w_sample_blocks_f):
+        # Arrange
+        sut = copy.deepcopy(w_sample_blocks_f(5))
+        sut.is_valid()
+        # Act
+        sut.get_chain()[1]['index'] = 23
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+
 class TestGetChainMethod(object):
     """
     Test the creation of a add transaction in a block
@@ -343,6 +437,117 @@ class TestAddTransactionCreation(object):
         assert sut.current_transactions[-1] == sample_transaction
 
 
+class TestAddTransactionsMethod(object):
+    """
+    Test the creation of many transactions at once
+    """
+
+    def test_on_valid_items(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut()
+        items = [sample_transaction_f() for _ in range(100)]
+        # Act
+        transactions, errors = sut.add_transactions(items)
+        # Assert
+        assert errors == {}
+        assert transactions == items
+        assert sut.current_transactions == items
+
+    def test_reports_errors_by_position(self,
+                                        sample_sut,
+                                        sample_transaction_f):
+        # Arrange
+        sut = sample_sut()
+        items = [
+            sample_transaction_f(),
+            {'other': 'value'},
+            sample_transaction_f(),
+            'Not a transaction',
+        ]
+        # Act
+        transactions, errors = sut.add_transactions(items)
+        # Assert
+        assert errors == {1: 'Missing values', 3: 'Not an object'}
+        assert transactions == [items[0], items[2]]
+        assert sut.current_transactions == transactions
+
+    def test_on_generator(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        transactions, errors = sut.add_transactions(
+            sample_transaction_f() for _ in range(3))
+        # Assert
+        assert len(transactions) == 3
+        assert errors == {}
+
+    def test_on_invalid_items_only(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        transactions, errors = sut.add_transactions([{}, []])
+        # Assert
+        assert transactions == []
+        assert len(errors) == 2
+        assert sut.current_transactions == []
+
+
+class TestMempool(object):
+    """
+    Test the pending transactions kept in the Mempool
+    """
+
+    def test_duplicates_are_pending_once(self,
+                                         sample_sut,
+                                         sample_transaction_f):
+        # Arrange
+        sut = sample_sut()
+        sample_transaction = sample_transaction_f()
+        first_transaction = sut.add_transaction(**sample_transaction)
+        # Act
+        retrieved_value = sut.add_transaction(**sample_transaction)
+        # Assert
+        assert retrieved_value is first_transaction
+        assert len(sut.current_transactions) == 1
+
+    def test_on_full_mempool(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(mempool=Mempool(max_count=2,
+                                         eviction=REJECT_NEWEST))
+        items = [sample_transaction_f() for _ in range(3)]
+        # Act
+        transactions, errors = sut.add_transactions(items)
+        # Assert
+        assert transactions == items[:2]
+        assert errors == {2: 'Mempool full'}
+
+    def test_block_size(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(block_size=3)
+        items = [sample_transaction_f() for _ in range(5)]
+        sut.add_transactions(items)
+        # Act
+        first_block = sut.mine()
+        second_block = sut.mine()
+        # Assert
+        assert first_block['transactions'] == items[:3]
+        assert second_block['transactions'] == items[3:]
+        assert sut.mine() == None
+        assert sut.is_valid() == True
+
+    def test_replaced_pending_transactions_keep_the_settings(
+            self, sample_sut, sample_transaction_f):
+        # Arrange
+        mempool = Mempool(max_count=2)
+        sut = sample_sut(mempool=mempool)
+        # Act
+        sut.current_transactions = [sample_transaction_f()
+                                    for _ in range(3)]
+        # Assert
+        assert sut.current_transactions is mempool
+        assert len(mempool) == 2
+
+
 class TestMineMethod(object):
     """
     Test the mine method
@@ -494,6 +699,379 @@ class TestNewBlockMethod(object):
         assert sut.last_block == retrieved_value
 
 
+class TestGetBlockHashMethod(object):
+    """
+    Test the lookup of the hash of a Block by index
+    """
+
+    def test_on_existing_block(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        # Act
+        retrieved_value = sut.get_block_hash(2)
+        # Assert
+        assert retrieved_value == validation.get_hash_of(sut.get_chain()[1])
+        assert retrieved_value == sut.get_chain()[2]['previous_hash']
+
+    def test_on_missing_block(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        retrieved_value = sut.get_block_hash(2)
+        # Assert
+        assert retrieved_value == None
+
+    def test_mining_hashes_only_the_new_block(self,
+                                              w_sample_blocks_f,
+                                              sample_transaction_f):
+        # Arrange
+        sut = w_sample_blocks_f(10)
+        sut.is_valid()
+        sut.add_transaction(**sample_transaction_f())
+        with mock.patch.object(validation, 'get_hash_of',
+                               wraps=validation.get_hash_of) as mock_hash:
+            # Act
+            sut.mine()
+            sut.is_valid()
+            # Assert
+            assert mock_hash.call_count == 1
+
+
+class TestGetBlockIndexMethod(object):
+    """
+    Test the lookup of the index of a Block by hash
+    """
+
+    def test_on_existing_block(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        block_hash = sut.get_block_hash(2)
+        # Act
+        retrieved_value = sut.get_block_index(block_hash)
+        # Assert
+        assert retrieved_value == 2
+
+    def test_on_missing_block(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        retrieved_value = sut.get_block_index(64 * 'a')
+        # Assert
+        assert retrieved_value == None
+
+
+class TestGetTransactionLocationMethod(object):
+    """
+    Test the lookup of a transaction by hash
+    """
+
+    def test_on_existing_transaction(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        transactions = sut.get_chain()[2]['transactions']
+        position = len(transactions) - 1
+        transaction_hash = validation.get_transaction_hash(
+            transactions[position])
+        # Act
+        retrieved_value = sut.get_transaction_location(transaction_hash)
+        # Assert
+        assert retrieved_value == (3, position)
+
+    def test_on_missing_transaction(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        # Act
+        retrieved_value = sut.get_transaction_location(64 * 'a')
+        # Assert
+        assert retrieved_value == None
+
+    def test_on_pending_transaction(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut()
+        transaction = sut.add_transaction(**sample_transaction_f())
+        transaction_hash = validation.get_transaction_hash(transaction)
+        # Act
+        retrieved_value = sut.get_transaction_location(transaction_hash)
+        # Assert
+        assert retrieved_value == None
+        sut.mine()
+        assert sut.get_transaction_location(transaction_hash) == (2, 0)
+
+
+class TestGetTransactionMethod(object):
+    """
+    Test the retrieval of a transaction by hash
+    """
+
+    def test_on_existing_transaction(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        transactions = sut.get_chain()[2]['transactions']
+        position = len(transactions) - 1
+        transaction_hash = validation.get_transaction_hash(
+            transactions[position])
+        # Act
+        retrieved_value = sut.get_transaction(transaction_hash)
+        # Assert
+        assert retrieved_value == (transactions[position], 3, position)
+
+    def test_on_missing_transaction(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        # Act
+        retrieved_value = sut.get_transaction(64 * 'a')
+        # Assert
+        assert retrieved_value == None
+
+
+class TestLookupIndex(object):
+    """
+    Test the lookup index following the chain
+    """
+
+    def test_built_once(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        sut.get_block_index(64 * 'a')
+        with mock.patch.object(sut, 'get_hash_of') as mock_hash:
+            # Act
+            sut.get_block_index(64 * 'a')
+            # Assert
+            mock_hash.assert_not_called()
+
+    def test_updated_by_mined_blocks(self,
+                                     w_sample_blocks_f,
+                                     sample_transaction_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        sut.get_block_index(64 * 'a')
+        sut.add_transaction(**sample_transaction_f())
+        # Act
+        block = sut.mine()
+        # Assert
+        assert sut.get_block_index(sut.get_hash_of(block)) == 5
+        assert len(sut._index) == 5
+
+    def test_rebuilt_after_outside_changes(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        block_hash = sut.get_block_hash(4)
+        sut.get_block_index(block_hash)
+        # Act
+        sut._chain.pop()
+        # Assert
+        assert sut.get_block_index(block_hash) == None
+        assert len(sut._index) == 3
+
+
+class TestGetValidatedHeightMethod(object):
+    """
+    Test the height known to be valid from the last check
+    """
+
+    def test_before_any_check(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        retrieved_value = sut.get_validated_height()
+        # Assert
+        assert retrieved_value == 0
+
+    def test_after_a_check(self, w_sample_blocks_f, sample_transaction_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        sut.is_valid()
+        sut.add_transaction(**sample_transaction_f())
+        sut.mine()
+        with mock.patch.object(validation, 'find_invalid_link') as mock_find:
+            # Act
+            retrieved_value = sut.get_validated_height()
+            # Assert
+            assert retrieved_value == 4
+            mock_find.assert_not_called()
+
+    def test_after_a_manipulation(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        sut.is_valid()
+        # Act
+        sut.last_block['index'] = 23
+        retrieved_value = sut.get_validated_height()
+        # Assert
+        assert retrieved_value == 0
+
+
+class TestMerkleFormat(object):
+    """
+    Test the blockchain sealing blocks in the Merkle format
+    """
+
+    def test_blocks_have_the_merkle_root(self, sample_sut):
+        # Arrange
+        sut = sample_sut(merkle=True)
+        # Act
+        retrieved_value = sut.genesis_block
+        # Assert
+        assert (retrieved_value['merkle_root'] ==
+                validation.get_merkle_root(retrieved_value['transactions']))
+
+    def test_is_valid(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(merkle=True)
+        for block in range(5):  # pylint: disable=unused-variable
+            sut.add_transaction(**sample_transaction_f())
+            sut.add_transaction(**sample_transaction_f())
+            sut.mine()
+        # Act
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == True
+
+    def test_on_tampered_transaction(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(merkle=True)
+        for block in range(3):  # pylint: disable=unused-variable
+            sut.add_transaction(**sample_transaction_f())
+            sut.mine()
+        # Act
+        sut._chain[1]['transactions'][0]['data'] = 'Tampered'
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+    def test_transaction_proof(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(merkle=True)
+        for transaction in range(7):  # pylint: disable=unused-variable
+            sut.add_transaction(**sample_transaction_f())
+        block = sut.mine()
+        # Act
+        proof = sut.get_transaction_proof(block['index'], 5)
+        # Assert
+        assert validation.is_an_included_transaction(
+            block['transactions'][5], proof, block['merkle_root']) == True
+
+    def test_no_transaction_proof_on_legacy_block(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        retrieved_value = sut.get_transaction_proof(1, 0)
+        # Assert
+        assert retrieved_value == None
+
+
+class TestProofOfWork(object):
+    """
+    Test the blockchain mining blocks with a Proof of Work
+    """
+
+    def test_blocks_solve_the_difficulty(self,
+                                         sample_sut,
+                                         sample_transaction_f):
+        # Arrange
+        sut = sample_sut(difficulty=8)
+        sut.add_transaction(**sample_transaction_f())
+        # Act
+        sut.mine()
+        # Assert
+        assert all('nonce' in block for block in sut.get_chain())
+        assert all(validation.meets_difficulty(sut.get_hash_of(block), 8)
+                   for block in sut.get_chain())
+
+    def test_blocks_mined_on_the_merkle_header(self,
+                                               sample_sut,
+                                               sample_transaction_f):
+        # Arrange
+        sut = sample_sut(difficulty=8)
+        sut.add_transaction(**sample_transaction_f())
+        # Act
+        block = sut.mine()
+        # Assert
+        assert validation.is_a_merkle_block(block)
+        assert validation.has_a_valid_body(block)
+
+    def test_is_valid(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(merkle=True, difficulty=8, mining_processes=2)
+        for block in range(3):  # pylint: disable=unused-variable
+            sut.add_transaction(**sample_transaction_f())
+            sut.mine()
+        # Act
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == True
+
+    def test_on_chain_without_work(self, sample_sut, w_sample_blocks_f):
+        # Arrange
+        sut = sample_sut(difficulty=16)
+        sut._chain = w_sample_blocks_f(3).get_chain()
+        # Act
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+    def test_set_difficulty_of_chain_with_blocks(self, sample_sut):
+        # Arrange
+        sut = sample_sut(difficulty=8)
+        sut.is_valid()
+        # Act
+        with pytest.raises(ValueError):
+            sut.difficulty = 0
+        # Assert
+        assert sut.difficulty == 8
+        assert sut.is_valid() == True
+
+    def test_set_difficulty_of_empty_chain(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        sut._chain = []
+        # Act
+        sut.difficulty = 8
+        sut.mine()
+        # Assert
+        assert validation.meets_difficulty(sut.get_hash_of(sut.last_block),
+                                           8)
+        assert sut.is_valid() == True
+
+    def test_set_same_difficulty(self, sample_sut):
+        # Arrange
+        sut = sample_sut(difficulty=8)
+        sut.is_valid()
+        # Act
+        sut.difficulty = 8
+        # Assert
+        assert sut._validated_height == 0
+        assert sut.is_valid() == True
+
+    @pytest.mark.parametrize('difficulty', [-1, 257])
+    def test_difficulty_out_of_range(self, sample_sut, difficulty):
+        # Arrange
+        # Act
+        # Assert
+        with pytest.raises(ValueError):
+            sample_sut(difficulty=difficulty)
+
+    def test_set_difficulty_out_of_range(self, sample_sut):
+        # Arrange
+        sut = sample_sut(difficulty=8)
+        # Act
+        with pytest.raises(ValueError):
+            sut.difficulty = 300
+        # Assert
+        assert sut.difficulty == 8
+
+    def test_on_tampered_nonce(self, sample_sut, sample_transaction_f):
+        # Arrange
+        sut = sample_sut(difficulty=16)
+        sut.add_transaction(**sample_transaction_f())
+        sut.mine()
+        # Act
+        sut._chain[-1]['nonce'] += 1
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+
 class TestHashMethod(object):
     """
     Test the hash method of the Blockchain
@@ -504,7 +1082,7 @@ class TestHashMethod(object):
         import hashlib
         import json
 
-        block_string = json.dumps(block, sort_keys=True).encode()
+        block_string = json.dumps(block.to_dict(), sort_keys=True).encode()
         return hashlib.sha256(block_string).hexdigest()
 
     def test_on_genesis_block(self, sample_sut):
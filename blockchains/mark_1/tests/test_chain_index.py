@@ -0,0 +1,89 @@
+import pytest
+
+from ..chain_index import ChainIndex as ChainIndexSUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def indexed_chain_f():
+
+    def _make_indexed_chain(number, transactions=3):
+        sut = ChainIndexSUT()
+        for height in range(1, number + 1):
+            sut.append(f'block {height}',
+                       [f'transaction {height}.{position}'
+                        for position in range(transactions)])
+        return sut
+
+    return _make_indexed_chain
+
+
+# Tests
+
+class TestChainIndex(object):
+    """
+    Test the lookup index of the blocks and transactions
+    """
+
+    def test_block_height(self, indexed_chain_f):
+        # Arrange
+        sut = indexed_chain_f(5)
+        # Act
+        retrieved_value = sut.get_height('block 3')
+        # Assert
+        assert retrieved_value == 3
+        assert len(sut) == 5
+
+    def test_transaction_location(self, indexed_chain_f):
+        # Arrange
+        sut = indexed_chain_f(5)
+        # Act
+        retrieved_value = sut.get_transaction_location('transaction 4.2')
+        # Assert
+        assert retrieved_value == (4, 2)
+
+    def test_on_missing_hashes(self, indexed_chain_f):
+        # Arrange
+        sut = indexed_chain_f(5)
+        # Act
+        # Assert
+        assert sut.get_height('block 6') == None
+        assert sut.get_transaction_location('transaction 6.0') == None
+
+    def test_truncate(self, indexed_chain_f):
+        # Arrange
+        sut = indexed_chain_f(5)
+        # Act
+        sut.truncate(3)
+        # Assert
+        assert len(sut) == 3
+        assert sut.get_height('block 3') == 3
+        assert sut.get_height('block 4') == None
+        assert sut.get_transaction_location('transaction 3.0') == (3, 0)
+        assert sut.get_transaction_location('transaction 5.0') == None
+
+    def test_rolled_forward_after_truncate(self, indexed_chain_f):
+        # Arrange
+        sut = indexed_chain_f(5)
+        sut.truncate(3)
+        # Act
+        sut.append('fork 4', ['transaction 5.1', 'fork transaction'])
+        # Assert
+        assert sut.get_height('fork 4') == 4
+        assert sut.get_transaction_location('transaction 5.1') == (4, 0)
+        assert sut.get_transaction_location('fork transaction') == (4, 1)
+
+    def test_repeated_transaction_is_found_at_the_first_block(self):
+        # Arrange
+        sut = ChainIndexSUT()
+        sut.append('block 1', ['repeated'])
+        sut.append('block 2', ['other', 'repeated'])
+        # Act
+        retrieved_value = sut.get_transaction_location('repeated')
+        # Assert
+        assert retrieved_value == (1, 0)
+        sut.truncate(1)
+        assert sut.get_transaction_location('repeated') == (1, 0)
+        sut.truncate(0)
+        assert sut.get_transaction_location('repeated') == None
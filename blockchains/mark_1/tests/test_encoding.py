@@ -0,0 +1,256 @@
+import hashlib
+import json
+import pytest
+import random
+
+from .. import encoding as SUT
+from .. import validation
+from ..blockchain import Blockchain as BlockchainMark1
+from ...mark_2.blockchain import Blockchain as BlockchainMark2
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def reference_encoding():
+
+    def _reference_encoding(value):
+        return json.dumps(value, sort_keys=True).encode()
+
+    return _reference_encoding
+
+
+@pytest.fixture(scope="function")
+def reference_hash(reference_encoding):
+
+    def _reference_hash(block):
+        return hashlib.sha256(reference_encoding(block)).hexdigest()
+
+    return _reference_hash
+
+
+@pytest.fixture(scope="function")
+def sample_block_f():
+
+    def _make_sample_block(value):
+        return {
+            'index': 2,
+            'timestamp': 1231006505.0,
+            'transactions': [
+                {
+                    'data': value,
+                },
+            ],
+            'previous_hash': 64 * 'a',
+        }
+
+    return _make_sample_block
+
+
+SAMPLE_VALUES = [
+    '',
+    'Chancellor on brink of second bailout for banks',
+    'Quotes " and backslashes \\ and slashes /',
+    'Control characters \n \t \x00 \x1f',
+    'Unicode àèìòù ₿ 𝄞 \ud800',
+    0,
+    -1,
+    2 ** 70,
+    0.1,
+    -0.0,
+    1e-07,
+    1e+22,
+    1231006505.123456,
+    float('nan'),
+    float('inf'),
+    float('-inf'),
+    True,
+    False,
+    None,
+    [],
+    [1, 'a', None, [2.5]],
+    {},
+    {'b': 1, 'a': {'d': [], 'c': 'x'}},
+]
+
+
+# Tests
+
+class TestEncodeBlockFunction(object):
+    """
+    Test that the canonical encoding matches json.dumps(sort_keys=True)
+    """
+
+    @pytest.mark.parametrize('value', SAMPLE_VALUES)
+    def test_on_transaction_values(self,
+                                   value,
+                                   sample_block_f,
+                                   reference_encoding):
+        # Arrange
+        block = sample_block_f(value)
+        # Act
+        retrieved_value = SUT.encode_block(block)
+        # Assert
+        assert retrieved_value == reference_encoding(block)
+
+    @pytest.mark.parametrize('value', SAMPLE_VALUES)
+    def test_on_header_values(self,
+                              value,
+                              sample_block_f,
+                              reference_encoding):
+        # Arrange
+        block = sample_block_f('data')
+        block['timestamp'] = value
+        # Act
+        retrieved_value = SUT.encode_block(block)
+        # Assert
+        assert retrieved_value == reference_encoding(block)
+
+    @pytest.mark.parametrize('value', SAMPLE_VALUES)
+    def test_with_encoded_transactions(self,
+                                       value,
+                                       sample_block_f,
+                                       reference_encoding):
+        # Arrange
+        block = sample_block_f(value)
+        encoded_transactions = SUT.encode_transactions(block['transactions'])
+        # Act
+        retrieved_value = SUT.encode_block(block, encoded_transactions)
+        # Assert
+        assert retrieved_value == reference_encoding(block)
+
+    def test_on_unknown_schema(self, reference_encoding):
+        # Arrange
+        block = {
+            'z': 1,
+            'é': 2,
+            'previous_hash': '0',
+            'a': [{'y': 1, 'x': 2}],
+        }
+        # Act
+        retrieved_value = SUT.encode_block(block)
+        # Assert
+        assert retrieved_value == reference_encoding(block)
+
+    def test_on_empty_block(self, reference_encoding):
+        # Arrange
+        block = {}
+        # Act
+        retrieved_value = SUT.encode_block(block)
+        # Assert
+        assert retrieved_value == reference_encoding(block)
+
+    def test_on_not_string_keys(self, reference_encoding):
+        # Arrange
+        block = {
+            2: 'b',
+            1: 'a',
+        }
+        # Act
+        retrieved_value = SUT.encode_block(block)
+        # Assert
+        assert retrieved_value == reference_encoding(block)
+
+
+class TestEncodeBlockAroundFunction(object):
+    """
+    Test the encoding of a Block around the value of one of its keys
+    """
+
+    @pytest.mark.parametrize('key', ['index', 'nonce', 'transactions'])
+    def test_surrounds_the_value(self,
+                                 key,
+                                 sample_block_f,
+                                 reference_encoding):
+        # Arrange
+        block = sample_block_f('data')
+        block['nonce'] = 12345
+        # Act
+        prefix, suffix = SUT.encode_block_around(block, key)
+        # Assert
+        assert (prefix + SUT.encode_value(block[key]).encode() + suffix ==
+                reference_encoding(block))
+
+    def test_on_header_only(self, sample_block_f, reference_encoding):
+        # Arrange
+        block = sample_block_f('data')
+        block['nonce'] = 12345
+        header = {key: value for key, value in block.items()
+                  if key != 'transactions'}
+        # Act
+        prefix, suffix = SUT.encode_block_around(block,
+                                                 'nonce',
+                                                 header_only=True)
+        # Assert
+        assert prefix + b'12345' + suffix == reference_encoding(header)
+
+    def test_on_not_string_keys(self):
+        # Arrange
+        block = {
+            1: 'a',
+            'nonce': 0,
+        }
+        # Act
+        # Assert
+        with pytest.raises(ValueError):
+            SUT.encode_block_around(block, 'nonce')
+
+
+class TestHashCompatibility(object):
+    """
+    Test that the hashes of existing chains are unchanged
+    """
+
+    def test_on_known_genesis_block(self):
+        # Arrange
+        block = {
+            'index': 1,
+            'timestamp': 1231006505.0,
+            'transactions': [
+                {
+                    'data': ('The Times 03/Jan/2009 ' +
+                             'Chancellor on brink of second bailout for banks'),
+                },
+            ],
+            'previous_hash': '0',
+        }
+        expected_hash = ('1f071bb157214d11f5f748aeda3e12db'
+                         '56cca256b850228edabdd60fa5c72d6f')
+        # Act
+        retrieved_value = validation.get_hash_of(block)
+        # Assert
+        assert retrieved_value == expected_hash
+
+    def test_on_mark_1_chain(self, reference_hash):
+        # Arrange
+        sut = BlockchainMark1()
+        for block in range(10):  # pylint: disable=unused-variable
+            for transaction in range(random.randint(1, 10)):
+                sut.add_transaction(f'Transaction {block}.{transaction} ₿')
+            sut.mine()
+        chain = sut.get_chain()
+        # Act
+        retrieved_values = [sut.get_hash_of(block) for block in chain]
+        # Assert
+        assert retrieved_values == [reference_hash(block.to_dict())
+                                    for block in chain]
+        assert all(block['previous_hash'] ==
+                   reference_hash(previous_block.to_dict())
+                   for previous_block, block in zip(chain, chain[1:]))
+
+    def test_on_mark_2_chain(self, reference_hash):
+        # Arrange
+        sut = BlockchainMark2()
+        for block in range(10):
+            sut.add_transaction(unlock=f'a = {block}',
+                                lock='output = [a, a / 3, str(a), None]')
+            sut.mine()
+        chain = sut.get_chain()
+        # Act
+        retrieved_values = [sut.get_hash_of(block) for block in chain]
+        # Assert
+        assert retrieved_values == [reference_hash(block.to_dict())
+                                    for block in chain]
+        assert all(block['previous_hash'] ==
+                   reference_hash(previous_block.to_dict())
+                   for previous_block, block in zip(chain, chain[1:]))
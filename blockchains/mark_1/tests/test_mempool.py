@@ -0,0 +1,192 @@
+import pytest
+
+from unittest import mock
+
+from .. import mempool as SUT
+from .. import validation
+from ..transaction import Transaction
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def transactions_f():
+
+    def _make_transactions(number, size=10):
+        return [Transaction(data=f'{number:0{size}d}')
+                for number in range(number)]
+
+    return _make_transactions
+
+
+# Tests
+
+class TestMempool(object):
+    """
+    Test the pool of the pending transactions
+    """
+
+    def test_reads_like_a_list(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(5)
+        # Act
+        sut = SUT.Mempool(transactions)
+        # Assert
+        assert len(sut) == 5
+        assert sut == transactions
+        assert list(sut) == transactions
+        assert sut[0] == transactions[0]
+        assert sut[2] == transactions[2]
+        assert sut[-1] == transactions[-1]
+        assert sut[1:3] == transactions[1:3]
+        with pytest.raises(IndexError):
+            sut[5]
+
+    def test_deduplicates_by_hash(self, transactions_f):
+        # Arrange
+        sut = SUT.Mempool(transactions_f(3))
+        duplicate = Transaction(data=transactions_f(3)[1]['data'])
+        # Act
+        retrieved_value = sut.add(duplicate)
+        # Assert
+        assert retrieved_value is sut[1]
+        assert len(sut) == 3
+        assert duplicate in sut
+
+    def test_plain_dicts_hash_as_transactions(self, transactions_f):
+        # Arrange
+        sut = SUT.Mempool(transactions_f(3))
+        # Act
+        retrieved_value = sut.add({'data': transactions_f(3)[2]['data']})
+        # Assert
+        assert retrieved_value is sut[2]
+        assert len(sut) == 3
+
+    def test_get_by_hash(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(3)
+        sut = SUT.Mempool(transactions)
+        transaction_hash = validation.get_transaction_hash(transactions[1])
+        # Act
+        retrieved_value = sut.get(transaction_hash)
+        # Assert
+        assert retrieved_value is transactions[1]
+        assert sut.get(64 * '0') is None
+
+    def test_evicts_the_oldest(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(5)
+        # Act
+        sut = SUT.Mempool(transactions, max_count=3)
+        # Assert
+        assert sut == transactions[2:]
+        assert sut.evictions == 2
+
+    def test_rejects_the_newest(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(5)
+        sut = SUT.Mempool(transactions[:3],
+                          max_count=3,
+                          eviction=SUT.REJECT_NEWEST)
+        # Act
+        retrieved_value = sut.add(transactions[3])
+        # Assert
+        assert retrieved_value is None
+        assert sut == transactions[:3]
+        assert sut.rejections == 1
+
+    def test_bounded_in_bytes(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(10)
+        size = len(b'{"data": "0000000000"}')
+        # Act
+        sut = SUT.Mempool(transactions, max_bytes=4 * size)
+        # Assert
+        assert sut == transactions[6:]
+        assert sut.size_bytes == 4 * size
+
+    def test_rejects_a_transaction_bigger_than_the_pool(self,
+                                                        transactions_f):
+        # Arrange
+        sut = SUT.Mempool(transactions_f(2), max_bytes=50)
+        # Act
+        retrieved_value = sut.add(Transaction(data=100 * 'x'))
+        # Assert
+        assert retrieved_value is None
+        assert len(sut) == 2
+
+    def test_unknown_eviction_policy(self):
+        # Act
+        with pytest.raises(ValueError):
+            SUT.Mempool(eviction='random')
+
+    def test_select(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(5)
+        sut = SUT.Mempool(transactions)
+        # Act
+        retrieved_value = sut.select(2)
+        # Assert
+        assert retrieved_value == transactions[:2]
+        assert len(sut) == 5
+
+    def test_take(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(5)
+        sut = SUT.Mempool(transactions)
+        size_bytes = sut.size_bytes
+        # Act
+        retrieved_value = sut.take(2)
+        # Assert
+        assert retrieved_value == transactions[:2]
+        assert sut == transactions[2:]
+        assert sut.size_bytes == size_bytes * 3 // 5
+        assert sut.take() == transactions[2:]
+        assert len(sut) == 0
+        assert sut.size_bytes == 0
+
+    def test_taken_transactions_can_be_added_again(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(2)
+        sut = SUT.Mempool(transactions)
+        sut.take()
+        # Act
+        sut.add(transactions[0])
+        # Assert
+        assert sut == transactions[:1]
+
+    def test_restore_in_front(self, transactions_f):
+        # Arrange
+        transactions = transactions_f(5)
+        sut = SUT.Mempool(transactions[:3],
+                          max_count=3,
+                          eviction=SUT.REJECT_NEWEST)
+        taken = sut.take(2)
+        sut.extend(transactions[3:])
+        # Act
+        sut.restore(taken)
+        # Assert
+        assert sut == transactions
+        assert sut.rejections == 0
+        assert sut.size_bytes == sum(
+            len(validation.encoding.encode_value(transaction))
+            for transaction in transactions)
+
+    def test_lookup_doesnt_scan(self, transactions_f):
+        # Arrange
+        sut = SUT.Mempool(transactions_f(1000))
+        with mock.patch.object(SUT.Mempool, '__iter__') as mock_iter:
+            # Act
+            sut.add(Transaction(data='New'))
+            # Assert
+            mock_iter.assert_not_called()
+
+    def test_stats(self, transactions_f):
+        # Arrange
+        sut = SUT.Mempool(transactions_f(3), max_count=2)
+        # Act
+        retrieved_value = sut.get_stats()
+        # Assert
+        assert retrieved_value['transactions'] == 2
+        assert retrieved_value['evictions'] == 1
+        assert retrieved_value['rejections'] == 0
@@ -0,0 +1,114 @@
+import hashlib
+import math
+import pytest
+
+from .. import merkle as SUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def leaf_hashes_f():
+
+    def _make_leaf_hashes(number):
+        return [hashlib.sha256(f'Transaction {leaf}'.encode()).hexdigest()
+                for leaf in range(number)]
+
+    return _make_leaf_hashes
+
+
+# Tests
+
+class TestGetRootFunction(object):
+    """
+    Test the computation of the Merkle root
+    """
+
+    def test_on_empty_leaves(self):
+        # Arrange
+        # Act
+        retrieved_value = SUT.get_root([])
+        # Assert
+        assert retrieved_value == hashlib.sha256(b'').hexdigest()
+
+    def test_on_single_leaf(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(1)
+        expected_root = hashlib.sha256(
+            SUT.LEAF_PREFIX + bytes.fromhex(leaf_hashes[0])).hexdigest()
+        # Act
+        retrieved_value = SUT.get_root(leaf_hashes)
+        # Assert
+        assert retrieved_value == expected_root
+
+    def test_depends_on_the_order(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(4)
+        # Act
+        retrieved_value = SUT.get_root(leaf_hashes[::-1])
+        # Assert
+        assert retrieved_value != SUT.get_root(leaf_hashes)
+
+    def test_odd_leaf_is_not_duplicated(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(3)
+        # Act
+        retrieved_value = SUT.get_root(leaf_hashes + leaf_hashes[-1:])
+        # Assert
+        assert retrieved_value != SUT.get_root(leaf_hashes)
+
+
+class TestProofs(object):
+    """
+    Test the proofs of inclusion
+    """
+
+    @pytest.mark.parametrize('number', range(1, 18))
+    def test_every_leaf_is_included(self, number, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(number)
+        root = SUT.get_root(leaf_hashes)
+        for position, leaf_hash in enumerate(leaf_hashes):
+            # Act
+            proof = SUT.get_proof(leaf_hashes, position)
+            # Assert
+            assert SUT.verify_proof(leaf_hash, proof, root) == True
+            assert len(proof) <= math.ceil(math.log2(number))
+
+    def test_on_other_leaf(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(8)
+        root = SUT.get_root(leaf_hashes)
+        proof = SUT.get_proof(leaf_hashes, 3)
+        # Act
+        retrieved_value = SUT.verify_proof(leaf_hashes[4], proof, root)
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_other_root(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(8)
+        root = SUT.get_root(leaf_hashes[:-1])
+        proof = SUT.get_proof(leaf_hashes, 3)
+        # Act
+        retrieved_value = SUT.verify_proof(leaf_hashes[3], proof, root)
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_malformed_proof(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(2)
+        root = SUT.get_root(leaf_hashes)
+        proof = [('up', leaf_hashes[1])]
+        # Act
+        retrieved_value = SUT.verify_proof(leaf_hashes[0], proof, root)
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_position_out_of_range(self, leaf_hashes_f):
+        # Arrange
+        leaf_hashes = leaf_hashes_f(2)
+        # Act
+        # Assert
+        with pytest.raises(IndexError):
+            SUT.get_proof(leaf_hashes, 2)
@@ -0,0 +1,221 @@
+import pytest
+import threading
+
+from .. import mining as SUT
+from .. import validation
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def sample_block():
+    return {
+        'index': 2,
+        'timestamp': 1231006505.0,
+        'transactions': [
+            {
+                'data': 'Chancellor on brink of second bailout for banks',
+            },
+        ],
+        'previous_hash': 64 * 'a',
+    }
+
+
+@pytest.fixture(scope="function")
+def sample_merkle_block(sample_block):
+    sample_block['merkle_root'] = validation.get_merkle_root(
+        sample_block['transactions'])
+    return sample_block
+
+
+# Tests
+
+class TestMidstateHasher(object):
+    """
+    Test the hashing of a Block for many nonces
+    """
+
+    @pytest.mark.parametrize('nonce', [0, 1, 9, 10, 12345, 2 ** 70])
+    def test_on_legacy_block(self, nonce, sample_block):
+        # Arrange
+        sut = SUT.MidstateHasher(sample_block)
+        sample_block['nonce'] = nonce
+        # Act
+        retrieved_value = sut.hexdigest(nonce)
+        # Assert
+        assert retrieved_value == validation.get_hash_of(sample_block)
+
+    @pytest.mark.parametrize('nonce', [0, 1, 9, 10, 12345, 2 ** 70])
+    def test_on_merkle_block(self, nonce, sample_merkle_block):
+        # Arrange
+        sut = SUT.MidstateHasher(sample_merkle_block)
+        sample_merkle_block['nonce'] = nonce
+        # Act
+        retrieved_value = sut.hexdigest(nonce)
+        # Assert
+        assert retrieved_value == validation.get_hash_of(sample_merkle_block)
+
+    def test_merkle_suffix_leaves_the_transactions_out(self,
+                                                       sample_merkle_block):
+        # Arrange
+        sut = SUT.MidstateHasher(sample_merkle_block)
+        # Act
+        retrieved_value = sut._suffix
+        # Assert
+        assert b'transactions' not in retrieved_value
+        assert b'Chancellor' not in retrieved_value
+
+    def test_digest(self, sample_block):
+        # Arrange
+        sut = SUT.MidstateHasher(sample_block)
+        # Act
+        retrieved_value = sut.digest(42)
+        # Assert
+        assert retrieved_value.hex() == sut.hexdigest(42)
+
+
+class TestGetTargetFunction(object):
+    """
+    Test the digest bound of the Proof of Work
+    """
+
+    @pytest.mark.parametrize('difficulty', [1, 8, 13, 255])
+    def test_matches_meets_difficulty(self, difficulty):
+        # Arrange
+        target = SUT.get_target(difficulty)
+        below = (int.from_bytes(target, 'big') - 1).to_bytes(32, 'big')
+        # Act
+        # Assert
+        assert validation.meets_difficulty(below.hex(), difficulty) == True
+        assert validation.meets_difficulty(target.hex(), difficulty) == False
+
+    def test_without_difficulty(self):
+        # Arrange
+        # Act
+        retrieved_value = SUT.get_target(0)
+        # Assert
+        assert retrieved_value == None
+
+    def test_above_max_difficulty(self):
+        # Arrange
+        # Act
+        # Assert
+        with pytest.raises(ValueError):
+            SUT.get_target(257)
+
+
+class TestMeetsDifficultyFunction(object):
+    """
+    Test the check of the Proof of Work target
+    """
+
+    @pytest.mark.parametrize('block_hash, difficulty, expected_value', [
+        (64 * 'f', 0, True),
+        (64 * 'f', 1, False),
+        ('7' + 63 * 'f', 1, True),
+        ('7' + 63 * 'f', 2, False),
+        ('0' + 63 * 'f', 4, True),
+        ('0' + 63 * 'f', 5, False),
+        (64 * '0', 256, True),
+    ])
+    def test_on_sample_hashes(self, block_hash, difficulty, expected_value):
+        # Arrange
+        # Act
+        retrieved_value = validation.meets_difficulty(block_hash, difficulty)
+        # Assert
+        assert retrieved_value == expected_value
+
+
+class TestSearchNoncesFunction(object):
+    """
+    Test the nonce search loop of a single worker
+    """
+
+    def test_without_difficulty(self, sample_block):
+        # Arrange
+        # Act
+        nonce = SUT.search_nonces(sample_block, 0, first=7)
+        # Assert
+        assert nonce == 7
+
+    def test_finds_a_solution(self, sample_block):
+        # Arrange
+        difficulty = 8
+        # Act
+        nonce = SUT.search_nonces(sample_block, difficulty)
+        # Assert
+        sample_block['nonce'] = nonce
+        assert validation.meets_difficulty(
+            validation.get_hash_of(sample_block), difficulty)
+
+    def test_does_not_change_the_block(self, sample_block):
+        # Arrange
+        expected_block = dict(sample_block)
+        # Act
+        SUT.search_nonces(sample_block, 4)
+        # Assert
+        assert sample_block == expected_block
+
+    def test_stops_after_the_attempts(self, sample_block):
+        # Arrange
+        difficulty = 256
+        # Act
+        nonce = SUT.search_nonces(sample_block, difficulty, attempts=100)
+        # Assert
+        assert nonce == None
+
+    def test_stops_on_the_stop_event(self, sample_block):
+        # Arrange
+        stop_event = threading.Event()
+        stop_event.set()
+        # Act
+        nonce = SUT.search_nonces(sample_block, 256, stop_event=stop_event)
+        # Assert
+        assert nonce == None
+
+    def test_tries_the_interleaved_nonces(self, sample_block):
+        # Arrange
+        first, step = 3, 4
+        # Act
+        nonce = SUT.search_nonces(sample_block, 6, first=first, step=step)
+        # Assert
+        assert nonce % step == first
+
+    def test_on_merkle_block(self, sample_merkle_block):
+        # Arrange
+        difficulty = 8
+        # Act
+        nonce = SUT.search_nonces(sample_merkle_block, difficulty)
+        # Assert
+        sample_merkle_block['nonce'] = nonce
+        assert validation.meets_difficulty(
+            validation.get_hash_of(sample_merkle_block), difficulty)
+
+
+class TestSearchNonceFunction(object):
+    """
+    Test the nonce search across processes
+    """
+
+    @pytest.mark.parametrize('processes', [1, 2, 3])
+    def test_finds_a_solution(self, processes, sample_block):
+        # Arrange
+        difficulty = 10
+        # Act
+        nonce = SUT.search_nonce(sample_block, difficulty, processes)
+        # Assert
+        sample_block['nonce'] = nonce
+        assert validation.meets_difficulty(
+            validation.get_hash_of(sample_block), difficulty)
+
+    @pytest.mark.parametrize('processes', [1, 2])
+    def test_cancelled(self, processes, sample_block):
+        # Arrange
+        stop_event = threading.Event()
+        timer = threading.Timer(0.2, stop_event.set)
+        timer.start()
+        # Act
+        nonce = SUT.search_nonce(sample_block, 256, processes, stop_event)
+        # Assert
+        assert nonce == None
+        timer.join()
@@ -0,0 +1,104 @@
+import json
+import pytest
+
+from .. import encoding
+from .. import ndjson as SUT
+from ..block import Block
+from ..storage import BlockStore
+from .test_blockchain import (sample_sut,
+                              sample_transaction_f,
+                              w_sample_blocks_f)
+
+
+# Tests
+
+class TestDumpBlocks(object):
+    """
+    Test the NDJSON encoding of the blocks
+    """
+
+    def test_one_block_per_line(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(3).get_chain()
+        # Act
+        retrieved_value = list(SUT.dump_blocks(blocks))
+        # Assert
+        assert retrieved_value == [encoding.encode_block(block) + b'\n'
+                                   for block in blocks]
+
+    def test_range(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(5).get_chain()
+        # Act
+        retrieved_value = list(SUT.dump_blocks(blocks, 1, 3))
+        # Assert
+        assert [json.loads(line) for line in retrieved_value] == blocks[1:3]
+
+    def test_on_stored_blocks(self, w_sample_blocks_f, tmp_path):
+        # Arrange
+        blocks = w_sample_blocks_f(3).get_chain()
+        with BlockStore(str(tmp_path)) as store:
+            store.extend(blocks)
+            # Act
+            retrieved_value = list(SUT.dump_blocks(store))
+            # Assert
+            assert retrieved_value == list(SUT.dump_blocks(blocks))
+            assert all(type(line) is bytes for line in retrieved_value)
+
+
+class TestLoadBlocks(object):
+    """
+    Test the NDJSON decoding of the blocks
+    """
+
+    def test_round_trip(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(3).get_chain()
+        lines = SUT.dump_blocks(blocks)
+        # Act
+        retrieved_value = list(SUT.load_blocks(lines))
+        # Assert
+        assert retrieved_value == blocks
+        assert all(isinstance(block, Block) for block in retrieved_value)
+        assert ([block.hash for block in retrieved_value] ==
+                [block.hash for block in blocks])
+
+    def test_blank_lines_are_skipped(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(1).get_chain()
+        lines = [line.decode().rstrip('\n')
+                 for line in SUT.dump_blocks(blocks)]
+        # Act
+        retrieved_value = list(SUT.load_blocks(['', lines[0], ' ', lines[1]]))
+        # Assert
+        assert retrieved_value == blocks
+
+    def test_is_lazy(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(3).get_chain()
+        read_lines = []
+
+        def lines():
+            for line in SUT.dump_blocks(blocks):
+                read_lines.append(line)
+                yield line
+
+        # Act
+        retrieved_value = next(SUT.load_blocks(lines()))
+        # Assert
+        assert retrieved_value == blocks[0]
+        assert len(read_lines) == 1
+
+
+class TestExportMethod(object):
+    """
+    Test the NDJSON export of the Blockchain
+    """
+
+    def test_on_range(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(4)
+        # Act
+        retrieved_value = list(sut.export(2, 3))
+        # Assert
+        assert retrieved_value == list(SUT.dump_blocks(sut.get_chain(), 1, 3))
@@ -0,0 +1,401 @@
+import os
+import pytest
+
+from unittest import mock
+
+from .. import storage
+from ..block import Block
+from ..blockchain import Blockchain
+from ..storage import BlockStore as BlockStoreSUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def sample_blocks_f():
+
+    def _make_sample_blocks(number):
+        blocks = []
+        previous_hash = '0'
+        for index in range(1, number + 1):
+            block = Block({
+                'index': index,
+                'timestamp': 1231006505.0 + index,
+                'transactions': [{'data': f'Transaction {index} ₿'}],
+                'previous_hash': previous_hash,
+            })
+            previous_hash = block.hash
+            blocks.append(block)
+        return blocks
+
+    return _make_sample_blocks
+
+
+@pytest.fixture(scope="function")
+def store_f(tmp_path):
+
+    def _make_store(blocks=(), **kwargs):
+        store = BlockStoreSUT(str(tmp_path), **kwargs)
+        store.extend(blocks)
+        return store
+
+    return _make_store
+
+
+@pytest.fixture(scope="function")
+def segment_path(tmp_path):
+    return os.path.join(str(tmp_path), storage.SEGMENT_FILE_NAME)
+
+
+@pytest.fixture(scope="function")
+def index_path(tmp_path):
+    return os.path.join(str(tmp_path), storage.INDEX_FILE_NAME)
+
+
+# Tests
+
+class TestReadsAndWrites(object):
+    """
+    Test the blocks written to and read from the store
+    """
+
+    def test_on_empty_store(self, store_f):
+        # Arrange
+        # Act
+        sut = store_f()
+        # Assert
+        assert len(sut) == 0
+        assert list(sut) == []
+
+    def test_blocks_are_read_back(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        # Act
+        sut = store_f(blocks)
+        # Assert
+        assert len(sut) == 5
+        assert list(sut) == blocks
+        assert sut[-2] == blocks[-2]
+        assert sut[1:3] == blocks[1:3]
+        assert [block.hash for block in sut] == [block.hash
+                                                 for block in blocks]
+
+    def test_raw_block_is_the_canonical_encoding(self,
+                                                 store_f,
+                                                 sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(3)
+        sut = store_f(blocks)
+        # Act
+        retrieved_value = sut.read_raw(1)
+        # Assert
+        assert retrieved_value == storage.encoding.encode_block(blocks[1])
+
+    def test_raw_block_is_a_copy_of_the_segment(self,
+                                                store_f,
+                                                sample_blocks_f):
+        # Arrange
+        sut = store_f(sample_blocks_f(3))
+        # Act
+        retrieved_value = sut.read_raw(-1)
+        # Assert
+        assert isinstance(retrieved_value, bytes)
+
+    def test_raw_blocks_of_a_growing_store(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(6)
+        sut = store_f(blocks[:3])
+        sut.read_raw(0)
+        # Act
+        sut.extend(blocks[3:])
+        retrieved_value = list(sut.iter_raw(2, 5))
+        # Assert
+        assert retrieved_value == [storage.encoding.encode_block(block)
+                                   for block in blocks[2:5]]
+
+    def test_raw_blocks_after_truncate(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks)
+        kept_raw_blocks = list(sut.iter_raw())
+        # Act
+        sut.truncate(2)
+        sut.append(blocks[4])
+        # Assert
+        assert kept_raw_blocks == [storage.encoding.encode_block(block)
+                                   for block in blocks]
+        assert list(sut.iter_raw()) == [
+            storage.encoding.encode_block(block)
+            for block in blocks[:2] + blocks[4:]]
+
+    def test_position_out_of_range(self, store_f, sample_blocks_f):
+        # Arrange
+        sut = store_f(sample_blocks_f(3))
+        # Act
+        # Assert
+        with pytest.raises(IndexError):
+            sut[3]
+
+    def test_blocks_survive_a_restart(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        store_f(blocks).close()
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == blocks
+
+    def test_pop(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks)
+        # Act
+        retrieved_value = sut.pop()
+        # Assert
+        assert retrieved_value == blocks[-1]
+        assert list(sut) == blocks[:-1]
+
+    def test_append_after_truncate(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks)
+        # Act
+        sut.truncate(2)
+        sut.append(blocks[4])
+        sut.close()
+        # Assert
+        assert list(store_f()) == blocks[:2] + blocks[4:]
+
+    def test_replace(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks[:2])
+        # Act
+        sut.replace(blocks)
+        # Assert
+        assert list(sut) == blocks
+
+    def test_replace_keeps_the_shared_blocks(self,
+                                             store_f,
+                                             sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        other_blocks = sample_blocks_f(7)
+        other_blocks[3:] = [Block(block, timestamp=0.0)
+                            for block in other_blocks[3:]]
+        sut = store_f(blocks)
+        with mock.patch.object(sut, '_append_payload',
+                               wraps=sut._append_payload) as mock_append:
+            # Act
+            sut.replace(other_blocks)
+            # Assert
+            assert mock_append.call_count == 4
+        assert list(sut) == other_blocks
+
+    def test_replace_from_a_position(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks)
+        # Act
+        sut.replace(blocks[4:], 2)
+        # Assert
+        assert list(sut) == blocks[:2] + blocks[4:]
+
+    def test_snapshot_ignores_the_appended_blocks(self,
+                                                  store_f,
+                                                  sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks[:3])
+        snapshot = sut.snapshot()
+        # Act
+        sut.extend(blocks[3:])
+        # Assert
+        assert len(snapshot) == 3
+        assert list(snapshot) == blocks[:3]
+        assert list(snapshot.iter_raw()) == list(sut.iter_raw(0, 3))
+
+    def test_snapshot_expires_once_truncated(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        sut = store_f(blocks)
+        snapshot = sut.snapshot()
+        # Act
+        sut.replace(blocks[:2])
+        # Assert
+        with pytest.raises(storage.StaleSnapshotError):
+            snapshot.read_raw(0)
+
+    def test_sync_in_batches(self, store_f, sample_blocks_f):
+        # Arrange
+        sut = store_f(sync_every=4)
+        with mock.patch('os.fsync') as mock_fsync:
+            # Act
+            sut.extend(sample_blocks_f(10))
+            # Assert
+            # Segment and index, twice
+            assert mock_fsync.call_count == 4
+
+
+class TestRecovery(object):
+    """
+    Test the recovery of the store after a crash
+    """
+
+    def test_torn_tail_record_is_dropped(self,
+                                         store_f,
+                                         sample_blocks_f,
+                                         segment_path):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        store_f(blocks).close()
+        size = os.path.getsize(segment_path)
+        with open(segment_path, 'ab') as segment:
+            segment.write(storage.RECORD_HEADER.pack(100, 0) + b'{"ind')
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == blocks
+        assert os.path.getsize(segment_path) == size
+
+    def test_torn_indexed_record_is_dropped(self,
+                                            store_f,
+                                            sample_blocks_f,
+                                            segment_path):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        store_f(blocks).close()
+        with open(segment_path, 'r+b') as segment:
+            segment.truncate(os.path.getsize(segment_path) - 3)
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == blocks[:-1]
+
+    def test_corrupted_tail_record_is_dropped(self,
+                                              store_f,
+                                              sample_blocks_f,
+                                              segment_path):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        store_f(blocks).close()
+        with open(segment_path, 'r+b') as segment:
+            segment.seek(-2, os.SEEK_END)
+            segment.write(b'!!')
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == blocks[:-1]
+
+    def test_missing_index_entries_are_rebuilt(self,
+                                               store_f,
+                                               sample_blocks_f,
+                                               index_path):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        store_f(blocks).close()
+        with open(index_path, 'r+b') as index:
+            index.truncate(2 * storage.INDEX_ENTRY.size + 3)
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == blocks
+        assert (os.path.getsize(index_path) ==
+                5 * storage.INDEX_ENTRY.size)
+
+
+    def test_interrupted_replacement_is_replayed(self,
+                                                 store_f,
+                                                 sample_blocks_f,
+                                                 tmp_path):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        other_blocks = [Block(block, timestamp=0.0) for block in blocks]
+        store = store_f(blocks)
+        with mock.patch.object(store, '_append_payload',
+                               side_effect=OSError('Crash')):
+            with pytest.raises(OSError):
+                store.replace(other_blocks)
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == other_blocks
+        assert not os.path.exists(
+            os.path.join(str(tmp_path), storage.JOURNAL_FILE_NAME))
+
+    def test_replacement_without_journal_is_dropped(self,
+                                                    store_f,
+                                                    sample_blocks_f,
+                                                    tmp_path):
+        # Arrange
+        blocks = sample_blocks_f(5)
+        other_blocks = [Block(block, timestamp=0.0) for block in blocks]
+        store = store_f(blocks)
+        with mock.patch('os.replace', side_effect=OSError('Crash')):
+            with pytest.raises(OSError):
+                store.replace(other_blocks)
+        # Act
+        sut = store_f()
+        # Assert
+        assert list(sut) == blocks
+        assert sorted(os.listdir(str(tmp_path))) == [
+            storage.INDEX_FILE_NAME, storage.SEGMENT_FILE_NAME]
+
+    def test_cold_start_reads_the_tail_only(self, store_f, sample_blocks_f):
+        # Arrange
+        store_f(sample_blocks_f(50)).close()
+        with mock.patch('os.pread', wraps=os.pread) as mock_pread:
+            # Act
+            sut = store_f()
+            # Assert
+            # Last index entry, header and payload of its record, then
+            # the header of a record after the last one
+            assert mock_pread.call_count <= 4
+        assert len(sut) == 50
+
+
+class TestBlockchainWithStore(object):
+    """
+    Test a Blockchain persisted in a store
+    """
+
+    def test_chain_survives_a_restart(self, store_f):
+        # Arrange
+        with store_f() as store:
+            blockchain = Blockchain(store=store)
+            blockchain.add_transaction('Chancellor on brink')
+            blockchain.mine()
+            expected_chain = list(blockchain.get_chain())
+        # Act
+        with store_f() as store:
+            sut = Blockchain(store=store)
+            # Assert
+            assert list(sut.get_chain()) == expected_chain
+            assert sut.genesis_block == expected_chain[0]
+            assert sut.last_block == expected_chain[-1]
+            assert sut.is_valid() == True
+
+    def test_mining_after_a_restart(self, store_f):
+        # Arrange
+        with store_f() as store:
+            Blockchain(store=store)
+        with store_f() as store:
+            sut = Blockchain(store=store)
+            sut.add_transaction('second bailout for banks')
+            # Act
+            block = sut.mine()
+            # Assert
+            assert block['index'] == 2
+            assert len(store) == 2
+            assert sut.is_valid() == True
+
+    def test_chain_replacement_is_persisted(self, store_f, sample_blocks_f):
+        # Arrange
+        blocks = sample_blocks_f(4)
+        with store_f() as store:
+            sut = Blockchain(store=store)
+            # Act
+            sut._chain = blocks
+        # Assert
+        with store_f() as store:
+            assert list(store) == blocks
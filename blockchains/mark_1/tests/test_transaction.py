@@ -0,0 +1,101 @@
+import copy
+import json
+import pickle
+import pytest
+
+from .. import validation
+from ..transaction import Transaction as TransactionSUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def sample_transaction():
+    return TransactionSUT(data='Chancellor on brink of second bailout')
+
+
+# Tests
+
+class TestMappingInterface(object):
+    """
+    Test that a Transaction reads and writes like a dict
+    """
+
+    def test_equals_its_dict(self, sample_transaction):
+        # Arrange
+        expected_value = {'data': 'Chancellor on brink of second bailout'}
+        # Act
+        retrieved_value = sample_transaction.to_dict()
+        # Assert
+        assert type(retrieved_value) is dict
+        assert retrieved_value == expected_value
+        assert sample_transaction == expected_value
+
+    def test_item_assignment(self, sample_transaction):
+        # Arrange
+        # Act
+        sample_transaction['data'] = 'Tampered'
+        # Assert
+        assert sample_transaction.data == 'Tampered'
+
+    def test_unknown_field(self, sample_transaction):
+        # Arrange
+        # Act
+        # Assert
+        with pytest.raises(KeyError):
+            sample_transaction['input'] = ''
+        with pytest.raises(KeyError):
+            sample_transaction['input']
+
+    def test_has_no_instance_dict(self, sample_transaction):
+        # Arrange
+        # Act
+        # Assert
+        assert not hasattr(sample_transaction, '__dict__')
+
+
+class TestHashing(object):
+    """
+    Test that a Transaction hashes as its dict
+    """
+
+    def test_transaction_hash(self, sample_transaction):
+        # Arrange
+        expected_hash = validation.get_transaction_hash(
+            sample_transaction.to_dict())
+        # Act
+        retrieved_value = validation.get_transaction_hash(sample_transaction)
+        # Assert
+        assert retrieved_value == expected_hash
+
+    def test_encoding(self, sample_transaction):
+        # Arrange
+        expected_value = json.dumps([sample_transaction.to_dict()],
+                                    sort_keys=True)
+        # Act
+        retrieved_value = validation.encoding.encode_transactions(
+            [sample_transaction])
+        # Assert
+        assert retrieved_value == expected_value
+
+
+class TestCopy(object):
+    """
+    Test copies and pickles of a Transaction
+    """
+
+    def test_deepcopy(self, sample_transaction):
+        # Arrange
+        # Act
+        retrieved_value = copy.deepcopy(sample_transaction)
+        # Assert
+        assert isinstance(retrieved_value, TransactionSUT)
+        assert retrieved_value == sample_transaction
+
+    def test_pickle(self, sample_transaction):
+        # Arrange
+        # Act
+        retrieved_value = pickle.loads(pickle.dumps(sample_transaction))
+        # Assert
+        assert isinstance(retrieved_value, TransactionSUT)
+        assert retrieved_value == sample_transaction
@@ -0,0 +1,304 @@
+import pytest
+
+from unittest import mock
+
+from .. import validation as SUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def linked_chain_f():
+
+    def _make_linked_chain(number):
+        chain = []
+        previous_hash = '0'
+        for index in range(1, number + 1):
+            block = {
+                'index': index,
+                'timestamp': float(index),
+                'transactions': [{'data': f'Transaction {index}'}],
+                'previous_hash': previous_hash,
+            }
+            previous_hash = SUT.get_hash_of(block)
+            chain.append(block)
+        return chain
+
+    return _make_linked_chain
+
+
+@pytest.fixture(scope="function")
+def merkle_block():
+    transactions = [{'data': f'Transaction {position}'}
+                    for position in range(5)]
+    return {
+        'index': 2,
+        'timestamp': 1231006505.0,
+        'transactions': transactions,
+        'previous_hash': 64 * 'a',
+        'merkle_root': SUT.get_merkle_root(transactions),
+    }
+
+
+# Tests
+
+class TestFindInvalidLinkFunction(object):
+    """
+    Test the forward scan looking for the first broken link
+    """
+
+    def test_on_empty_chain(self):
+        # Arrange
+        chain = []
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain)
+        # Assert
+        assert retrieved_value == None
+
+    def test_on_valid_chain(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain)
+        # Assert
+        assert retrieved_value == None
+
+    def test_reports_first_broken_link(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        chain[3]['transactions'][0]['data'] = 'Tampered'
+        chain[7]['index'] = 23
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain)
+        # Assert
+        assert retrieved_value == 4
+
+    def test_on_last_block_manipulated(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        chain[-1]['previous_hash'] = 64 * 'f'
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain)
+        # Assert
+        assert retrieved_value == 9
+
+    def test_start_skips_previous_links(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        chain[2]['index'] = 23
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain, start=5)
+        # Assert
+        assert retrieved_value == None
+
+    def test_start_checks_the_link_to_its_predecessor(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        chain[4]['index'] = 23
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain, start=5)
+        # Assert
+        assert retrieved_value == 5
+
+    def test_on_iterator(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        chain[6]['index'] = 23
+        # Act
+        retrieved_value = SUT.find_invalid_link(iter(chain))
+        # Assert
+        assert retrieved_value == 7
+
+    def test_hashes_every_block_once(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(50)
+        with mock.patch.object(SUT, 'get_hash_of',
+                               wraps=SUT.get_hash_of) as mock_hash:
+            # Act
+            SUT.find_invalid_link(chain)
+            # Assert
+            assert mock_hash.call_count == len(chain)
+
+
+class TestSplitChainFunction(object):
+    """
+    Test the split of a chain into independent segments
+    """
+
+    def test_segments_cover_every_link_once(self):
+        # Act
+        retrieved_value = SUT.split_chain(100, 3, min_length=10)
+        # Assert
+        assert len(retrieved_value) == 3
+        checked_links = [position
+                         for start, stop in retrieved_value
+                         for position in range(start + 1, stop)]
+        assert checked_links == list(range(1, 100))
+
+    def test_segments_start_with_a_predecessor(self):
+        # Act
+        retrieved_value = SUT.split_chain(100, 3, min_length=10)
+        # Assert
+        for (_, stop), (start, _) in zip(retrieved_value,
+                                         retrieved_value[1:]):
+            assert start == stop - 1
+
+    def test_short_chain_is_not_split(self):
+        # Act
+        retrieved_value = SUT.split_chain(100, 8)
+        # Assert
+        assert retrieved_value == [(0, 100)]
+
+    def test_on_single_block(self):
+        # Act
+        retrieved_value = SUT.split_chain(1, 4)
+        # Assert
+        assert retrieved_value == [(0, 1)]
+
+
+class TestFindInvalidLinksFunction(object):
+    """
+    Test the search of the broken links across processes
+    """
+
+    @pytest.mark.parametrize('processes', [1, 2, 3])
+    def test_same_result_as_sequential(self, processes, linked_chain_f):
+        # Arrange
+        chains = [linked_chain_f(300) for _ in range(4)]
+        chains[1][150]['index'] = 23
+        chains[2][64]['previous_hash'] = 64 * 'f'
+        chains[2][250]['index'] = 23
+        chains[3][-1]['previous_hash'] = 64 * 'f'
+        expected_value = [SUT.find_invalid_link(chain) for chain in chains]
+        # Act
+        retrieved_value = SUT.find_invalid_links(chains, processes)
+        # Assert
+        assert retrieved_value == [None, 151, 64, 299]
+        assert retrieved_value == expected_value
+
+    def test_on_segment_boundaries(self, linked_chain_f):
+        # Arrange
+        segments = SUT.split_chain(300, 3)
+        for start, _ in segments[1:]:
+            # Last Block of a segment, predecessor of the next one
+            chain = linked_chain_f(300)
+            chain[start]['index'] = 23
+            # Act
+            retrieved_value = SUT.find_invalid_links([chain], 3)
+            # Assert
+            assert retrieved_value == [start + 1]
+
+    def test_with_difficulty(self, linked_chain_f):
+        # Arrange
+        chains = [linked_chain_f(200)]
+        # Act
+        retrieved_value = SUT.find_invalid_links(chains, 2, difficulty=256)
+        # Assert
+        assert retrieved_value == [0]
+
+    def test_short_chains_are_checked_in_process(self, linked_chain_f):
+        # Arrange
+        chains = [linked_chain_f(10), linked_chain_f(10)]
+        chains[1][5]['index'] = 23
+        with mock.patch.object(SUT.multiprocessing, 'Pool') as mock_pool:
+            # Act
+            retrieved_value = SUT.find_invalid_links(chains, 4)
+            # Assert
+            assert retrieved_value == [None, 6]
+            mock_pool.assert_not_called()
+
+
+class TestIsAValidChainFunction(object):
+    """
+    Test the validation of a whole chain
+    """
+
+    def test_on_valid_chain(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        # Act
+        retrieved_value = SUT.is_a_valid_chain(chain)
+        # Assert
+        assert retrieved_value == True
+
+    def test_on_not_valid_chain(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(10)
+        chain[0]['index'] = 23
+        # Act
+        retrieved_value = SUT.is_a_valid_chain(chain)
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_chain_longer_than_recursion_limit(self, linked_chain_f):
+        # Arrange
+        chain = linked_chain_f(5000)
+        # Act
+        retrieved_value = SUT.is_a_valid_chain(chain)
+        # Assert
+        assert retrieved_value == True
+
+
+class TestMerkleBlocks(object):
+    """
+    Test the validation of blocks in the Merkle format
+    """
+
+    def test_hash_covers_only_the_header(self, merkle_block):
+        # Arrange
+        header = {key: value for key, value in merkle_block.items()
+                  if key != 'transactions'}
+        # Act
+        retrieved_value = SUT.get_hash_of(merkle_block)
+        # Assert
+        assert retrieved_value == SUT.get_hash_of(header)
+
+    def test_valid_body(self, merkle_block):
+        # Arrange
+        # Act
+        retrieved_value = SUT.has_a_valid_body(merkle_block)
+        # Assert
+        assert retrieved_value == True
+
+    def test_tampered_body(self, merkle_block):
+        # Arrange
+        merkle_block['transactions'][2]['data'] = 'Tampered'
+        # Act
+        retrieved_value = SUT.has_a_valid_body(merkle_block)
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_mixed_chain(self, linked_chain_f, merkle_block):
+        # Arrange
+        chain = linked_chain_f(3)
+        merkle_block['index'] = 4
+        merkle_block['previous_hash'] = SUT.get_hash_of(chain[-1])
+        chain.append(merkle_block)
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain)
+        # Assert
+        assert retrieved_value == None
+
+    def test_on_mixed_chain_with_tampered_body(self,
+                                               linked_chain_f,
+                                               merkle_block):
+        # Arrange
+        chain = linked_chain_f(3)
+        merkle_block['index'] = 4
+        merkle_block['previous_hash'] = SUT.get_hash_of(chain[-1])
+        merkle_block['transactions'].pop()
+        chain.append(merkle_block)
+        # Act
+        retrieved_value = SUT.find_invalid_link(chain)
+        # Assert
+        assert retrieved_value == 3
+
+    def test_transaction_proof(self, merkle_block):
+        # Arrange
+        transactions = merkle_block['transactions']
+        proof = SUT.get_transaction_proof(transactions, 3)
+        # Act
+        retrieved_value = SUT.is_an_included_transaction(
+            transactions[3], proof, merkle_block['merkle_root'])
+        # Assert
+        assert retrieved_value == True
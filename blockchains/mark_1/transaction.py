@@ -0,0 +1,199 @@
+from collections.abc import MutableMapping
+from functools import wraps
+
+
+class BaseTransaction(MutableMapping):
+    """
+    A transaction with a fixed set of fields, kept in slots
+
+    Subclasses list their fields in __slots__. It reads and writes like a
+    dict and to_dict() returns the plain dict it is hashed and serialized
+    as. Its changes are reported to the Block holding it.
+    """
+
+    __slots__ = ('_on_change', )
+
+    def __init__(self, *args, **kwargs):
+        self._on_change = None
+        self.update(*args, **kwargs)
+
+    def __reduce__(self):
+        return (self.__class__, (self.to_dict(), ))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+        _changed(self)
+
+    def __delitem__(self, key):
+        if key in self.__slots__:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                pass
+            else:
+                _changed(self)
+                return
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        """
+        Return the transaction as a plain dict, hashing as it does
+
+        :return: The dict
+        """
+        return dict(self)
+
+
+class Transaction(BaseTransaction):
+    """
+    A transaction carrying some data
+    """
+
+    __slots__ = ('data', )
+
+
+def _changed(value):
+    """
+    Report the change of a transaction, or of a list of them, to whoever
+    holds it
+    """
+    on_change = value._on_change
+    if on_change is not None:
+        on_change()
+
+
+def _changing(method):
+    """
+    Wrap a mutating method of a builtin container to report its changes
+    """
+    @wraps(method)
+    def changing_method(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        _changed(self)
+        return result
+    return changing_method
+
+
+class TransactionDict(dict):
+    """
+    A transaction received as a plain dict, reporting its changes to the
+    Block holding it
+    """
+
+    __slots__ = ('_on_change', )
+
+    def __init__(self, *args, **kwargs):
+        self._on_change = None
+        super().__init__(*args, **kwargs)
+
+    def __reduce__(self):
+        # Copies and pickles are plain dicts, held by nobody yet
+        return (dict, (dict(self), ))
+
+    __setitem__ = _changing(dict.__setitem__)
+    __delitem__ = _changing(dict.__delitem__)
+    __ior__ = _changing(dict.__ior__)
+    clear = _changing(dict.clear)
+    pop = _changing(dict.pop)
+    popitem = _changing(dict.popitem)
+    setdefault = _changing(dict.setdefault)
+    update = _changing(dict.update)
+
+
+class TransactionList(list):
+    """
+    The transactions of a Block, reporting any change to the list or to
+    one of its transactions to the Block
+
+    Each transaction is held by a single list: one already held by another
+    Block, e.g. by the Block of a peer's chain, is copied. Plain dicts are
+    held as TransactionDict.
+    """
+
+    __slots__ = ('_on_change', )
+
+    def __init__(self, transactions=(), on_change=None):
+        """
+        :param transactions: Iterable of transactions
+        :param on_change: Function without arguments called on any change
+        """
+        self._on_change = on_change
+        super().__init__(self._hold(transaction)
+                         for transaction in transactions)
+
+    def __reduce__(self):
+        # Copies and pickles are plain lists, held by nobody yet
+        return (list, (list(self), ))
+
+    def _hold(self, transaction):
+        """
+        Return the transaction, or a copy of it, reporting its changes as
+        the list does
+
+        :param transaction: Transaction
+        :return: The transaction held by the list
+        """
+        if isinstance(transaction, (BaseTransaction, TransactionDict)):
+            if transaction._on_change is not None:
+                transaction = transaction.__class__(transaction)
+        elif isinstance(transaction, dict):
+            transaction = TransactionDict(transaction)
+        else:
+            # Not a mapping, changed only by being replaced
+            return transaction
+        transaction._on_change = self._on_change
+        return transaction
+
+    def __setitem__(self, position, value):
+        if isinstance(position, slice):
+            value = [self._hold(transaction) for transaction in value]
+        else:
+            value = self._hold(value)
+        super().__setitem__(position, value)
+        _changed(self)
+
+    def __iadd__(self, transactions):
+        self.extend(transactions)
+        return self
+
+    def append(self, transaction):
+        super().append(self._hold(transaction))
+        _changed(self)
+
+    def extend(self, transactions):
+        super().extend(self._hold(transaction)
+                       for transaction in transactions)
+        _changed(self)
+
+    def insert(self, position, transaction):
+        super().insert(position, self._hold(transaction))
+        _changed(self)
+
+    __delitem__ = _changing(list.__delitem__)
+    __imul__ = _changing(list.__imul__)
+    clear = _changing(list.clear)
+    pop = _changing(list.pop)
+    remove = _changing(list.remove)
+    reverse = _changing(list.reverse)
+    sort = _changing(list.sort)
@@ -1,23 +1,235 @@
 import hashlib
-import json
+import multiprocessing
 
+from itertools import islice
 
-def get_hash_of(block):
+from . import encoding
+from . import merkle
+
+
+# Fewest links checked by a worker: shorter segments don't pay for their
+# trip to the worker process
+MIN_SEGMENT_LENGTH = 64
+
+
+def is_a_merkle_block(block):
+    """
+    Determine if a Block commits to its transactions with a Merkle root
+
+    :param block: block
+    :return: True if Merkle format, False if legacy format
+    """
+    return 'merkle_root' in block
+
+
+def get_hash_of(block, encoded_transactions=None):
     """
     Creates a SHA-256 hash of a Block
 
+    A legacy Block is hashed with all its transactions, a Merkle Block
+    only with its header, which holds the root of its transactions.
+
     :param block: block
+    :param encoded_transactions: Canonical text of the transactions of the
+                                 Block, when already known
     """
     # The Dictionary must be ordered for avoiding inconsistent hashes
-    block_string = json.dumps(block, sort_keys=True).encode()
+    block_string = encoding.encode_block(
+        block,
+        encoded_transactions,
+        header_only=is_a_merkle_block(block))
     return hashlib.sha256(block_string).hexdigest()
 
 
+def get_transaction_hash(transaction):
+    """
+    Creates a SHA-256 hash of a Transaction
+
+    :param transaction: transaction
+    """
+    transaction_string = encoding.encode_value(transaction).encode()
+    return hashlib.sha256(transaction_string).hexdigest()
+
+
+def get_merkle_root(transactions):
+    """
+    Compute the Merkle root of a list of transactions
+
+    :param transactions: transactions
+    :return: Hex digest of the root
+    """
+    return merkle.get_root([get_transaction_hash(transaction)
+                            for transaction in transactions])
+
+
+def get_transaction_proof(transactions, position):
+    """
+    Compute the proof of inclusion of a transaction in its Block
+
+    :param transactions: Transactions of the Block
+    :param position: Position of the transaction in the Block
+    :return: List of (side, hash) of the siblings, O(log n) long
+    """
+    return merkle.get_proof([get_transaction_hash(transaction)
+                             for transaction in transactions],
+                            position)
+
+
+def is_an_included_transaction(transaction, proof, merkle_root):
+    """
+    Determine if a transaction is included in a Merkle Block
+
+    :param transaction: transaction
+    :param proof: Proof of inclusion of the transaction
+    :param merkle_root: Merkle root of the Block
+    :return: True if included, False if not
+    """
+    return merkle.verify_proof(get_transaction_hash(transaction),
+                               proof,
+                               merkle_root)
+
+
+def has_a_valid_body(block):
+    """
+    Determine if the transactions of a Block match its header
+
+    :param block: block
+    :return: True if valid, False if not
+    """
+    if is_a_merkle_block(block):
+        return block['merkle_root'] == get_merkle_root(block['transactions'])
+    # A legacy Block hashes its transactions together with the header
+    return True
+
+
+def meets_difficulty(block_hash, difficulty):
+    """
+    Determine if a hash solves the Proof of Work for a difficulty
+
+    :param block_hash: Hex digest of the Block
+    :param difficulty: Number of leading zero bits required in the hash
+    :return: True if solved, False if not
+    """
+    return difficulty <= 0 or int(block_hash, 16) >> (256 - difficulty) == 0
+
+
+def find_invalid_link(chain, start=1, hash_of=None, difficulty=0):
+    """
+    Walk the chain forward, once, looking for the first broken link
+
+    Every Block is hashed exactly once and the chain is never copied,
+    so time is linear and memory is constant in the length of the chain.
+    The transactions of Merkle blocks are checked against their root too,
+    and with a difficulty every Block must solve the Proof of Work.
+
+    :param chain: Iterable of blocks, in order
+    :param start: Position of the first Block whose link is checked
+    :param hash_of: Function hashing a Block, get_hash_of if not given
+    :param difficulty: Number of leading zero bits required in every hash
+    :return: Position of the first Block not linked to its predecessor,
+             None if every checked link is valid
+    """
+    hash_of = hash_of or get_hash_of
+    start = max(start, 1)
+    previous_hash = None
+    # Blocks before the predecessor of the first checked link are skipped
+    for position, block in enumerate(islice(chain, start - 1, None),
+                                     start - 1):
+        checked = position >= start or position == 0
+        if position >= start and block['previous_hash'] != previous_hash:
+            return position
+        if checked and not has_a_valid_body(block):
+            return position
+        previous_hash = hash_of(block)
+        if checked and not meets_difficulty(previous_hash, difficulty):
+            return position
+    return None
+
+
+def split_chain(length, segments, min_length=MIN_SEGMENT_LENGTH):
+    """
+    Split the links of a chain into segments checked independently
+
+    Every segment starts with the predecessor of its first link: its
+    links are checked against the hash of that Block, as in the whole
+    chain.
+
+    :param length: Number of blocks of the chain
+    :param segments: Maximum number of segments
+    :param min_length: Fewest links in a segment
+    :return: List of (start, stop) positions of the blocks of a segment
+    """
+    links = length - 1
+    if links < 1:
+        return [(0, length)]
+    segments = max(1, min(segments, links // max(min_length, 1)))
+    size = -(-links // segments)
+    return [(first - 1, min(first + size, length))
+            for first in range(1, links + 1, size)]
+
+
+# Chains checked by the workers of a pool, inherited when forked
+_chains = None
+
+
+def _init_worker(chains):
+    global _chains
+    _chains = chains
+
+
+def _find_invalid_link_worker(arguments):
+    number, start, stop, difficulty = arguments
+    position = find_invalid_link(_chains[number][start:stop],
+                                 difficulty=difficulty)
+    return None if position is None else start + position
+
+
+def find_invalid_links(chains, processes=1, difficulty=0):
+    """
+    Find the first broken link of many chains, splitting them into
+    segments checked across a pool of processes
+
+    The chains are split so that every process has a share of the links
+    to check. The first broken link of a chain is the first one found
+    among its segments, in order: the result is the one of
+    find_invalid_link, chain by chain.
+    The chains are handed to the workers when the pool starts, the tasks
+    only carry positions.
+
+    :param chains: List of sequences of blocks, in order
+    :param processes: Number of worker processes
+    :param difficulty: Number of leading zero bits required in every hash
+    :return: List of positions of the first Block not linked to its
+             predecessor, None where every link is valid
+    """
+    links = sum(max(len(chain) - 1, 0) for chain in chains)
+    if processes <= 1 or links < 2 * MIN_SEGMENT_LENGTH:
+        return [find_invalid_link(chain, difficulty=difficulty)
+                for chain in chains]
+
+    tasks = []
+    for number, chain in enumerate(chains):
+        # Each chain gets segments in proportion of its links
+        segments = -(-processes * max(len(chain) - 1, 0) // links)
+        for start, stop in split_chain(len(chain), segments):
+            tasks.append((number, start, stop, difficulty))
+
+    positions = [None] * len(chains)
+    with multiprocessing.Pool(min(processes, len(tasks)),
+                              initializer=_init_worker,
+                              initargs=(chains, )) as pool:
+        results = pool.map(_find_invalid_link_worker, tasks)
+    for task, position in zip(tasks, results):
+        if position is not None and positions[task[0]] is None:
+            positions[task[0]] = position
+    return positions
+
+
 def is_a_valid_chain(chain):
-    if not len(chain) or len(chain) == 1:
-        return True
-    else:
-        if chain[-1]['previous_hash'] == get_hash_of(chain[-2]):
-            return is_a_valid_chain(chain[:-1])
-        else:
-            return False
+    """
+    Determine if a chain is valid
+
+    :param chain: Iterable of blocks, in order
+    :return: True if valid, False if not
+    """
+    return find_invalid_link(chain) is None
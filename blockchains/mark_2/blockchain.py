@@ -1,26 +1,55 @@
 from ..mark_1.blockchain import Blockchain as BlockchainMark1
+from ..mark_1.transaction import BaseTransaction
+from .scripts import ScriptCache
+
+
+class Transaction(BaseTransaction):
+    """
+    A transaction unlocked and locked by scripts
+    """
+
+    __slots__ = ('input', 'script', 'output', )
 
 
 class Blockchain(BlockchainMark1):
+    transaction_fields = ('unlock', 'lock', )
+
+    def __init__(self, *args, script_cache_size=256, **kwargs):
+        """
+        :param script_cache_size: Maximum number of scripts kept compiled
+        """
+        self.script_cache = ScriptCache(script_cache_size)
+        super().__init__(*args, **kwargs)
 
     def add_transaction(self, unlock, lock):
         """
         Creates a new transaction to go into the next mined Block
 
         :param script: script
-        :return: The transaction
+        :return: The pending transaction, None if the Mempool is full
         """
         vm_globals = {}
         vm_locals = {}
         self._script_runner(unlock, vm_globals, vm_locals)
         self._script_runner(lock, vm_globals, vm_locals)
-        transaction = {
-            'input': unlock,
-            'script': lock,
-            'output': vm_locals.get('output', None),
-        }
-        self.current_transactions.append(transaction)
-        return transaction
+        transaction = Transaction(
+            input=unlock,
+            script=lock,
+            output=vm_locals.get('output', None),
+        )
+        return self.current_transactions.add(transaction)
+
+    def _check_transaction_arguments(self, arguments):
+        """
+        Check the scripts given for a new transaction
+
+        :param arguments: dict of the scripts, by field
+        :return: The error or None if valid
+        """
+        if not all(isinstance(arguments[field], str)
+                   for field in self.transaction_fields):
+            return 'Scripts must be strings'
+        return None
 
     def _create_genesis_block(self):
         """
@@ -28,7 +57,7 @@ class Blockchain(BlockchainMark1):
 
         :return: New Block or None if Blockchain not empty
         """
-        if not len(self._chain):
+        if not len(self._blocks):
             previous_hash = self.genesis_previous_hash
             genesis_block_data = {
                 'unlock': '',
@@ -42,8 +71,12 @@ class Blockchain(BlockchainMark1):
         return None
 
     def _script_runner(self, vm_script, vm_globals, vm_locals):
+        # Compiled once, run from the cache afterwards
+        vm_code = self.script_cache.compile(vm_script)
+        if vm_code is None:
+            return
         try:
-            exec(vm_script, vm_globals, vm_locals)
+            exec(vm_code, vm_globals, vm_locals)
         except Exception as e:
             pass
         return
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+
+def get_script_hash(script):
+    """
+    Creates a SHA-256 hash of the source of a script
+
+    :param script: Source, as text or bytes
+    """
+    if isinstance(script, str):
+        script = script.encode()
+    return hashlib.sha256(script).digest()
+
+
+class ScriptCache(object):
+    """
+    Compiled code of the scripts, by hash of their source
+
+    A script run many times, like a locking script shared by many
+    transactions, is compiled only once. The least recently used scripts
+    are dropped beyond the maximum size. A script that doesn't compile is
+    remembered as such.
+    """
+
+    def __init__(self, max_size=256):
+        """
+        :param max_size: Maximum number of scripts kept compiled
+        """
+        self.max_size = max_size
+        # Script hash -> code, the least recently used first
+        self._codes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._codes)
+
+    def compile(self, script):
+        """
+        Return the compiled code of a script, compiled if missing
+
+        :param script: Source, as text or bytes
+        :return: The code object or None if the script doesn't compile
+        """
+        if not isinstance(script, (str, bytes)):
+            # Not a source at all, it doesn't compile
+            return None
+        script_hash = get_script_hash(script)
+        with self._lock:
+            if script_hash in self._codes:
+                self.hits += 1
+                self._codes.move_to_end(script_hash)
+                return self._codes[script_hash]
+            self.misses += 1
+
+        try:
+            code = compile(script, '<script>', 'exec')
+        except Exception:
+            code = None
+
+        with self._lock:
+            self._codes[script_hash] = code
+            self._codes.move_to_end(script_hash)
+            while len(self._codes) > self.max_size:
+                self._codes.popitem(last=False)
+                self.evictions += 1
+        return code
+
+    def get_stats(self):
+        """
+        Return the counters of the cache
+
+        :return: dict of hits, misses, evictions and cached scripts
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'scripts': len(self._codes),
+            }
+
+    def clear(self):
+        """
+        Drop every compiled script
+        """
+        with self._lock:
+            self._codes.clear()
@@ -5,6 +5,7 @@ from freezegun import freeze_time
 from unittest import mock
 
 from .blockchain import Blockchain as BlockchainSUT
+from .blockchain import Transaction
 from ..mark_1.tests import test_blockchain as parent
 
 
@@ -61,8 +62,10 @@ def w_current_transactions_f(sample_transaction_f, sample_sut):
 
     def _make_with_transactions(number):
         sut = sample_sut()
-        for iteration in range(number):  # pylint: disable=unused-variable
-            sut.add_transaction(**sample_transaction_f())
+        for iteration in range(number):
+            # Distinct, or the Mempool keeps only one
+            sut.add_transaction(**sample_transaction_f(
+                unlock=f'vm_input = {iteration}'))
         return sut
 
     return _make_with_transactions
@@ -100,6 +103,17 @@ class TestAddTransactionCreation(object):
         # Assert
         assert sut.current_transactions[0] == expected_transaction
 
+    def test_on_empty_block_transactions_type(self,
+                                              sample_sut,
+                                              sample_transaction_f):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        sut.add_transaction(**sample_transaction_f())
+        # Assert
+        assert isinstance(sut.current_transactions[0], Transaction)
+        assert not hasattr(sut.current_transactions[0], '__dict__')
+
     def test_on_empty_block_custom_transactions_value(self,
                                                       sample_sut,
                                                       sample_transaction_f):
@@ -148,6 +162,93 @@ class TestAddTransactionCreation(object):
         assert sut.current_transactions[-1] == expected_transaction
 
 
+class TestAddTransactionsMethod(object):
+    """
+    Test the creation of many transactions at once
+    """
+
+    def test_runs_the_scripts(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        items = [
+            {'unlock': f'vm_input = {number}', 'lock': 'output = vm_input'}
+            for number in range(3)
+        ] + [{'lock': 'output = 23'}]
+        # Act
+        transactions, errors = sut.add_transactions(items)
+        # Assert
+        assert [transaction['output']
+                for transaction in transactions] == [0, 1, 2]
+        assert errors == {3: 'Missing values'}
+
+    def test_scripts_not_strings(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        items = [
+            {'unlock': 1, 'lock': 'output = 23'},
+            {'unlock': '', 'lock': None},
+            {'unlock': '', 'lock': 'output = 23'},
+        ]
+        # Act
+        transactions, errors = sut.add_transactions(items)
+        # Assert
+        assert [transaction['output']
+                for transaction in transactions] == [23]
+        assert errors == {
+            0: 'Scripts must be strings',
+            1: 'Scripts must be strings',
+        }
+
+
+class TestScriptRunner(object):
+    """
+    Test the execution of the scripts
+    """
+
+    def test_script_not_a_string(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        # Act
+        retrieved_value = sut.add_transaction(None, 'output = 23')
+        # Assert
+        assert retrieved_value['output'] == 23
+
+    def test_lock_script_compiled_once(self,
+                                       sample_transaction_f,
+                                       w_current_transactions_f):
+        # Arrange
+        number = random.randint(2, 10)
+        # Act
+        sut = w_current_transactions_f(number)
+        # Assert
+        stats = sut.script_cache.get_stats()
+        # The genesis scripts, then every unlock script and the lock one
+        assert stats['misses'] == 2 + number + 1
+        assert stats['hits'] == number - 1
+        assert ([transaction['output']
+                 for transaction in sut.current_transactions] ==
+                number * [None])
+
+    def test_runs_the_cached_script(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        lock = 'output = vm_input * 2'
+        # Act
+        transactions = [sut.add_transaction(f'vm_input = {number}', lock)
+                        for number in range(3)]
+        # Assert
+        assert [transaction['output']
+                for transaction in transactions] == [0, 2, 4]
+
+    def test_bounded_cache(self, sample_sut):
+        # Arrange
+        sut = sample_sut(script_cache_size=1)
+        # Act
+        sut.add_transaction('vm_input = 1', 'output = vm_input')
+        # Assert
+        assert len(sut.script_cache) == 1
+
+
 class TestCreateGenesisBlockMethod(object):
     """
     Test the create genesis block method
@@ -0,0 +1,103 @@
+import pytest
+
+from unittest import mock
+
+from . import scripts as SUT
+
+
+class TestScriptCache(object):
+    """
+    Test the cache of the compiled scripts
+    """
+
+    def test_compiles_once(self):
+        # Arrange
+        sut = SUT.ScriptCache()
+        # Act
+        first_code = sut.compile('output = 23')
+        second_code = sut.compile('output = 23')
+        # Assert
+        assert first_code is second_code
+        assert sut.get_stats() == {
+            'hits': 1,
+            'misses': 1,
+            'evictions': 0,
+            'scripts': 1,
+        }
+
+    def test_runs_as_the_source(self):
+        # Arrange
+        sut = SUT.ScriptCache()
+        vm_locals = {}
+        # Act
+        exec(sut.compile('output = 2 * 23'), {}, vm_locals)
+        # Assert
+        assert vm_locals == {'output': 46}
+
+    def test_keyed_by_script_hash(self):
+        # Arrange
+        sut = SUT.ScriptCache()
+        # Act
+        sut.compile('output = 23')
+        sut.compile(b'output = 23')
+        # Assert
+        assert sut.hits == 1
+        assert len(sut) == 1
+
+    def test_script_not_compiling(self):
+        # Arrange
+        sut = SUT.ScriptCache()
+        with mock.patch('builtins.compile', wraps=compile) as mock_compile:
+            # Act
+            first_code = sut.compile('output = The Times')
+            second_code = sut.compile('output = The Times')
+            # Assert
+            assert first_code is None
+            assert second_code is None
+            mock_compile.assert_called_once()
+
+    @pytest.mark.parametrize('script', [None, 23, ['output = 23']])
+    def test_not_a_source(self, script):
+        # Arrange
+        sut = SUT.ScriptCache()
+        # Act
+        retrieved_value = sut.compile(script)
+        # Assert
+        assert retrieved_value is None
+        assert len(sut) == 0
+
+    def test_evicts_the_least_recently_used(self):
+        # Arrange
+        sut = SUT.ScriptCache(max_size=2)
+        sut.compile('output = 1')
+        sut.compile('output = 2')
+        sut.compile('output = 1')
+        # Act
+        sut.compile('output = 3')
+        # Assert
+        assert sut.evictions == 1
+        assert len(sut) == 2
+        sut.compile('output = 1')
+        assert sut.hits == 2
+        sut.compile('output = 2')
+        assert sut.misses == 4
+
+    @pytest.mark.parametrize('max_size', [0, 1])
+    def test_bounded_size(self, max_size):
+        # Arrange
+        sut = SUT.ScriptCache(max_size=max_size)
+        # Act
+        for number in range(10):
+            sut.compile(f'output = {number}')
+        # Assert
+        assert len(sut) == max_size
+        assert sut.evictions == 10 - max_size
+
+    def test_clear(self):
+        # Arrange
+        sut = SUT.ScriptCache()
+        sut.compile('output = 23')
+        # Act
+        sut.clear()
+        # Assert
+        assert len(sut) == 0
@@ -1,37 +1,78 @@
-import os
-import requests
+import atexit
 
-from flask import Flask, g, jsonify, request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from flask import Flask, jsonify, request, url_for
+from flask.json.provider import DefaultJSONProvider
 from flask.views import View
-from urllib.parse import urlparse
-from uuid import uuid4
+from functools import partial
+from json.encoder import encode_basestring_ascii
+from time import monotonic
 
-from .blockchain import Blockchain
+from .miner import JOB_FINISHED
+from .node import (CHAIN_HEIGHT_HEADER, MINE_WAIT_TIMEOUT, ChainQuery,
+                   NodeState, create_blockchain)
+from .peers import PeerSessions
+from ..mark_1 import ndjson
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Serialize blocks and transactions as the plain dicts they hash as
+    """
+
+    @staticmethod
+    def default(value):
+        if hasattr(value, 'to_dict'):
+            return value.to_dict()
+        return DefaultJSONProvider.default(value)
+
+
+# Gossip settings, in seconds
+GOSSIP_TIMEOUT = 5
+GOSSIP_DEADLINE = 10
+# Maximum number of nodes asked at the same time
+GOSSIP_MAX_WORKERS = 16
+
+# Maximum number of transactions submitted at once
+MAX_BATCH_SIZE = 10000
+
+# Maximum number of headers in a response
+MAX_HEADERS = 2000
+# Headers compared in the first step of the fork point search
+SYNC_WINDOW = 16
 
 
 # Instantiate the Node
 app = Flask(__name__)
-ctx = app.app_context()
-ctx.push()
+app.json = JSONProvider(app)
+
+# Instantiate the Blockchain from the environment, mining in the background
+# if BLOCKCHAIN_MINING_INTERVAL is set
+node_state = NodeState(create_blockchain())
+
+# Keep-alive sessions to the neighbours, shared by the gossip threads
+peer_sessions = PeerSessions()
+atexit.register(peer_sessions.close)
 
-# Instantiate the Blockchain
-g.blockchain = Blockchain()
 
-# Generate a globally unique address for this node
-g.node_identifier = str(uuid4()).replace('-', '')
+def get_miner():
+    """
+    Return the mining scheduler of the Blockchain of the node, a new one
+    if the Blockchain was replaced
 
-# List of neighbours to this node
-g.known_nodes = set()
+    :return: The started MiningScheduler
+    """
+    return node_state.get_miner()
 
 
 # Blockchain-related actions
 
 @app.route('/action/evil', methods=['POST'])
 def evil_action_pop():
-    blockchain = g.blockchain
-    if len(blockchain._chain) > 1:
-        # Don't remove a genesis block
-        removed_element = blockchain._chain.pop()
+    blockchain = node_state.blockchain
+    # Don't remove a genesis block
+    removed_element = blockchain.pop_block()
+    if removed_element is not None:
         result = {
             'status': 'Snap done!',
             'element': removed_element,
@@ -50,12 +91,31 @@ def evil_action_pop():
 
 @app.route('/mine', methods=['POST'])
 def mine():
-    blockchain = g.blockchain
+    """
+    Ask for the next Block, mined in the background
+
+    The job mining it is returned at once, to be followed at its
+    location.
+
+    Query parameters:
+    - wait=true: Wait for the Block, returned with the validity of the
+      chain, up to MINE_WAIT_TIMEOUT seconds: the job is returned if
+      still mining
+    """
+    blockchain = node_state.blockchain
+    job = get_miner().submit()
+    if (request.args.get('wait') != 'true' or
+            not job.wait(MINE_WAIT_TIMEOUT)):
+        response = jsonify({'job': job})
+        response.status_code = 202
+        response.headers['Location'] = url_for('mining_job', job_id=job.id)
+        return response
+
     result = {
-        'new_block': blockchain.mine(),
-        'is_valid': blockchain.is_valid(),
+        'new_block': job.block,
+        'is_valid': (job.is_valid if job.is_valid is not None
+                     else blockchain.is_valid()),
     }
-    response = jsonify(result)
     status_code = 200 if not result['is_valid'] else 201
 
     response = jsonify(result)
@@ -63,9 +123,47 @@ def mine():
     return response
 
 
+@app.route('/mine/jobs/<job_id>', methods=['GET', 'DELETE'])
+def mining_job(job_id):
+    """
+    Return a mining job, or cancel it with DELETE
+    """
+    miner = get_miner()
+    job = miner.get(job_id)
+    if job is None:
+        result = {
+            'error': 'Job not found',
+        }
+        status_code = 404
+    elif request.method == 'DELETE' and job.status in JOB_FINISHED:
+        result = {
+            'error': 'Job already finished',
+            'job': job,
+        }
+        status_code = 409
+    else:
+        if request.method == 'DELETE':
+            miner.cancel(job_id)
+        result = {
+            'job': job,
+        }
+        status_code = 200
+
+    response = jsonify(result)
+    response.status_code = status_code
+    return response
+
+
+@app.route('/mine/stats', methods=['GET'])
+def mining_stats():
+    response = jsonify(get_miner().get_stats())
+    response.status_code = 200
+    return response
+
+
 @app.route('/transactions/new', methods=['POST'])
 def new_transaction():
-    blockchain = g.blockchain
+    blockchain = node_state.blockchain
     input_values = request.get_json()
 
     required_args = ['data', ]
@@ -76,22 +174,222 @@ def new_transaction():
         status_code = 400
     else:
         transaction = blockchain.add_transaction(input_values['data'])
+        if transaction is None:
+            result = {
+                'error': 'Mempool full',
+            }
+            status_code = 503
+        else:
+            result = {
+                'transaction': transaction,
+            }
+            status_code = 201
+
+    response = jsonify(result)
+    response.status_code = status_code
+    return response
+
+
+@app.route('/transactions/batch', methods=['POST'])
+def new_transactions():
+    blockchain = node_state.blockchain
+    input_values = request.get_json(silent=True)
+
+    items = (input_values.get('transactions')
+             if isinstance(input_values, dict) else None)
+    if not isinstance(items, list) or not items:
         result = {
-            'transaction': transaction,
+            'error': 'Missing values',
         }
-        status_code = 201
+        status_code = 400
+    elif len(items) > MAX_BATCH_SIZE:
+        result = {
+            'error': f'More than {MAX_BATCH_SIZE} transactions',
+        }
+        status_code = 413
+    else:
+        transactions, errors = blockchain.add_transactions(items)
+        result = {
+            'transactions': transactions,
+            'errors': [{'position': position, 'error': error}
+                       for position, error in errors.items()],
+        }
+        status_code = 201 if transactions else 400
 
     response = jsonify(result)
     response.status_code = status_code
     return response
 
 
+def raw_response(key, raw_parts, fields, status_code=200):
+    """
+    Build a JSON response around a value already encoded, straight from
+    the bytes of a block store
+
+    The canonical encoding of each Block is already valid JSON: the blocks
+    are neither decoded nor encoded again, their bytes are joined once.
+
+    :param key: Key of the encoded value
+    :param raw_parts: Bytes of the encoded value, in parts
+    :param fields: Other keys and values of the response, to be encoded
+    :param status_code: Status code
+    :return: The response
+    """
+    body = [b'{', encode_basestring_ascii(key).encode(), b': ']
+    body.extend(raw_parts)
+    if fields:
+        # The encoded fields without their braces
+        body.extend((b', ', app.json.dumps(fields).encode()[1:-1]))
+    body.append(b'}')
+    return app.response_class(b''.join(body),
+                              status=status_code,
+                              mimetype='application/json')
+
+
+def raw_list_parts(raw_values):
+    """
+    Return the parts of a JSON list of values already encoded
+    """
+    parts = [b'[']
+    for raw_value in raw_values:
+        if len(parts) > 1:
+            parts.append(b', ')
+        parts.append(raw_value)
+    parts.append(b']')
+    return parts
+
+
 @app.route('/chain', methods=['GET'])
 def chain():
-    blockchain = g.blockchain
+    """
+    Return a range of blocks of the chain, the whole chain by default
+
+    Query parameters:
+    - from, to: Indexes of the first and last Block, from 1 for the genesis
+    - limit: Maximum number of blocks, the index to ask from for the next
+      ones is then returned as cursor in 'next'
+    - validity=cached: Report the validity known from the last check
+      instead of validating the chain again, with the validated height
+    - format=ndjson: Stream the blocks of the range, one per line, encoded
+      while they are sent
+    """
+    blockchain = node_state.blockchain
+    query = ChainQuery(request.args)
+    if query.ndjson:
+        height, lines = query.stream(blockchain)
+        response = app.response_class(lines, mimetype=ndjson.MIMETYPE)
+        # Lets the reader skip a chain that can't beat its own
+        response.headers[CHAIN_HEIGHT_HEADER] = str(height)
+        return response
+    fields, blocks = query.read(blockchain)
+
+    if blockchain.store is not None:
+        return raw_response('chain', raw_list_parts(blocks), fields)
     result = {
-        'chain': blockchain.get_chain(),
-        'is_valid': blockchain.is_valid(),
+        'chain': blocks,
+    }
+    result.update(fields)
+
+    response = jsonify(result)
+    response.status_code = 200
+    return response
+
+
+def block_response(blockchain, index):
+    """
+    Build the response of a single Block
+
+    :param blockchain: Blockchain
+    :param index: Index of the Block, from 1 for the genesis
+    :return: The response
+    """
+    store = blockchain.store
+    block = None
+    if index is not None:
+        if store is not None:
+            if 0 < index <= len(store):
+                return raw_response('block',
+                                    (store.read_raw(index - 1), ),
+                                    None)
+        else:
+            block = blockchain.get_block(index)
+    if block is None:
+        response = jsonify({'error': 'Block not found'})
+        response.status_code = 404
+        return response
+
+    response = jsonify({'block': block})
+    response.status_code = 200
+    return response
+
+
+@app.route('/blocks/<int:index>', methods=['GET'])
+def block_by_index(index):
+    return block_response(node_state.blockchain, index)
+
+
+@app.route('/blocks/<block_hash>', methods=['GET'])
+def block_by_hash(block_hash):
+    blockchain = node_state.blockchain
+    return block_response(blockchain, blockchain.get_block_index(block_hash))
+
+
+@app.route('/transactions/<transaction_hash>', methods=['GET'])
+def transaction_by_hash(transaction_hash):
+    blockchain = node_state.blockchain
+    found = blockchain.get_transaction(transaction_hash)
+    if found is not None:
+        transaction, index, position = found
+        result = {
+            'transaction': transaction,
+            'block_index': index,
+            'position': position,
+        }
+        status_code = 200
+    else:
+        # Still waiting to be mined
+        transaction = blockchain.current_transactions.get(transaction_hash)
+        if transaction is not None:
+            result = {
+                'transaction': transaction,
+                'block_index': None,
+                'position': None,
+            }
+            status_code = 200
+        else:
+            result = {
+                'error': 'Transaction not found',
+            }
+            status_code = 404
+
+    response = jsonify(result)
+    response.status_code = status_code
+    return response
+
+
+@app.route('/chain/height', methods=['GET'])
+def chain_height():
+    blockchain = node_state.blockchain
+    height, last_hash = blockchain.get_tip()
+    result = {
+        'height': height,
+        'last_hash': last_hash,
+    }
+
+    response = jsonify(result)
+    response.status_code = 200
+    return response
+
+
+@app.route('/headers', methods=['GET'])
+def headers():
+    blockchain = node_state.blockchain
+    from_index = max(request.args.get('from', 1, type=int), 1)
+    to_index = from_index + MAX_HEADERS - 1
+    if 'to' in request.args:
+        to_index = min(request.args.get('to', to_index, type=int), to_index)
+    result = {
+        'headers': blockchain.get_headers(from_index, to_index),
     }
 
     response = jsonify(result)
@@ -107,19 +405,7 @@ def register_known_node(url_address):
 
     :param url_address: Address of node. Eg. 'http://127.0.0.1:5000'
     """
-    # Parse the url
-    parsed_url = urlparse(url_address)
-
-    if parsed_url.netloc:
-        # URL with scheme, e.g. 'http://127.0.0.1:5000'.
-        extracted_url = parsed_url.netloc
-        g.known_nodes.add(extracted_url)
-    elif parsed_url.path:
-        # URL without scheme, e.g. '127.0.0.1:5000'.
-        extracted_url = parsed_url.path
-        g.known_nodes.add(extracted_url)
-    else:
-        raise ValueError('Invalid URL')
+    node_state.register_known_node(url_address)
 
 
 @app.route('/nodes/register', methods=['POST'])
@@ -141,7 +427,7 @@ def register_nodes():
                 print(f'Error adding {node}')
                 invalid_nodes.append(node)
         result = {
-            'total_nodes': list(g.known_nodes),
+            'total_nodes': list(node_state.known_nodes),
         }
         if len(invalid_nodes):
             result['invalid_nodes'] = invalid_nodes
@@ -152,27 +438,267 @@ def register_nodes():
     return response
 
 
-def do_gossip(known_nodes):
+def fetch_chain(node, timeout=GOSSIP_TIMEOUT):
+    """
+    Fetch the chain of a node
+
+    :param node: Address of the node
+    :param timeout: Seconds to wait for the node to connect and to answer
+    :return: The chain or None if the node didn't return it
+    """
+    session = peer_sessions.get(node)
+    response = session.get(f'http://{node}/chain', timeout=timeout)
+    if response.status_code == 200:
+        return response.json()['chain']
+    return None
+
+
+def fetch_chain_stream(node, timeout=GOSSIP_TIMEOUT, expires_at=None):
+    """
+    Fetch the chain of a node as a stream of blocks
+
+    The blocks are decoded one at a time while the response is read, the
+    response of a node not streaming NDJSON is read as a whole.
+
+    :param node: Address of the node
+    :param timeout: Seconds to wait for the node to connect and for each
+                    read
+    :param expires_at: Time of time.monotonic() after which the stream
+                       stops reading, never if None
+    :return: Iterable of blocks or None if the node didn't return it
+    """
+    session = peer_sessions.get(node)
+    response = session.get(f'http://{node}/chain',
+                           params={'format': 'ndjson'},
+                           stream=True,
+                           timeout=timeout)
+    if response.status_code != 200:
+        response.close()
+        return None
+    if not response.headers.get('Content-Type', '').startswith(
+            ndjson.MIMETYPE):
+        with response:
+            return response.json()['chain']
+    return ChainStream(response, expires_at)
+
+
+class ChainStream(object):
+    """
+    The blocks of a NDJSON response, decoded as they arrive
+
+    The height announced by the node is its length hint: a chain that
+    can't be adopted is closed without being read.
+
+    Past its deadline the stream stops and is closed: the blocks read in
+    time are evaluated as the chain of the node. A read in progress at the
+    deadline still takes up to the timeout of the request.
+    """
+
+    def __init__(self, response, expires_at=None):
+        """
+        :param response: Streamed response
+        :param expires_at: Time of time.monotonic() after which the stream
+                           stops reading, never if None
+        """
+        self._response = response
+        self.height = response.headers.get(CHAIN_HEIGHT_HEADER)
+        self.expires_at = expires_at
+
+    def __length_hint__(self):
+        if self.height is None or not self.height.isdigit():
+            return NotImplemented
+        return int(self.height)
+
+    def __iter__(self):
+        with self._response:
+            for block in ndjson.load_blocks(self._response.iter_lines()):
+                if (self.expires_at is not None and
+                        monotonic() >= self.expires_at):
+                    print(f'Gossip deadline reached reading '
+                          f'{self._response.url}')
+                    return
+                yield block
+
+    def close(self):
+        self._response.close()
+
+
+def fetch_height(node, timeout=GOSSIP_TIMEOUT):
+    """
+    Fetch the height of the chain of a node
+
+    :param node: Address of the node
+    :param timeout: Seconds to wait for the node to connect and to answer
+    :return: The node and its height or None if the node didn't return it
+    """
+    session = peer_sessions.get(node)
+    response = session.get(f'http://{node}/chain/height', timeout=timeout)
+    if response.status_code == 200:
+        return node, response.json()['height']
+    return None
+
+
+def do_gossip(known_nodes,
+              timeout=GOSSIP_TIMEOUT,
+              deadline=GOSSIP_DEADLINE,
+              max_workers=GOSSIP_MAX_WORKERS,
+              fetch=fetch_chain):
     """
     The gossip algorithm - pull.
     All the known nodes are checked for collecting the available chains.
 
-    :return: True if our chain was replaced, False if not
+    The nodes are asked in parallel, so a slow or dead node only costs its
+    own timeout. The nodes still not answering at the deadline are left
+    behind, the chains they return later are closed.
+
+    :param known_nodes: Addresses of the nodes
+    :param timeout: Seconds to wait for each node to connect and to answer
+    :param deadline: Seconds to wait for all the nodes
+    :param max_workers: Maximum number of nodes asked at the same time
+    :param fetch: What is asked to each node, their chains by default
+    :return: The collected chains, in order of arrival
     """
     collected_chains = []
-    # Pull: Collect the blockchains from the neighbours
-    for node in known_nodes:
-        try:
-            response = requests.get(f'http://{node}/chain')
+    known_nodes = list(known_nodes)
+    if not known_nodes:
+        return collected_chains
 
-            if response.status_code == 200:
-                chain = response.json()['chain']
-                collected_chains.append(chain)
-        except Exception as e:
-            print(f'Exception on node {node}: {e}')
+    # Pull: Collect the blockchains from the neighbours
+    executor = ThreadPoolExecutor(max_workers=min(max_workers,
+                                                  len(known_nodes)))
+    futures = {executor.submit(fetch, node, timeout): node
+               for node in known_nodes}
+    collected = set()
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            collected.add(future)
+            node = futures[future]
+            try:
+                chain = future.result()
+                if chain is not None:
+                    collected_chains.append(chain)
+            except Exception as e:
+                print(f'Exception on node {node}: {e}')
+    except TimeoutError:
+        late_nodes = [node for future, node in futures.items()
+                      if not future.done()]
+        print(f'Gossip deadline reached, no answer from {late_nodes}')
+    finally:
+        # The nodes not asked yet are skipped, the late ones left running
+        # and their responses closed once they arrive
+        for future in futures:
+            if future not in collected and not future.cancel():
+                future.add_done_callback(_close_late_chain)
+        executor.shutdown(wait=False)
     return collected_chains
 
 
+def _close_late_chain(future):
+    """
+    Close the chain returned by a node after the gossip deadline, if
+    streamed
+
+    :param future: Future of the fetch
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), 'close', None)
+    if close is not None:
+        close()
+
+
+def fetch_headers(node, from_index, to_index, timeout=GOSSIP_TIMEOUT):
+    """
+    Fetch the headers of a range of blocks of a node, page by page
+
+    :param node: Address of the node
+    :param from_index: Index of the first Block
+    :param to_index: Index of the last Block
+    :param timeout: Seconds to wait for each page
+    :return: The headers
+    """
+    session = peer_sessions.get(node)
+    headers = []
+    while from_index <= to_index:
+        response = session.get(f'http://{node}/headers',
+                               params={'from': from_index, 'to': to_index},
+                               timeout=timeout)
+        response.raise_for_status()
+        page = response.json()['headers']
+        if not page:
+            break
+        headers.extend(page)
+        from_index = page[-1]['index'] + 1
+    return headers
+
+
+def fetch_blocks(node, from_index, timeout=GOSSIP_TIMEOUT):
+    """
+    Fetch the blocks of a node from the given index
+
+    :param node: Address of the node
+    :param from_index: Index of the first Block
+    :param timeout: Seconds to wait for the node to connect and to answer
+    :return: The blocks
+    """
+    session = peer_sessions.get(node)
+    response = session.get(f'http://{node}/chain',
+                           params={'from': from_index},
+                           timeout=timeout)
+    response.raise_for_status()
+    return response.json()['chain']
+
+
+def find_fork_point(node, blockchain, peer_height, timeout=GOSSIP_TIMEOUT):
+    """
+    Find the last Block shared with a node
+
+    The headers are compared backwards from the lowest of the two tips,
+    in windows doubling in size: the headers downloaded are proportional
+    to the divergence, not to the chain length.
+
+    :param node: Address of the node
+    :param blockchain: Our Blockchain
+    :param peer_height: Height of the chain of the node
+    :param timeout: Seconds to wait for each response
+    :return: Index of the last shared Block, 0 if none
+    """
+    top = min(blockchain.get_tip()[0], peer_height)
+    window = SYNC_WINDOW
+    while top > 0:
+        from_index = max(top - window + 1, 1)
+        headers = fetch_headers(node, from_index, top, timeout)
+        fork_index = blockchain.find_fork_point(headers)
+        if fork_index is not None:
+            return fork_index
+        top = from_index - 1
+        window *= 2
+    return 0
+
+
+def sync_with_node(node, blockchain, peer_height, timeout=GOSSIP_TIMEOUT):
+    """
+    Header-first sync: find the fork point with a node, then download and
+    adopt only the blocks after it
+
+    :param node: Address of the node
+    :param blockchain: Our Blockchain
+    :param peer_height: Height of the chain of the node
+    :param timeout: Seconds to wait for each response
+    :return: True if our chain was replaced, False if not
+    """
+    fork_index = find_fork_point(node, blockchain, peer_height, timeout)
+    blocks = fetch_blocks(node, fork_index + 1, timeout)
+    return blockchain.adopt_blocks(fork_index, blocks)
+
+
+@app.route('/nodes/sessions', methods=['GET'])
+def sessions_stats():
+    response = jsonify(peer_sessions.get_stats())
+    response.status_code = 200
+    return response
+
+
 @app.route('/nodes/consensus', methods=['POST'])
 def evaluate_consensus():
     """
@@ -181,22 +707,61 @@ def evaluate_consensus():
 
     :return: True if our chain was replaced, False if not
     """
-    blockchain = g.blockchain
-    collected_chains = do_gossip(g.known_nodes)
+    blockchain = node_state.blockchain
+    # The chains are read while they are evaluated, within the deadline
+    expires_at = monotonic() + GOSSIP_DEADLINE
+    collected_chains = do_gossip(node_state.known_nodes,
+                                 deadline=GOSSIP_DEADLINE,
+                                 fetch=partial(fetch_chain_stream,
+                                               expires_at=expires_at))
     replaced = blockchain.evaluate_consensus(collected_chains)
 
     if replaced:
         result = {
             'status': 'Chain replaced',
-            'chain': blockchain.get_chain(),
+            'chain': list(blockchain.get_chain()),
         }
     else:
         result = {
             'status': 'Chain not replaced - master',
-            'chain': blockchain.get_chain(),
+            'chain': list(blockchain.get_chain()),
         }
     status_code = 200
 
     response = jsonify(result)
     response.status_code = status_code
     return response
+
+
+@app.route('/nodes/sync', methods=['POST'])
+def sync():
+    """
+    The consensus algorithm, header first.
+    Only the heights of the known nodes are collected: we sync with the
+    highest one, downloading just the blocks after the fork point.
+
+    :return: True if our chain was replaced, False if not
+    """
+    blockchain = node_state.blockchain
+    heights = do_gossip(node_state.known_nodes, fetch=fetch_height)
+    replaced = False
+    for node, height in sorted(heights, key=lambda item: -item[1]):
+        if height <= blockchain.get_tip()[0]:
+            break
+        try:
+            replaced = sync_with_node(node, blockchain, height)
+        except Exception as e:
+            print(f'Exception on node {node}: {e}')
+        if replaced:
+            break
+
+    result = {
+        'status': ('Chain replaced' if replaced
+                   else 'Chain not replaced - master'),
+        'height': blockchain.get_tip()[0],
+    }
+    status_code = 200
+
+    response = jsonify(result)
+    response.status_code = status_code
+    return response
@@ -0,0 +1,596 @@
+import asyncio
+import json
+import os
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode
+
+from .miner import JOB_FINISHED
+from .node import (CHAIN_HEIGHT_HEADER, MINE_WAIT_TIMEOUT, MINING_INTERVAL,
+                   ChainQuery, NodeState, create_blockchain)
+from ..mark_1 import ndjson
+
+
+# Gossip settings, in seconds
+GOSSIP_TIMEOUT = 5
+GOSSIP_DEADLINE = 10
+# Maximum number of nodes asked at the same time
+GOSSIP_MAX_CONNECTIONS = 256
+
+# Maximum size of the body of a response of a peer, in bytes
+MAX_BODY_SIZE = 256 * 1024 * 1024
+# Bytes read at once from a connection
+READ_SIZE = 64 * 1024
+
+# Threads running the calls to the Blockchain, off the event loop
+EXECUTOR_WORKERS = int(os.environ.get('BLOCKCHAIN_EXECUTOR_WORKERS', 4))
+# Blocks encoded by each call to the executor while streaming the chain
+STREAM_BATCH_SIZE = 256
+
+
+def encode_json(value):
+    """
+    Encode a value as JSON, the blocks and the transactions as the plain
+    dicts they hash as, like the Flask node
+    """
+    def default(value):
+        if hasattr(value, 'to_dict'):
+            return value.to_dict()
+        raise TypeError(f'{value.__class__.__name__} is not serializable')
+
+    return json.dumps(value, default=default, sort_keys=True).encode()
+
+
+class Request(object):
+    """
+    An HTTP request of the ASGI scope, with its whole body
+    """
+
+    def __init__(self, scope, body):
+        """
+        :param scope: ASGI connection scope
+        :param body: Body, as bytes
+        """
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = dict(parse_qsl(scope.get('query_string', b'').decode()))
+        self.body = body
+
+    def get_json(self):
+        """
+        Return the decoded JSON body, None if not JSON
+        """
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class Response(object):
+    """
+    An HTTP response, its body given whole or as an async iterable of
+    parts
+    """
+
+    def __init__(self,
+                 body=b'',
+                 status_code=200,
+                 headers=None,
+                 content_type='application/json'):
+        self.body = body
+        self.status_code = status_code
+        self.headers = dict(headers or ())
+        self.headers['Content-Type'] = content_type
+
+    async def send(self, send):
+        """
+        Send the response through the ASGI send callable
+        """
+        headers = [(name.lower().encode(), str(value).encode())
+                   for name, value in self.headers.items()]
+        streamed = not isinstance(self.body, bytes)
+        if not streamed:
+            headers.append((b'content-length', b'%d' % len(self.body)))
+        await send({
+            'type': 'http.response.start',
+            'status': self.status_code,
+            'headers': headers,
+        })
+        if streamed:
+            async for part in self.body:
+                await send({
+                    'type': 'http.response.body',
+                    'body': part,
+                    'more_body': True,
+                })
+            await send({'type': 'http.response.body', 'body': b''})
+        else:
+            await send({'type': 'http.response.body', 'body': self.body})
+
+
+class Node(NodeState):
+    """
+    An asyncio node serving a Blockchain as an ASGI application
+
+    The routes are the ones of the Flask node. The event loop never
+    waits for the Blockchain: every call to it runs in a thread of the
+    executor, as it can hash and wait for the lock, and no thread of the
+    executor waits for a mining job. The peers are asked through
+    non-blocking connections, so a node holds thousands of connections to
+    its peers and clients in a single process.
+    """
+
+    def __init__(self,
+                 blockchain,
+                 executor_workers=EXECUTOR_WORKERS,
+                 mining_interval=MINING_INTERVAL):
+        """
+        :param blockchain: Blockchain of the node
+        :param executor_workers: Number of threads running the calls to
+                                 the Blockchain
+        :param mining_interval: Seconds between two checks of the pending
+                                transactions by the miner, mining only
+                                when asked if 0
+        """
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers)
+        super().__init__(blockchain, mining_interval)
+        self.routes = [
+            ('POST', re.compile(r'/mine'), self.mine),
+            ('GET', re.compile(r'/mine/jobs/(?P<job_id>\w+)'),
+             self.mining_job),
+            ('DELETE', re.compile(r'/mine/jobs/(?P<job_id>\w+)'),
+             self.mining_job),
+            ('POST', re.compile(r'/transactions/new'),
+             self.new_transaction),
+            ('GET', re.compile(r'/chain'), self.chain),
+            ('GET', re.compile(r'/chain/height'), self.chain_height),
+            ('POST', re.compile(r'/nodes/register'), self.register_nodes),
+            ('POST', re.compile(r'/nodes/consensus'),
+             self.evaluate_consensus),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            body.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        request = Request(scope, b''.join(body))
+        response = await self.dispatch(request)
+        await response.send(send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.run(self.stop_miner)
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def close(self):
+        """
+        Stop the miner and the threads of the executor
+        """
+        self.stop_miner()
+        self.executor.shutdown(wait=False)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Run a blocking call in the executor
+
+        :return: What the call returns
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          partial(function, *args, **kwargs))
+
+    async def json_response(self, result, status_code=200, headers=None):
+        """
+        Build a JSON response, encoded in the executor
+        """
+        body = await self.run(encode_json, result)
+        return Response(body, status_code, headers)
+
+    async def wait_job(self, job, timeout=None):
+        """
+        Wait for a mining job to be over, on the event loop
+
+        :param job: MiningJob
+        :param timeout: Seconds to wait, forever if None
+        :return: True if over, False if still queued or mining
+        """
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def set_finished():
+            if not finished.done():
+                finished.set_result(True)
+
+        def on_finished(job):
+            try:
+                loop.call_soon_threadsafe(set_finished)
+            except RuntimeError:
+                # The loop is closed, nobody is waiting anymore
+                pass
+
+        job.add_done_callback(on_finished)
+        try:
+            return await asyncio.wait_for(finished, timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def dispatch(self, request):
+        """
+        Run the handler of the route of a request
+
+        :return: The response
+        """
+        allowed = False
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method == request.method:
+                return await handler(request, **match.groupdict())
+            allowed = True
+        if allowed:
+            return await self.json_response({'error': 'Method not allowed'},
+                                            405)
+        return await self.json_response({'error': 'Not found'}, 404)
+
+    # Blockchain-related actions
+
+    async def mine(self, request):
+        """
+        Ask for the next Block, mined in the background
+
+        Query parameters:
+        - wait=true: Wait for the Block, returned with the validity of the
+          chain, up to MINE_WAIT_TIMEOUT seconds: the job is returned if
+          still mining
+        """
+        job = await self.run(lambda: self.get_miner().submit())
+        if (request.args.get('wait') != 'true' or
+                not await self.wait_job(job, MINE_WAIT_TIMEOUT)):
+            return await self.json_response(
+                {'job': job},
+                202,
+                {'Location': f'/mine/jobs/{job.id}'})
+
+        is_valid = job.is_valid
+        if is_valid is None:
+            is_valid = await self.run(self.blockchain.is_valid)
+        result = {
+            'new_block': job.block,
+            'is_valid': is_valid,
+        }
+        return await self.json_response(result, 201 if is_valid else 200)
+
+    async def mining_job(self, request, job_id):
+        """
+        Return a mining job, or cancel it with DELETE
+        """
+        miner = await self.run(self.get_miner)
+        job = miner.get(job_id)
+        if job is None:
+            return await self.json_response({'error': 'Job not found'}, 404)
+        if request.method == 'DELETE':
+            if job.status in JOB_FINISHED:
+                return await self.json_response({
+                    'error': 'Job already finished',
+                    'job': job,
+                }, 409)
+            miner.cancel(job_id)
+        return await self.json_response({'job': job})
+
+    async def new_transaction(self, request):
+        input_values = request.get_json()
+
+        required_args = ['data', ]
+        if (not isinstance(input_values, dict) or
+                not all(k in input_values for k in required_args)):
+            return await self.json_response({'error': 'Missing values'}, 400)
+        transaction = await self.run(self.blockchain.add_transaction,
+                                     input_values['data'])
+        if transaction is None:
+            return await self.json_response({'error': 'Mempool full'}, 503)
+        return await self.json_response({'transaction': transaction}, 201)
+
+    async def chain(self, request):
+        """
+        Return a range of blocks of the chain, the whole chain by default
+
+        The query parameters are the ones of the Flask node, see
+        ChainQuery.
+        """
+        blockchain = self.blockchain
+        query = ChainQuery(request.args)
+        if query.ndjson:
+            height, lines = await self.run(query.stream, blockchain)
+            return Response(self._stream(lines),
+                            headers={CHAIN_HEIGHT_HEADER: height},
+                            content_type=ndjson.MIMETYPE)
+
+        result, blocks = await self.run(query.read, blockchain)
+        if blockchain.store is not None:
+            # Stored blocks are decoded, in the executor too
+            blocks = await self.run(lambda: [json.loads(raw_block)
+                                             for raw_block in blocks])
+        result['chain'] = blocks
+        return await self.json_response(result)
+
+    async def _stream(self, lines):
+        """
+        Encode the lines of a stream in the executor, a batch at a time
+
+        :param lines: Iterator of lines, as bytes
+        :return: Async generator of parts of the body
+        """
+        def next_batch():
+            return b''.join(islice(lines, STREAM_BATCH_SIZE))
+
+        while True:
+            batch = await self.run(next_batch)
+            if not batch:
+                return
+            yield batch
+
+    async def chain_height(self, request):
+        height, last_hash = await self.run(self.blockchain.get_tip)
+        return await self.json_response({
+            'height': height,
+            'last_hash': last_hash,
+        })
+
+    # Node-related actions
+
+    async def register_nodes(self, request):
+        input_values = request.get_json()
+
+        nodes = (input_values.get('nodes', None)
+                 if isinstance(input_values, dict) else None)
+        if not nodes:
+            return await self.json_response(
+                {'error': 'Missing list of nodes'}, 400)
+        invalid_nodes = []
+        for node in nodes:
+            try:
+                self.register_known_node(node)
+            except ValueError:
+                print(f'Error adding {node}')
+                invalid_nodes.append(node)
+        result = {
+            'total_nodes': list(self.known_nodes),
+        }
+        if len(invalid_nodes):
+            result['invalid_nodes'] = invalid_nodes
+        return await self.json_response(result, 201)
+
+    async def evaluate_consensus(self, request):
+        """
+        The consensus algorithm.
+        The internal chain is replaced with the received one if longer.
+
+        The chains are collected without blocking the event loop, then
+        evaluated in the executor.
+        """
+        blockchain = self.blockchain
+        height, _ = await self.run(blockchain.get_tip)
+        collected_chains = await do_gossip(self.known_nodes,
+                                           fetch=partial(fetch_chain,
+                                                         min_height=height),
+                                           run=self.run)
+        replaced = await self.run(blockchain.evaluate_consensus,
+                                  collected_chains)
+
+        result = {
+            'status': ('Chain replaced' if replaced
+                       else 'Chain not replaced - master'),
+            'chain': await self.run(lambda: list(blockchain.get_chain())),
+        }
+        return await self.json_response(result)
+
+
+async def open_response(node, path, params=None):
+    """
+    Send a GET request to a node, without blocking the event loop
+
+    The request is HTTP/1.0: the node sends the body as is, until it
+    closes the connection.
+
+    :param node: Address of the node
+    :param path: Path of the request
+    :param params: dict of query parameters
+    :return: Status code, dict of headers with lowercase names, reader
+             and writer of the connection
+    """
+    host, _, port = node.partition(':')
+    reader, writer = await asyncio.open_connection(host, int(port or 80))
+    try:
+        target = f'{path}?{urlencode(params)}' if params else path
+        writer.write(f'GET {target} HTTP/1.0\r\n'
+                     f'Host: {node}\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status_code = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+    except BaseException:
+        await close_connection(writer)
+        raise
+    return status_code, headers, reader, writer
+
+
+async def close_connection(writer, timeout=GOSSIP_TIMEOUT):
+    """
+    Close a connection and wait for it to be closed
+
+    :param writer: Writer of the connection
+    :param timeout: Seconds to wait for the data still buffered to be
+                    sent, the connection is then aborted
+    """
+    writer.close()
+    try:
+        await asyncio.wait_for(writer.wait_closed(), timeout)
+    except asyncio.TimeoutError:
+        writer.transport.abort()
+    except OSError:
+        # Already broken, closed anyway
+        pass
+
+
+async def read_body(reader, headers, max_size=MAX_BODY_SIZE):
+    """
+    Read the body of a response, whole or in chunks
+
+    :param reader: Reader of the connection
+    :param headers: dict of headers with lowercase names
+    :param max_size: Maximum size of the body, in bytes
+    :return: The body, as bytes
+    :raise ValueError: If the body is larger than max_size
+    """
+    def check_size(size):
+        if size > max_size:
+            raise ValueError(f'Body larger than {max_size} bytes')
+
+    parts = []
+    size = 0
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        # Sent even to HTTP/1.0 requests by some servers
+        while True:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            if not chunk_size:
+                return b''.join(parts)
+            size += chunk_size
+            check_size(size)
+            parts.append(await reader.readexactly(chunk_size))
+            await reader.readexactly(2)
+    if 'content-length' in headers:
+        size = int(headers['content-length'])
+        check_size(size)
+        return await reader.readexactly(size)
+    # Until the node closes the connection
+    while True:
+        part = await reader.read(READ_SIZE)
+        if not part:
+            return b''.join(parts)
+        size += len(part)
+        check_size(size)
+        parts.append(part)
+
+
+async def fetch_chain(node, min_height=0, run=None):
+    """
+    Fetch the chain of a node, as NDJSON if the node streams it
+
+    A chain announced as not higher than ours is not downloaded.
+
+    :param node: Address of the node
+    :param min_height: Height the chain has to exceed
+    :param run: Coroutine function running a blocking call in an
+                executor, to decode the blocks
+    :return: List of blocks or None if the node didn't return it
+    """
+    status_code, headers, reader, writer = await open_response(
+        node, '/chain', {'format': 'ndjson'})
+    try:
+        height = headers.get(CHAIN_HEIGHT_HEADER.lower(), '')
+        if (status_code != 200 or
+                height.isdigit() and int(height) <= min_height):
+            return None
+        body = await read_body(reader, headers)
+    finally:
+        await close_connection(writer)
+
+    def decode():
+        if headers.get('content-type', '').startswith(ndjson.MIMETYPE):
+            return list(ndjson.load_blocks(body.splitlines()))
+        return json.loads(body)['chain']
+
+    if run is None:
+        return decode()
+    return await run(decode)
+
+
+async def do_gossip(known_nodes,
+                    timeout=GOSSIP_TIMEOUT,
+                    deadline=GOSSIP_DEADLINE,
+                    max_connections=GOSSIP_MAX_CONNECTIONS,
+                    fetch=fetch_chain,
+                    run=None):
+    """
+    The gossip algorithm - pull.
+    All the known nodes are checked for collecting the available chains.
+
+    The nodes are asked at the same time on non-blocking connections,
+    up to max_connections, each one within its own timeout. The nodes
+    still not answering at the deadline are left behind.
+
+    :param known_nodes: Addresses of the nodes
+    :param timeout: Seconds to wait for each node
+    :param deadline: Seconds to wait for all the nodes
+    :param max_connections: Maximum number of nodes asked at the same
+                            time
+    :param fetch: Coroutine function asking a node, fetch_chain by
+                  default
+    :param run: Coroutine function running a blocking call in an
+                executor, given to fetch
+    :return: The collected chains, in order of arrival
+    """
+    collected_chains = []
+    known_nodes = list(known_nodes)
+    if not known_nodes:
+        return collected_chains
+
+    semaphore = asyncio.Semaphore(max_connections)
+
+    async def ask(node):
+        async with semaphore:
+            try:
+                chain = await asyncio.wait_for(fetch(node, run=run), timeout)
+                if chain is not None:
+                    collected_chains.append(chain)
+            except Exception as e:
+                print(f'Exception on node {node}: {e!r}')
+
+    tasks = {asyncio.ensure_future(ask(node)): node for node in known_nodes}
+    _, late_tasks = await asyncio.wait(list(tasks), timeout=deadline)
+    if late_tasks:
+        late_nodes = [tasks[task] for task in late_tasks]
+        print(f'Gossip deadline reached, no answer from {late_nodes}')
+        for task in late_tasks:
+            task.cancel()
+    return collected_chains
+
+
+def create_node():
+    """
+    Instantiate the node from the environment, as the Flask node
+
+    :return: The Node
+    """
+    return Node(create_blockchain())
+
+
+# Instantiate the Node, served by any ASGI server, e.g. uvicorn, installed
+# apart: uvicorn blockchains.mark_3.asgi:app
+app = create_node()
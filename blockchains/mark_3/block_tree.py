@@ -0,0 +1,207 @@
+def get_work(difficulty):
+    """
+    Return the work of a Block, as the expected number of hashes solving
+    its Proof of Work
+
+    :param difficulty: Number of leading zero bits required in the hash
+    :return: The work
+    """
+    return 1 << max(difficulty, 0)
+
+
+class TreeNode(object):
+    """
+    A Block of the tree: its hash, its parent, its height and the work
+    of the chain up to it
+
+    The blocks of the side branches are kept in their node, the ones of
+    the main chain are only in the chain.
+    """
+
+    __slots__ = ('hash', 'parent', 'height', 'work', 'block', )
+
+    def __init__(self, block_hash, parent=None, work=1, block=None):
+        """
+        :param block_hash: Hash of the Block
+        :param parent: Node of the previous Block, None for a genesis
+        :param work: Work of the Block alone
+        :param block: The Block, if on a side branch
+        """
+        self.hash = block_hash
+        self.parent = parent
+        self.height = parent.height + 1 if parent else 1
+        self.work = (parent.work if parent else 0) + work
+        self.block = block
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}({self.hash!r}, '
+                f'height={self.height}, work={self.work})')
+
+
+class BlockTree(object):
+    """
+    Index of the blocks by hash, holding the main chain and the side
+    branches competing with it
+
+    Every Block points to its parent and knows the cumulative work of the
+    chain ending with it, so the best tip is found without comparing
+    whole chains. Switching the main chain to another tip only walks the
+    blocks between the two tips and their fork point.
+    The side branches forking more than prune_depth blocks below the tip
+    are dropped.
+    """
+
+    def __init__(self, prune_depth=100):
+        """
+        :param prune_depth: Depth below the tip of the oldest fork point
+                            whose side branch is kept
+        """
+        self.prune_depth = prune_depth
+        # Hash -> node, every Block of the tree
+        self._nodes = {}
+        # Nodes of the main chain, by height
+        self._main = []
+        # Nodes of the side branches
+        self._side = set()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, block_hash):
+        return block_hash in self._nodes
+
+    @property
+    def tip(self):
+        """
+        Return the node of the last Block of the main chain
+        """
+        return self._main[-1] if self._main else None
+
+    @property
+    def side_branches_size(self):
+        """
+        Return the number of blocks held out of the main chain
+        """
+        return len(self._side)
+
+    def get(self, block_hash):
+        """
+        Return the node of a Block
+
+        :param block_hash: Hash of the Block
+        :return: The node or None if the Block is not in the tree
+        """
+        return self._nodes.get(block_hash)
+
+    def get_main_node(self, height):
+        """
+        Return the node of the main chain at a height
+
+        :param height: Height, starting from 1 for the genesis
+        :return: The node or None if the main chain is shorter
+        """
+        if 0 < height <= len(self._main):
+            return self._main[height - 1]
+        return None
+
+    def is_main(self, node):
+        """
+        Determine if a node is on the main chain
+
+        :param node: node
+        :return: True if on the main chain, False if on a side branch
+        """
+        return self.get_main_node(node.height) is node
+
+    def append(self, block_hash, work=1):
+        """
+        Extend the main chain with a new Block
+
+        :param block_hash: Hash of the Block
+        :param work: Work of the Block alone
+        :return: The node of the Block
+        """
+        node = TreeNode(block_hash, self.tip, work)
+        self._nodes[block_hash] = node
+        self._main.append(node)
+        return node
+
+    def add(self, block_hash, parent, block, work=1):
+        """
+        Add a Block to a side branch, unless it is already in the tree
+
+        :param block_hash: Hash of the Block
+        :param parent: Node of the previous Block, None for a genesis
+        :param block: The Block
+        :param work: Work of the Block alone
+        :return: The node of the Block
+        """
+        node = self._nodes.get(block_hash)
+        if node is None:
+            node = TreeNode(block_hash, parent, work, block)
+            self._nodes[block_hash] = node
+            self._side.add(node)
+        return node
+
+    def find_fork(self, node, other):
+        """
+        Find the last common ancestor of two nodes, walking their parents
+
+        :return: The node or None if they don't share the genesis
+        """
+        while node is not other:
+            if node is None or other is None:
+                return None
+            if node.height >= other.height:
+                node = node.parent
+            else:
+                other = other.parent
+        return node
+
+    def switch_to(self, node):
+        """
+        Make the chain ending with a node the main chain
+
+        Only the index is changed: the caller moves the blocks, from the
+        chain to the dropped nodes and from the adopted nodes to the chain.
+
+        :param node: New tip
+        :return: Height of the fork point, nodes dropped from the main
+                 chain and nodes added to it, in order
+        """
+        fork = self.find_fork(self.tip, node)
+        fork_height = fork.height if fork else 0
+
+        dropped = self._main[fork_height:]
+        del self._main[fork_height:]
+        self._side.update(dropped)
+
+        adopted = []
+        while node is not fork:
+            adopted.append(node)
+            node = node.parent
+        adopted.reverse()
+        self._main.extend(adopted)
+        self._side.difference_update(adopted)
+        return fork_height, dropped, adopted
+
+    def prune(self):
+        """
+        Drop the side branches forking too deep below the tip
+
+        :return: Number of dropped blocks
+        """
+        tip = self.tip
+        if tip is None:
+            return 0
+        threshold = tip.height - self.prune_depth
+        dropped = 0
+        # Parents first: a Block whose parent was dropped goes too
+        for node in sorted(self._side, key=lambda node: node.height):
+            if (node.height <= threshold or
+                    node.parent is not None and
+                    node.parent.hash not in self._nodes):
+                del self._nodes[node.hash]
+                self._side.discard(node)
+                dropped += 1
+        return dropped
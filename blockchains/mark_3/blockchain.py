@@ -1,35 +1,692 @@
+import threading
+
+from functools import wraps
+from itertools import chain as chain_blocks, islice
+from operator import length_hint
+
 from ..mark_1.blockchain import Blockchain as BlockchainMark1
+from ..mark_1 import ndjson
 from ..mark_1 import validation
+from ..mark_1.block import Block
+from ..mark_1.storage import BlockStore
+from .block_tree import BlockTree, get_work
+from .locks import ReadWriteLock
+
+
+def _close(chain):
+    """
+    Stop downloading what is left of a chain, if it is streamed
+
+    :param chain: Iterable of blocks
+    """
+    close = getattr(chain, 'close', None)
+    if close:
+        close()
+
+
+def _reading(method):
+    """
+    Run a method of the Blockchain holding its lock, shared with the other
+    readers
+    """
+    @wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return locked_method
+
+
+def _writing(method):
+    """
+    Run a method of the Blockchain holding its lock, alone
+    """
+    @wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self._lock.write():
+            return method(self, *args, **kwargs)
+    return locked_method
 
 
 class Blockchain(BlockchainMark1):
+    """
+    A Blockchain shared by the threads of a node
+
+    The readers run in parallel, the writers one at a time. The Proof of
+    Work of a new Block is searched without holding the lock, and the
+    chains of the peers are read and validated before the lock is taken
+    to switch to the best one: neither blocks the readers.
+    """
+
+    def __init__(self,
+                 *args,
+                 validation_processes=1,
+                 prune_depth=100,
+                 **kwargs):
+        """
+        :param validation_processes: Number of processes validating the
+                                     chains collected by the consensus
+        :param prune_depth: Depth below the tip of the oldest fork point
+                            whose side branch is kept
+        """
+        self.validation_processes = validation_processes
+        self.prune_depth = prune_depth
+        self._block_tree = None
+        self._lock = ReadWriteLock()
+        # One reorganization at a time, from reading the peers to switching
+        self._reorganization_lock = threading.Lock()
+        # Events cancelling the blocks being mined
+        self._mining_stop_events = set()
+        super().__init__(*args, **kwargs)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # A copy gets its own locks, and mines nothing yet
+        del (state['_lock'], state['_reorganization_lock'],
+             state['_mining_stop_events'])
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._lock = ReadWriteLock()
+        self._reorganization_lock = threading.Lock()
+        self._mining_stop_events = set()
+
+    @property
+    def _tree(self):
+        """
+        Return the block tree indexing the chain and its side branches
+
+        It is built from the chain the first time it is needed, and again
+        after the chain was changed from outside. Only the valid part of
+        the chain is indexed: the blocks after a broken link are left out
+        of the main chain of the tree.
+        """
+        if self._block_tree is None:
+            blocks = self._blocks
+            height = self.get_validated_height()
+            if height < len(blocks):
+                invalid_position = validation.find_invalid_link(
+                    blocks,
+                    start=height,
+                    hash_of=self.get_hash_of,
+                    difficulty=self.difficulty)
+                if invalid_position is not None:
+                    height = invalid_position
+                else:
+                    height = len(blocks)
+
+            tree = BlockTree(self.prune_depth)
+            work = get_work(self.difficulty)
+            for block in islice(blocks, height):
+                tree.append(self.get_hash_of(block), work)
+            self._block_tree = tree
+        return self._block_tree
+
+    def _reset_validation(self):
+        """
+        Forget the validated watermark and the block tree of the chain
+        """
+        super()._reset_validation()
+        self._block_tree = None
+
+    def mine(self, stop_event=None):
+        """
+        Execute the mining process that will create the next block
+
+        :param stop_event: Event cancelling the search of the Proof of
+                           Work once set, also set if the chain switches
+                           to another branch meanwhile
+        :return: The created block, None if there was nothing to mine or
+                 the mining was cancelled
+        """
+        if not len(self._blocks):
+            return self._create_genesis_block()
+        elif self.is_valid():
+            return self._new_block(stop_event=stop_event)
+        else:
+            return None
+
+    def _new_block(self, previous_hash=None, stop_event=None):
+        """
+        Create a new Block in the Blockchain
+
+        The lock is held to take the current transactions and to append
+        the Block, not while its Proof of Work is searched. If the chain
+        moved meanwhile, e.g. switched to a peer's one, the Block doesn't
+        fit anymore: the search is cancelled and its transactions are
+        pending again, as when the search fails.
+
+        :param previous_hash: Hash of previous Block
+        :param stop_event: Event cancelling the search once set
+        :return: New Block or None if no current transactions, if the
+                 chain moved or if cancelled
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+        with self._lock.write():
+            if not len(self._mempool):
+                return None
+            block = self._assemble_block(previous_hash)
+            self._mining_stop_events.add(stop_event)
+
+        sealed = False
+        try:
+            sealed = self._seal_block(block, stop_event)
+        finally:
+            with self._lock.write():
+                self._mining_stop_events.discard(stop_event)
+                if (not sealed or
+                        block['index'] != len(self._blocks) + 1 or
+                        len(self._blocks) and block['previous_hash'] !=
+                        self.get_hash_of(self.last_block)):
+                    # Still the oldest pending ones
+                    self._mempool.restore(block['transactions'])
+                    block = None
+                else:
+                    self._append_block(block)
+        return block
+
+    def cancel_mining(self):
+        """
+        Cancel the search of the Proof of Work of every Block being mined,
+        their transactions are pending again
+
+        :return: Number of cancelled blocks
+        """
+        with self._lock.write():
+            stop_events = [stop_event
+                           for stop_event in self._mining_stop_events
+                           if not stop_event.is_set()]
+            for stop_event in stop_events:
+                stop_event.set()
+            return len(stop_events)
+
+    def _append_block(self, block):
+        super()._append_block(block)
+        tree = self._block_tree
+        if tree is not None:
+            tip = tree.tip
+            if tip is not None and tip.height == len(self._blocks) - 1:
+                tree.append(self.get_hash_of(block), get_work(self.difficulty))
+                tree.prune()
+            else:
+                # Not indexing our chain anymore
+                self._block_tree = None
+
+    @property
+    def store(self):
+        """
+        Return the BlockStore persisting the chain, None if kept in memory
+        """
+        blocks = self._blocks
+        return blocks if isinstance(blocks, BlockStore) else None
+
+    @_reading
+    def get_chain(self):
+        """
+        Return a snapshot of the chain with the blocks in the right order
+
+        A chain kept in memory is copied, the writers don't change the
+        copy. Its blocks are not: changing one drops the validated
+        watermark. A stored chain is returned as a BlockStoreSnapshot, read
+        under the lock: it expires if the chain switches to a peer's one.
+
+        :return: The chain
+        """
+        blocks = self._blocks
+        if isinstance(blocks, BlockStore):
+            return blocks.snapshot(self._lock.read)
+        return list(blocks)
+
+    def get_chain_range(self, from_index=1, to_index=None, validate=True):
+        """
+        Return a range of blocks of the chain, with the height and the
+        validated height of that same chain
+
+        The range is read under the lock, the blocks of a stored chain as
+        their canonical encoding.
+
+        :param from_index: Index of the first Block, from 1 for the genesis
+        :param to_index: Index of the last Block, the last one if None
+        :param validate: Validate the chain up to its last Block, else
+                         report the height validated by the last check
+        :return: Tuple of the height, the validated height and the list
+                 of blocks, or of their bytes if stored
+        """
+        if validate:
+            # Moves the watermark first, checked again below in O(1)
+            # unless blocks were appended meanwhile
+            self.is_valid()
+        with self._lock.read():
+            blocks = self._blocks
+            height = len(blocks)
+            validated_height = self.get_validated_height()
+            if validate and validated_height < height:
+                watermark = self._check_chain()
+                validated_height = watermark[0] if watermark else 0
+
+            start = max(from_index, 1) - 1
+            stop = height if to_index is None else max(min(to_index,
+                                                           height), 0)
+            if isinstance(blocks, BlockStore):
+                chain = list(blocks.iter_raw(start, stop))
+            else:
+                chain = blocks[start:stop]
+            return height, validated_height, chain
+
+    @_reading
+    def get_tip(self):
+        """
+        Return the height of the chain and the hash of its last Block
+
+        :return: Tuple of the height and the hash, the hash None if the
+                 chain is empty
+        """
+        height = len(self._blocks)
+        return height, self.get_block_hash(height)
+
+    def export(self, from_index=1, to_index=None):
+        """
+        Export a range of a snapshot of the chain as NDJSON, one Block per
+        line
+
+        The lines of a stored chain are read while they are consumed:
+        they stop with a StaleSnapshotError if the chain switches to a
+        peer's one meanwhile.
+
+        :param from_index: Index of the first Block, from 1 for the genesis
+        :param to_index: Index of the last Block, the last one if None
+        :return: Generator of lines, as bytes
+        """
+        return self.stream_chain(from_index, to_index)[1]
+
+    @_reading
+    def stream_chain(self, from_index=1, to_index=None):
+        """
+        Export a range of a snapshot of the chain as NDJSON, with the
+        height of that same chain
+
+        :param from_index: Index of the first Block, from 1 for the genesis
+        :param to_index: Index of the last Block, the last one if None
+        :return: Tuple of the height and the generator of lines, as bytes
+        """
+        blocks = self._blocks
+        start = max(from_index, 1) - 1
+        if isinstance(blocks, BlockStore):
+            lines = ndjson.dump_blocks(blocks.snapshot(self._lock.read),
+                                       start,
+                                       to_index)
+        else:
+            lines = ndjson.dump_blocks(blocks[start:to_index])
+        return len(blocks), lines
+
+    def pop_block(self):
+        """
+        Remove the last Block, unless it is the genesis one
+
+        The chain is changed from outside the mining: it is validated
+        again from the genesis Block. It waits for the reorganization in
+        progress, which expects the chain it read to stay in place.
+
+        :return: The removed Block, None if only the genesis is left
+        """
+        with self._reorganization_lock, self._lock.write():
+            if len(self._blocks) > 1:
+                return self._chain.pop()
+            return None
+
+    add_transaction = _writing(BlockchainMark1.add_transaction)
+    add_transactions = _writing(BlockchainMark1.add_transactions)
+    get_validated_height = _reading(BlockchainMark1.get_validated_height)
+    get_block = _reading(BlockchainMark1.get_block)
+    get_block_hash = _reading(BlockchainMark1.get_block_hash)
+    get_block_index = _reading(BlockchainMark1.get_block_index)
+    get_transaction_proof = _reading(BlockchainMark1.get_transaction_proof)
+    get_transaction_location = _reading(
+        BlockchainMark1.get_transaction_location)
+    # Found and read under the same lock, the chain can't move in between
+    get_transaction = _reading(BlockchainMark1.get_transaction)
+
     def is_valid(self, chain=None):
         """
         Determine the blockchain is valid
 
+        A foreign chain is validated from scratch, our own chain only from
+        the last validated watermark. Our chain is validated holding the
+        lock shared with the readers: it is taken alone only to move the
+        watermark, if the chain didn't change meanwhile.
+
+        :param chain: Chain to validate, our own chain if not given
         :return: True if valid, False if not
         """
-        chain_to_validate = chain if chain else self._chain
-        return validation.is_a_valid_chain(chain_to_validate)
+        if chain:
+            return validation.find_invalid_link(
+                chain, difficulty=self.difficulty) is None
+
+        with self._lock.read():
+            blocks = self._blocks
+            height = len(blocks)
+            if self.get_validated_height() == height:
+                return True
+            watermark = self._check_chain()
+            last_hash = self.get_hash_of(blocks[-1])
+
+        with self._lock.write():
+            if (self._blocks is blocks and len(blocks) == height and
+                    self.get_hash_of(blocks[-1]) == last_hash):
+                if watermark is None:
+                    self._reset_validation()
+                else:
+                    self._validated_height, self._validated_hash = watermark
+        return watermark is not None
 
     def evaluate_consensus(self, collected_chains):
         """
         The consensus algorithm.
         The internal chain is replaced with the received one if longer.
 
+        Every valid chain joins the block tree, as a branch forking from
+        our chain, and the main chain switches to the tip with the most
+        cumulative work, if not already ours.
+
+        The chains can be any iterable of blocks, e.g. streamed from a
+        peer, and are validated block by block while they are read:
+        - a chain announcing its length, through len() or
+          __length_hint__(), is not read at all if it can't be longer
+        - its first blocks building on our validated chain are not
+          validated again, ours are kept in their place
+        - it is left at its first invalid Block
+
+        With more than one validation process the chains are read first,
+        then validated together across a pool of processes, the long ones
+        split into segments. The chain adopted is the same.
+
+        The chains are read and validated before taking the lock: only
+        switching to the best one blocks the readers.
+
+        :param collected_chains: Iterable of chains
         :return: True if our chain was replaced, False if not
         """
-        new_chain = None
-        max_length = len(self.get_chain())
+        with self._reorganization_lock:
+            max_length = len(self._blocks)
+            trusted_height = (self.get_validated_height()
+                              if self.is_valid() else 0)
+
+            # Read without the lock: only a reorganization could change
+            # our blocks up to the trusted height
+            if self.validation_processes > 1:
+                candidates = self._read_candidates_in_parallel(
+                    collected_chains, max_length, trusted_height)
+            else:
+                candidates = list(self._read_candidates(collected_chains,
+                                                        max_length,
+                                                        trusted_height))
+
+            with self._lock.write():
+                tip = best_tip = self._tree.tip
+                max_work = tip.work if tip else 0
+                for candidate in candidates:
+                    node = self._add_branch(*candidate)
+                    if node is not None and node.work > max_work:
+                        # Found a new master blockchain
+                        best_tip = node
+                        max_work = node.work
+
+                if best_tip is not tip:
+                    self._reorganize(best_tip)
+                    return True
+                self._tree.prune()
+                return False
 
+    def _read_candidates(self, collected_chains, max_length, trusted_height):
+        """
+        Read and validate the chains one after the other
+
+        :param collected_chains: Iterable of chains
+        :param max_length: Length a chain has to exceed
+        :param trusted_height: Height of our chain known to be valid
+        :return: Generator of the valid candidates, as _read_candidate
+        """
+        for chain in collected_chains:
+            try:
+                if length_hint(chain, max_length + 1) <= max_length:
+                    continue
+                candidate = self._read_candidate(chain, trusted_height)
+            finally:
+                _close(chain)
+            if candidate:
+                max_length = max(max_length,
+                                 candidate[0] + len(candidate[1]))
+                yield candidate
+
+    def _read_candidates_in_parallel(self,
+                                     collected_chains,
+                                     max_length,
+                                     trusted_height):
+        """
+        Read every chain, then validate them across a pool of processes
+
+        :param collected_chains: Iterable of chains
+        :param max_length: Length a chain has to exceed
+        :param trusted_height: Height of our chain known to be valid
+        :return: List of the valid candidates, as _read_candidate
+        """
+        candidates = []
         for chain in collected_chains:
-            length = len(chain)
-            if length > max_length and self.is_valid(chain):
-                # Found a new master blockchain
-                max_length = length
-                new_chain = chain
-
-        if new_chain:
-            self._chain = new_chain
-            return True
-        return False
+            try:
+                if length_hint(chain, max_length + 1) <= max_length:
+                    continue
+                shared = self._skip_shared_blocks(chain, trusted_height)
+                if shared is None:
+                    continue
+                # Sealed, so each new Block is hashed once
+                candidate = (shared[0], [Block(block) for block in shared[1]])
+            finally:
+                _close(chain)
+            if candidate[0] + len(candidate[1]) > max_length:
+                candidates.append(candidate)
+
+        linked_chains = [
+            [self._blocks[shared_height - 1]] + blocks
+            if shared_height else blocks
+            for shared_height, blocks in candidates
+        ]
+        positions = validation.find_invalid_links(linked_chains,
+                                                  self.validation_processes,
+                                                  difficulty=self.difficulty)
+        return [candidate
+                for candidate, position in zip(candidates, positions)
+                if position is None]
+
+    def _skip_shared_blocks(self, chain, trusted_height):
+        """
+        Read the first blocks of a candidate chain building on our trusted
+        blocks, they don't need to be validated again
+
+        :param chain: Iterable of blocks
+        :param trusted_height: Height of our chain known to be valid
+        :return: Number of our blocks shared by the candidate and the
+                 iterator of its other blocks, None if the chain is empty
+        """
+        blocks = iter(chain)
+        first_block = next(blocks, None)
+        if first_block is None:
+            return None
+
+        # While the peer builds on our trusted blocks, they replace its own
+        shared_height = 0
+        next_block = None
+        for next_block in blocks:
+            if (shared_height >= trusted_height or
+                    next_block['previous_hash'] !=
+                    self.get_block_hash(shared_height + 1)):
+                break
+            shared_height += 1
+            first_block, next_block = next_block, None
+
+        pending = [first_block]
+        if next_block is not None:
+            pending.append(next_block)
+        return shared_height, chain_blocks(pending, blocks)
+
+    def _read_candidate(self, chain, trusted_height):
+        """
+        Read and validate a candidate chain, block by block
+
+        :param chain: Iterable of blocks
+        :param trusted_height: Height of our chain known to be valid
+        :return: Number of our blocks shared by the candidate and its new
+                 blocks, None if the candidate is not valid
+        """
+        shared = self._skip_shared_blocks(chain, trusted_height)
+        if shared is None:
+            return None
+        shared_height, blocks = shared
+        new_blocks = []
+
+        def linked_blocks():
+            if shared_height:
+                yield self._blocks[shared_height - 1]
+            for block in blocks:
+                # Sealed, so each new Block is hashed once
+                block = Block(block)
+                new_blocks.append(block)
+                yield block
+
+        if validation.find_invalid_link(
+                linked_blocks(),
+                hash_of=self.get_hash_of,
+                difficulty=self.difficulty) is not None:
+            return None
+        return shared_height, new_blocks
+
+    def _add_branch(self, height, blocks):
+        """
+        Add already validated blocks to the block tree, as a branch
+        forking from our chain
+
+        :param height: Number of our blocks the branch builds on
+        :param blocks: The new blocks, linked to the last shared one
+        :return: Node of the last Block of the branch, None if our chain
+                 has no valid Block at that height anymore
+        """
+        tree = self._tree
+        node = tree.get_main_node(height)
+        if height and node is None:
+            # Not a genesis branch: it can't hang from the genesis
+            return None
+        work = get_work(self.difficulty)
+        # The blocks are linked: each one carries the hash of the previous
+        hashes = chain_blocks((block['previous_hash'] for block in blocks[1:]),
+                              (self.get_hash_of(blocks[-1]), ))
+        for block_hash, block in zip(hashes, blocks):
+            node = tree.add(block_hash, node, block, work)
+        return node
+
+    def _reorganize(self, tip):
+        """
+        Switch our chain to the branch ending with a node of the tree
+
+        Only the blocks after the fork point are rolled back and rolled
+        forward: the dropped ones stay in the tree as a side branch. The
+        mining in progress is cancelled.
+
+        :param tip: Node of the new last Block
+        """
+        # The blocks being mined don't build on the new tip
+        self.cancel_mining()
+        chain = self._blocks
+        tree = self._tree
+        height, dropped, adopted = tree.switch_to(tip)
+        for node in dropped:
+            node.block = chain[node.height - 1]
+
+        blocks = [node.block for node in adopted]
+        if isinstance(chain, BlockStore):
+            # Journaled: a crash doesn't leave the chain cut at the fork
+            chain.replace(blocks, height)
+        else:
+            del chain[height:]
+            chain.extend(blocks)
+        self._watch_blocks(blocks)
+        for node in adopted:
+            node.block = None
+        tree.prune()
+        self._update_index(height, blocks, [node.hash for node in adopted])
+
+        self._validated_height = len(chain)
+        self._validated_hash = tip.hash
+
+    @_reading
+    def get_headers(self, from_index=1, to_index=None):
+        """
+        Return the headers of a range of blocks, light enough to compare
+        chains without their transactions
+
+        :param from_index: Index of the first Block, from 1 for the genesis
+        :param to_index: Index of the last Block, the last one if None
+        :return: List of dicts with index, hash and previous hash
+        """
+        blocks = self._blocks
+        if to_index is None or to_index > len(blocks):
+            to_index = len(blocks)
+        return [{
+            'index': block['index'],
+            'hash': self.get_hash_of(block),
+            'previous_hash': block['previous_hash'],
+        } for block in blocks[max(from_index, 1) - 1:to_index]]
+
+    def find_fork_point(self, headers):
+        """
+        Find the last Block shared with a peer, comparing the hashes
+
+        :param headers: Consecutive headers of the peer, in order
+        :return: Index of the last shared Block, 0 if not even the genesis
+                 is shared, None if it is before the given headers
+        """
+        for header in reversed(headers):
+            if self.get_block_hash(header['index']) == header['hash']:
+                return header['index']
+        if headers and headers[0]['index'] == 1:
+            return 0
+        return None
+
+    def adopt_blocks(self, fork_index, blocks):
+        """
+        Replace the blocks after the fork point with the ones of a peer,
+        if the resulting chain is longer and valid
+
+        Only the new blocks are validated, linked to the last shared Block:
+        the cost depends on the divergence, not on the chain length.
+
+        :param fork_index: Index of the last shared Block, 0 if none
+        :param blocks: Blocks of the peer after the fork point
+        :return: True if our chain was replaced, False if not
+        """
+        with self._reorganization_lock:
+            chain = self._blocks
+            if (not fork_index <= len(chain) < fork_index + len(blocks) or
+                    not self.is_valid()):
+                # Shorter, or not trusted up to the fork point
+                return False
+
+            # Sealed first, so each new Block is hashed once
+            linked = [Block(block) for block in blocks]
+            if fork_index:
+                linked.insert(0, self.get_block(fork_index))
+            if validation.find_invalid_link(
+                    linked,
+                    hash_of=self.get_hash_of,
+                    difficulty=self.difficulty) is not None:
+                return False
+
+            with self._lock.write():
+                if len(chain) >= fork_index + len(blocks):
+                    # Mined past the peer meanwhile
+                    return False
+                tip = self._add_branch(fork_index,
+                                       linked[1:] if fork_index else linked)
+                if tip is None:
+                    return False
+                self._reorganize(tip)
+                return True
@@ -0,0 +1,92 @@
+import threading
+
+from contextlib import contextmanager
+
+
+class ReadWriteLock(object):
+    """
+    A lock held by many readers at the same time or by a single writer
+
+    Writers are served first: once a writer waits, new readers wait too,
+    so a steady flow of readers can't starve it. A thread holding the
+    lock can take it again, and the writer can read, but a reader can't
+    become the writer.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        # Identifier of the thread writing and the times it took the lock
+        self._writer = None
+        self._writer_depth = 0
+        # Times each thread took the lock for reading
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """
+        Hold the lock, shared with the other readers
+        """
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock, alone
+        """
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if not depth:
+            with self._condition:
+                # The writer reads under its own lock
+                local.shared = self._writer != threading.get_ident()
+                if local.shared:
+                    while self._writer is not None or self._waiting_writers:
+                        self._condition.wait()
+                    self._readers += 1
+        local.depth = depth + 1
+
+    def release_read(self):
+        local = self._local
+        local.depth -= 1
+        if not local.depth and local.shared:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        thread = threading.get_ident()
+        with self._condition:
+            if self._writer == thread:
+                self._writer_depth += 1
+                return
+            if getattr(self._local, 'depth', 0):
+                raise RuntimeError('A reader cannot take the lock to write')
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = thread
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
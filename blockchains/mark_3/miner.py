@@ -0,0 +1,295 @@
+import threading
+
+from collections import OrderedDict, deque
+from time import time
+from uuid import uuid4
+
+
+# Status of a mining job
+JOB_QUEUED = 'queued'
+JOB_MINING = 'mining'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+JOB_FAILED = 'failed'
+JOB_FINISHED = (JOB_DONE, JOB_CANCELLED, JOB_FAILED, )
+
+
+class MiningJob(object):
+    """
+    A request to mine the next Block, followed by its id
+
+    Once done it holds the mined Block, None if there was nothing to
+    mine, and the validity of the chain after it.
+    """
+
+    def __init__(self):
+        self.id = uuid4().hex
+        self.status = JOB_QUEUED
+        self.block = None
+        self.is_valid = None
+        self.error = None
+        self.created = time()
+        self.started = None
+        self.finished = None
+        self._stop_event = threading.Event()
+        self._finished_event = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.id!r}, {self.status!r})'
+
+    @property
+    def is_finished(self):
+        """
+        Determine if the job is over, mined, cancelled or failed
+        """
+        return self.status in JOB_FINISHED
+
+    def wait(self, timeout=None):
+        """
+        Wait for the job to be over
+
+        :param timeout: Seconds to wait, forever if None
+        :return: True if over, False if still queued or mining
+        """
+        return self._finished_event.wait(timeout)
+
+    def add_done_callback(self, callback):
+        """
+        Call a function once the job is over, at once if already over
+
+        The function is called with the job, in the thread finishing it:
+        it must not block.
+
+        :param callback: Function taking the job
+        """
+        with self._callbacks_lock:
+            if not self._finished_event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, status):
+        self.status = status
+        self.finished = time()
+        with self._callbacks_lock:
+            self._finished_event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                # The mining goes on
+                print(f'Exception in a callback of job {self.id}: {e!r}')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'block': self.block,
+            'is_valid': self.is_valid,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class MiningScheduler(object):
+    """
+    Mine in a background thread, one job at a time, so the requests
+    asking for a new Block don't wait for its Proof of Work
+
+    The jobs are queued and followed by their id. A job asked while
+    another one is still queued joins it: they mine the same Block.
+    In continuous mode a job is started every interval there are
+    pending transactions. A job is cancelled on demand, and whenever the
+    chain switches to a peer's one while mining, its transactions are
+    then pending again.
+    The last max_jobs finished jobs are kept.
+    """
+
+    def __init__(self,
+                 blockchain,
+                 continuous=False,
+                 interval=1.0,
+                 max_jobs=1000):
+        """
+        :param blockchain: Blockchain to mine
+        :param continuous: Mine the pending transactions without being
+                           asked
+        :param interval: Seconds between two checks of the pending
+                         transactions in continuous mode
+        :param max_jobs: Maximum number of finished jobs kept
+        """
+        self.blockchain = blockchain
+        self.continuous = continuous
+        self.interval = interval
+        self.max_jobs = max_jobs
+        # Job id -> job, the oldest first
+        self._jobs = OrderedDict()
+        self._queue = deque()
+        self._current = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.mined = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def start(self):
+        """
+        Start the mining thread, if not started yet
+        """
+        with self._condition:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run,
+                                                name='miner',
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the mining thread, cancelling the queued jobs and the one in
+        progress
+
+        :param timeout: Seconds to wait for the thread, forever if None
+        """
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            while self._queue:
+                self._cancel(self._queue.popleft())
+            if self._current is not None:
+                self._current._stop_event.set()
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._condition:
+            self._thread = None
+
+    def submit(self):
+        """
+        Ask for the next Block to be mined, starting the mining thread if
+        needed
+
+        :return: The job, the one already queued if any
+        """
+        with self._condition:
+            if self._queue:
+                return self._queue[-1]
+            job = self._add_job()
+            self._queue.append(job)
+            self._condition.notify_all()
+        self.start()
+        return job
+
+    def get(self, job_id):
+        """
+        Return a job
+
+        :param job_id: Id of the job
+        :return: The job or None if unknown
+        """
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job, if not finished yet
+
+        A queued job is cancelled at once, the one mining as soon as the
+        search of the Proof of Work stops.
+
+        :param job_id: Id of the job
+        :return: The job or None if unknown
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return job
+            if job.status == JOB_QUEUED:
+                self._queue.remove(job)
+                self._cancel(job)
+            else:
+                job._stop_event.set()
+            return job
+
+    def get_stats(self):
+        """
+        Return the counters of the scheduler
+
+        :return: dict of mined, cancelled and failed jobs, of queued jobs
+                 and of the id of the job mining, if any
+        """
+        with self._condition:
+            return {
+                'mined': self.mined,
+                'cancelled': self.cancelled,
+                'failed': self.failed,
+                'queued': len(self._queue),
+                'mining': self._current.id if self._current else None,
+            }
+
+    def _add_job(self):
+        job = MiningJob()
+        self._jobs[job.id] = job
+        # Finished jobs beyond the maximum are forgotten, the oldest first
+        finished = [old_job for old_job in self._jobs.values()
+                    if old_job.is_finished]
+        for old_job in finished[:max(len(finished) - self.max_jobs, 0)]:
+            del self._jobs[old_job.id]
+        return job
+
+    def _cancel(self, job):
+        job._finish(JOB_CANCELLED)
+        self.cancelled += 1
+
+    def _next_job(self):
+        """
+        Wait for the next job to mine
+
+        :return: The job, None once stopping
+        """
+        with self._condition:
+            while not self._stopping:
+                if self._queue:
+                    job = self._queue.popleft()
+                elif (self.continuous and
+                      len(self.blockchain.current_transactions)):
+                    job = self._add_job()
+                else:
+                    self._condition.wait(self.interval
+                                         if self.continuous else None)
+                    continue
+                job.status = JOB_MINING
+                job.started = time()
+                self._current = job
+                return job
+            return None
+
+    def _run(self):
+        job = self._next_job()
+        while job is not None:
+            try:
+                job.block = self.blockchain.mine(stop_event=job._stop_event)
+                job.is_valid = self.blockchain.is_valid()
+            except Exception as e:
+                job.error = f'{e.__class__.__name__}: {e}'
+            with self._condition:
+                self._current = None
+                if job.error is not None:
+                    job._finish(JOB_FAILED)
+                    self.failed += 1
+                elif job.block is None and job._stop_event.is_set():
+                    self._cancel(job)
+                else:
+                    job._finish(JOB_DONE)
+                    if job.block is not None:
+                        self.mined += 1
+            job = self._next_job()
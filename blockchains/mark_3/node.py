@@ -0,0 +1,200 @@
+import atexit
+import os
+import threading
+
+from urllib.parse import urlparse
+from uuid import uuid4
+
+from .blockchain import Blockchain
+from .miner import MiningScheduler
+from ..mark_1.mempool import Mempool
+from ..mark_1.storage import BlockStore
+
+
+# Seconds between two checks of the pending transactions by the miner,
+# mining only when asked if 0
+MINING_INTERVAL = float(os.environ.get('BLOCKCHAIN_MINING_INTERVAL', 0))
+# Seconds a request waits for the Block it asked for
+MINE_WAIT_TIMEOUT = 30
+# Seconds to wait for the miner of a replaced Blockchain to stop
+MINER_STOP_TIMEOUT = 5
+
+# Header announcing the chain height in a streamed chain
+CHAIN_HEIGHT_HEADER = 'X-Chain-Height'
+
+
+def create_blockchain():
+    """
+    Instantiate the Blockchain of a node from the environment
+
+    The chain is persisted if a store directory is configured
+    (BLOCKCHAIN_STORE_PATH), the pending transactions are bounded
+    (BLOCKCHAIN_MEMPOOL_SIZE), the oldest evicted first.
+
+    :return: The Blockchain
+    """
+    store = None
+    if os.environ.get('BLOCKCHAIN_STORE_PATH'):
+        store = BlockStore(os.environ['BLOCKCHAIN_STORE_PATH'])
+        atexit.register(store.close)
+    mempool = Mempool(
+        max_count=int(os.environ.get('BLOCKCHAIN_MEMPOOL_SIZE', 100000)))
+    return Blockchain(
+        store=store,
+        mempool=mempool,
+        block_size=int(os.environ.get('BLOCKCHAIN_BLOCK_SIZE', 10000)),
+        validation_processes=int(
+            os.environ.get('BLOCKCHAIN_VALIDATION_PROCESSES', 1)))
+
+
+class NodeState(object):
+    """
+    The state of a node, shared by the threads serving the requests: its
+    Blockchain, known nodes and mining scheduler
+    """
+
+    def __init__(self, blockchain, mining_interval=MINING_INTERVAL):
+        """
+        :param blockchain: Blockchain of the node
+        :param mining_interval: Seconds between two checks of the pending
+                                transactions by the miner, mining only
+                                when asked if 0
+        """
+        self.blockchain = blockchain
+        self.mining_interval = mining_interval
+        # Generate a globally unique address for this node
+        self.node_identifier = str(uuid4()).replace('-', '')
+        # List of neighbours to this node
+        self.known_nodes = set()
+        # Mining in the background, the scheduler follows the Blockchain
+        self.miner = None
+        self._miner_lock = threading.Lock()
+        if mining_interval > 0:
+            self.get_miner()
+
+    def get_miner(self):
+        """
+        Return the mining scheduler of the Blockchain of the node, a new
+        one if the Blockchain was replaced
+
+        :return: The started MiningScheduler
+        """
+        with self._miner_lock:
+            miner = self.miner
+            if miner is None or miner.blockchain is not self.blockchain:
+                if miner is not None:
+                    # Not mining the replaced Blockchain anymore
+                    miner.stop(timeout=MINER_STOP_TIMEOUT)
+                miner = self.miner = MiningScheduler(
+                    self.blockchain,
+                    continuous=self.mining_interval > 0,
+                    interval=self.mining_interval or 1.0)
+                miner.start()
+            return miner
+
+    def stop_miner(self, timeout=MINER_STOP_TIMEOUT):
+        """
+        Stop the mining scheduler, if started
+
+        :param timeout: Seconds to wait for it
+        """
+        with self._miner_lock:
+            if self.miner is not None:
+                self.miner.stop(timeout=timeout)
+
+    def register_known_node(self, url_address):
+        """
+        Add a new node to the list of known nodes
+
+        :param url_address: Address of node. Eg. 'http://127.0.0.1:5000'
+        """
+        # Parse the url
+        parsed_url = urlparse(url_address)
+
+        if parsed_url.netloc:
+            # URL with scheme, e.g. 'http://127.0.0.1:5000'.
+            self.known_nodes.add(parsed_url.netloc)
+        elif parsed_url.path:
+            # URL without scheme, e.g. '127.0.0.1:5000'.
+            self.known_nodes.add(parsed_url.path)
+        else:
+            raise ValueError('Invalid URL')
+
+
+def get_int(args, name, default=None):
+    """
+    Return a query parameter as an integer
+
+    :param args: Mapping of the query parameters, as strings
+    :param name: Name of the parameter
+    :param default: Value if missing or not an integer
+    """
+    try:
+        return int(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+class ChainQuery(object):
+    """
+    A GET /chain query: a range of blocks of the chain, the whole chain by
+    default
+
+    Query parameters:
+    - from, to: Indexes of the first and last Block, from 1 for the genesis
+    - limit: Maximum number of blocks, the index to ask from for the next
+      ones is then returned as cursor in 'next'
+    - validity=cached: Report the validity known from the last check
+      instead of validating the chain again, with the validated height
+    - format=ndjson: Stream the blocks of the range, one per line, encoded
+      while they are sent
+    """
+
+    def __init__(self, args):
+        """
+        :param args: Mapping of the query parameters, as strings
+        """
+        self.from_index = max(get_int(args, 'from', 1), 1)
+        self.to_index = get_int(args, 'to')
+        self.limit = get_int(args, 'limit')
+        if self.limit is not None and self.limit <= 0:
+            self.limit = None
+        self.cached_validity = args.get('validity') == 'cached'
+        self.ndjson = args.get('format') == 'ndjson'
+
+    def stream(self, blockchain):
+        """
+        Export the range as NDJSON
+
+        :param blockchain: Blockchain
+        :return: Tuple of the height of the chain and the generator of
+                 lines, as bytes
+        """
+        return blockchain.stream_chain(self.from_index, self.to_index)
+
+    def read(self, blockchain):
+        """
+        Read the range, with the validity of the same chain
+
+        :param blockchain: Blockchain
+        :return: Tuple of the dict of the fields of the response but the
+                 chain, and of the list of blocks, of their canonical
+                 encoding if the chain is stored
+        """
+        to_index = self.to_index
+        if self.limit:
+            # One more Block tells if there are others after the range
+            last_index = self.from_index + self.limit
+            if to_index is None or to_index > last_index:
+                to_index = last_index
+        height, validated_height, blocks = blockchain.get_chain_range(
+            self.from_index, to_index, validate=not self.cached_validity)
+
+        fields = {}
+        if self.limit and len(blocks) > self.limit:
+            blocks = blocks[:self.limit]
+            fields['next'] = self.from_index + self.limit
+        fields['is_valid'] = validated_height == height
+        if self.cached_validity:
+            fields['validated_height'] = validated_height
+        return fields, blocks
@@ -0,0 +1,99 @@
+import requests
+import threading
+
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from time import monotonic
+
+
+class PeerSessions(object):
+    """
+    Keep-alive HTTP sessions to the peers, one per peer
+
+    Each session keeps a bounded pool of open connections to its peer,
+    reused across the consensus rounds. The sessions idle for too long
+    are closed, as their peer has likely dropped the connections, and so
+    are the least recently used ones beyond the maximum number of peers.
+    """
+
+    def __init__(self, max_peers=64, pool_size=4, max_idle=60):
+        """
+        :param max_peers: Maximum number of sessions kept open
+        :param pool_size: Maximum number of connections kept to a peer
+        :param max_idle: Seconds a session is kept without being used
+        """
+        self.max_peers = max_peers
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        # Peer -> (session, last use), the least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _evict(self, peer):
+        session = self._sessions.pop(peer)[0]
+        session.close()
+        self.evictions += 1
+
+    def get(self, peer):
+        """
+        Return the session of a peer, opened if missing
+
+        :param peer: Address of the peer
+        :return: The session
+        """
+        with self._lock:
+            now = monotonic()
+            # Stale sessions are at the beginning
+            for stale_peer, (_, last_use) in list(self._sessions.items()):
+                if now - last_use <= self.max_idle:
+                    break
+                self._evict(stale_peer)
+
+            entry = self._sessions.pop(peer, None)
+            if entry is None:
+                self.misses += 1
+                session = self._new_session()
+            else:
+                self.hits += 1
+                session = entry[0]
+            self._sessions[peer] = (session, now)
+
+            while len(self._sessions) > self.max_peers:
+                self._evict(next(iter(self._sessions)))
+            return session
+
+    def get_stats(self):
+        """
+        Return the counters of the sessions
+
+        :return: dict of hits, misses, evictions and open sessions
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'sessions': len(self._sessions),
+            }
+
+    def close(self):
+        """
+        Close all the sessions
+        """
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
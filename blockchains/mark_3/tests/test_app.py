@@ -1,13 +1,24 @@
+import copy
+import json
+import operator
 import pytest
 import random
+import requests
+import threading
+import time
 
-from flask import g
 from jsonschema import validate
 from unittest import mock
+from werkzeug.serving import make_server
 
 from ...mark_1.tests.test_blockchain import (sample_transaction_f,
                                              w_sample_blocks_f)
+from ...mark_1 import ndjson
+from ...mark_1 import validation
+from ...mark_1.storage import BlockStore
 from .. import app as sut_app
+from ..app import node_state
+from ..blockchain import Blockchain
 from .test_blockchain import sample_sut
 
 
@@ -17,10 +28,38 @@ SCHEMA_DRAFT = "http://json-schema.org/draft-07/schema#"
 @pytest.fixture(scope="function")
 def client(sample_sut):
     client = sut_app.app.test_client()
-    g.blockchain = sample_sut()
+    node_state.blockchain = sample_sut()
     return client
 
 
+@pytest.fixture(scope="function")
+def node_server(sample_sut):
+    """
+    The node served by a threaded server, a thread per request
+    """
+    node_state.blockchain = sample_sut()
+    node_state.known_nodes = set()
+    server = make_server('127.0.0.1', 0, sut_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="function")
+def slow_sealing():
+    """
+    The Proof of Work of the new blocks is searched until cancelled
+    """
+    def seal_block(self, block, stop_event=None):
+        stop_event.wait(5)
+        return False
+
+    with mock.patch.object(Blockchain, '_seal_block',
+                           autospec=True, side_effect=seal_block):
+        yield
+
+
 @pytest.fixture(scope="function")
 def schema_def_genesis_hash():
     return {
@@ -296,7 +335,7 @@ class TestEvilActionEndpoint(object):
         schema = schema_def_evil_action
         with client:
             random_integer = random.randint(1, 10)
-            g.blockchain = w_sample_blocks_f(random_integer)
+            node_state.blockchain = w_sample_blocks_f(random_integer)
             # Act
             response = client.post('/action/evil', json={})
             # Assert
@@ -313,7 +352,7 @@ class TestMineEndpoint(object):
         # Arrange
         schema = schema_def_mine
         # Act
-        response = client.post('/mine', json={})
+        response = client.post('/mine?wait=true', json={})
         # Assert
         assert response.status_code == 201
         validate(instance=response.json, schema=schema)
@@ -326,14 +365,97 @@ class TestMineEndpoint(object):
         schema = schema_def_mine
         with client:
             random_integer = 3
-            g.blockchain = w_sample_blocks_f(random_integer)
-            g.blockchain._chain[1]['index'] = 23
+            node_state.blockchain = w_sample_blocks_f(random_integer)
+            node_state.blockchain._chain[1]['index'] = 23
             # Act
-            response = client.post('/mine', json={})
+            response = client.post('/mine?wait=true', json={})
             # Assert
             assert response.status_code == 200
             validate(instance=response.json, schema=schema)
 
+    def test_returns_the_job(self, client, sample_transaction_f):
+        # Arrange
+        node_state.blockchain.add_transaction(**sample_transaction_f())
+        # Act
+        response = client.post('/mine', json={})
+        # Assert
+        assert response.status_code == 202
+        job = response.json['job']
+        assert job['status'] in ('queued', 'mining', 'done')
+        assert response.headers['Location'].endswith(
+            f'/mine/jobs/{job["id"]}')
+        assert sut_app.get_miner().get(job['id']).wait(5) == True
+        response = client.get(f'/mine/jobs/{job["id"]}')
+        assert response.status_code == 200
+        assert response.json['job']['status'] == 'done'
+        assert response.json['job']['block']['index'] == 2
+        assert response.json['job']['is_valid'] == True
+
+
+    def test_wait_timeout(self, client, slow_sealing, sample_transaction_f):
+        # Arrange
+        node_state.blockchain.add_transaction(**sample_transaction_f())
+        with mock.patch.object(sut_app, 'MINE_WAIT_TIMEOUT', 0.1):
+            # Act
+            response = client.post('/mine?wait=true', json={})
+        # Assert
+        assert response.status_code == 202
+        job = response.json['job']
+        assert job['status'] in ('queued', 'mining')
+        assert response.headers['Location'].endswith(
+            f'/mine/jobs/{job["id"]}')
+        sut_app.get_miner().cancel(job['id'])
+
+    def test_miner_of_a_replaced_blockchain_is_stopped(self,
+                                                        client,
+                                                        slow_sealing,
+                                                        sample_transaction_f):
+        # Arrange
+        node_state.blockchain.add_transaction(**sample_transaction_f())
+        client.post('/mine', json={})
+        thread = sut_app.get_miner()._thread
+        node_state.blockchain = copy.deepcopy(node_state.blockchain)
+        # Act
+        sut_app.get_miner()
+        # Assert
+        assert not thread.is_alive()
+
+
+class TestMiningJobEndpoint(object):
+    """
+    Test the mining job endpoint
+    """
+
+    def test_unknown_job(self, client):
+        # Act
+        response = client.get('/mine/jobs/unknown')
+        # Assert
+        assert response.status_code == 404
+
+    def test_cancel(self, client, slow_sealing, sample_transaction_f):
+        # Arrange
+        node_state.blockchain.add_transaction(**sample_transaction_f())
+        job_id = client.post('/mine', json={}).json['job']['id']
+        job = sut_app.get_miner().get(job_id)
+        # Act
+        response = client.delete(f'/mine/jobs/{job_id}')
+        # Assert
+        assert response.status_code == 200
+        assert job.wait(5) == True
+        assert job.status == 'cancelled'
+        assert len(node_state.blockchain.current_transactions) == 1
+        response = client.delete(f'/mine/jobs/{job_id}')
+        assert response.status_code == 409
+
+    def test_stats(self, client):
+        # Arrange
+        client.post('/mine?wait=true', json={})
+        # Act
+        response = client.get('/mine/stats')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['queued'] == 0
+
 
 class TestTransactionEndpoint(object):
     """
@@ -356,6 +478,78 @@ class TestTransactionEndpoint(object):
         # Assert
         assert response.status_code == 400
 
+    def test_on_full_mempool(self, client, sample_transaction_f):
+        # Arrange
+        node_state.blockchain.current_transactions.max_count = 0
+        payload = sample_transaction_f()
+        # Act
+        response = client.post('/transactions/new', json=payload)
+        # Assert
+        assert response.status_code == 503
+        assert response.json == {'error': 'Mempool full'}
+
+
+class TestBatchTransactionsEndpoint(object):
+    """
+    Test the submission of many transactions at once
+    """
+
+    def test_sample_transactions(self, client, sample_transaction_f):
+        # Arrange
+        transactions = [sample_transaction_f() for _ in range(1000)]
+        payload = {'transactions': transactions}
+        # Act
+        response = client.post('/transactions/batch', json=payload)
+        # Assert
+        assert response.status_code == 201
+        assert response.json['transactions'] == transactions
+        assert response.json['errors'] == []
+        assert node_state.blockchain.current_transactions == transactions
+
+    def test_reports_errors_by_position(self, client, sample_transaction_f):
+        # Arrange
+        payload = {
+            'transactions': [sample_transaction_f(), {}, 23],
+        }
+        # Act
+        response = client.post('/transactions/batch', json=payload)
+        # Assert
+        assert response.status_code == 201
+        assert len(response.json['transactions']) == 1
+        assert response.json['errors'] == [
+            {'position': 1, 'error': 'Missing values'},
+            {'position': 2, 'error': 'Not an object'},
+        ]
+
+    def test_on_invalid_transactions_only(self, client):
+        # Arrange
+        payload = {'transactions': [{}]}
+        # Act
+        response = client.post('/transactions/batch', json=payload)
+        # Assert
+        assert response.status_code == 400
+        assert response.json['transactions'] == []
+
+    @pytest.mark.parametrize('payload', [{}, {'transactions': []},
+                                         {'transactions': {'data': 23}},
+                                         []])
+    def test_missing_transactions(self, client, payload):
+        # Act
+        response = client.post('/transactions/batch', json=payload)
+        # Assert
+        assert response.status_code == 400
+        assert response.json == {'error': 'Missing values'}
+
+    def test_too_many_transactions(self, client, sample_transaction_f):
+        # Arrange
+        payload = {'transactions': 3 * [sample_transaction_f()]}
+        with mock.patch.object(sut_app, 'MAX_BATCH_SIZE', 2):
+            # Act
+            response = client.post('/transactions/batch', json=payload)
+            # Assert
+            assert response.status_code == 413
+        assert node_state.blockchain.current_transactions == []
+
 
 class TestChainEndpoint(object):
     """
@@ -372,6 +566,372 @@ class TestChainEndpoint(object):
         validate(instance=response.json, schema=schema)
 
 
+    def test_on_stored_chain(self, client, schema_def_chain, tmp_path):
+        # Arrange
+        schema = schema_def_chain
+        with BlockStore(str(tmp_path)) as store:
+            node_state.blockchain = Blockchain(store=store)
+            node_state.blockchain.add_transaction('Chancellor on brink')
+            node_state.blockchain.mine()
+            expected_chain = list(node_state.blockchain.get_chain())
+            # Act
+            response = client.get('/chain', json={})
+            # Assert
+            assert response.status_code == 200
+            assert response.mimetype == 'application/json'
+            validate(instance=response.json, schema=schema)
+            assert response.json['chain'] == expected_chain
+            assert response.json['is_valid'] == True
+
+
+    def test_from_index(self, client):
+        # Arrange
+        node_state.blockchain.add_transaction('Chancellor on brink')
+        node_state.blockchain.mine()
+        expected_chain = node_state.blockchain.get_chain()[1:]
+        # Act
+        response = client.get('/chain?from=2')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['chain'] == expected_chain
+
+    def test_from_index_on_stored_chain(self, client, tmp_path):
+        # Arrange
+        with BlockStore(str(tmp_path)) as store:
+            node_state.blockchain = Blockchain(store=store)
+            node_state.blockchain.add_transaction('Chancellor on brink')
+            node_state.blockchain.mine()
+            expected_chain = list(node_state.blockchain.get_chain())[1:]
+            # Act
+            response = client.get('/chain?from=2')
+            # Assert
+            assert response.status_code == 200
+            assert response.json['chain'] == expected_chain
+
+
+    def test_range(self, client):
+        # Arrange
+        for block in range(4):
+            node_state.blockchain.add_transaction(f'Block {block}')
+            node_state.blockchain.mine()
+        expected_chain = node_state.blockchain.get_chain()[1:3]
+        # Act
+        response = client.get('/chain?from=2&to=3')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['chain'] == expected_chain
+        assert 'next' not in response.json
+
+    def test_pages(self, client):
+        # Arrange
+        for block in range(4):
+            node_state.blockchain.add_transaction(f'Block {block}')
+            node_state.blockchain.mine()
+        retrieved_chain = []
+        cursor = 1
+        # Act
+        while cursor:
+            response = client.get(f'/chain?from={cursor}&limit=2')
+            retrieved_chain.extend(response.json['chain'])
+            cursor = response.json.get('next')
+        # Assert
+        assert retrieved_chain == node_state.blockchain.get_chain()
+
+    def test_pages_on_stored_chain(self, client, tmp_path):
+        # Arrange
+        with BlockStore(str(tmp_path)) as store:
+            node_state.blockchain = Blockchain(store=store)
+            for block in range(4):
+                node_state.blockchain.add_transaction(f'Block {block}')
+                node_state.blockchain.mine()
+            # Act
+            response = client.get('/chain?from=2&limit=2')
+            # Assert
+            assert response.status_code == 200
+            assert response.json['chain'] == list(store)[1:3]
+            assert response.json['next'] == 4
+            assert response.json['is_valid'] == True
+
+    def test_cached_validity(self, client):
+        # Arrange
+        node_state.blockchain.is_valid()
+        node_state.blockchain.add_transaction('Chancellor on brink')
+        node_state.blockchain.mine()
+        with mock.patch.object(node_state.blockchain,
+                               'is_valid') as mock_is_valid:
+            # Act
+            response = client.get('/chain?validity=cached')
+            # Assert
+            mock_is_valid.assert_not_called()
+        assert response.status_code == 200
+        assert response.json['is_valid'] == False
+        assert response.json['validated_height'] == 1
+
+    def test_validated_chain_is_read_without_the_writers(self, client):
+        # Arrange
+        node_state.blockchain.is_valid()
+        with mock.patch.object(node_state.blockchain._lock, 'write',
+                               side_effect=AssertionError('Write lock')):
+            # Act
+            response = client.get('/chain')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['is_valid'] == True
+
+    def test_ndjson_stream(self, client):
+        # Arrange
+        for block in range(3):
+            node_state.blockchain.add_transaction(f'Block {block}')
+            node_state.blockchain.mine()
+        # Act
+        response = client.get('/chain?format=ndjson&from=2')
+        # Assert
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.is_streamed
+        assert response.headers['X-Chain-Height'] == '4'
+        assert ([json.loads(line) for line in response.data.splitlines()] ==
+                node_state.blockchain.get_chain()[1:])
+
+    def test_ndjson_stream_on_stored_chain(self, client, tmp_path):
+        # Arrange
+        with BlockStore(str(tmp_path)) as store:
+            node_state.blockchain = Blockchain(store=store)
+            node_state.blockchain.add_transaction('Chancellor on brink')
+            node_state.blockchain.mine()
+            # Act
+            response = client.get('/chain?format=ndjson')
+            # Assert
+            assert response.status_code == 200
+            assert response.data == b''.join(node_state.blockchain.export())
+
+
+class TestBlocksEndpoint(object):
+    """
+    Test the block by index and block by hash endpoints
+    """
+
+    def test_by_index(self, client):
+        # Arrange
+        node_state.blockchain.add_transaction('Chancellor on brink')
+        node_state.blockchain.mine()
+        # Act
+        response = client.get('/blocks/2')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['block'] == node_state.blockchain.last_block
+
+    def test_by_hash(self, client):
+        # Arrange
+        node_state.blockchain.add_transaction('Chancellor on brink')
+        node_state.blockchain.mine()
+        block_hash = node_state.blockchain.get_block_hash(1)
+        # Act
+        response = client.get(f'/blocks/{block_hash}')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['block'] == node_state.blockchain.genesis_block
+
+    def test_on_stored_chain(self, client, tmp_path):
+        # Arrange
+        with BlockStore(str(tmp_path)) as store:
+            node_state.blockchain = Blockchain(store=store)
+            node_state.blockchain.add_transaction('Chancellor on brink')
+            node_state.blockchain.mine()
+            block_hash = node_state.blockchain.get_block_hash(2)
+            # Act
+            response = client.get(f'/blocks/{block_hash}')
+            # Assert
+            assert response.status_code == 200
+            assert response.json['block'] == store[1]
+
+    def test_missing_block(self, client):
+        # Arrange
+        # Act
+        response = client.get('/blocks/23')
+        # Assert
+        assert response.status_code == 404
+        assert client.get(f'/blocks/{64 * "a"}').status_code == 404
+
+
+class TestTransactionByHash(object):
+    """
+    Test the transaction by hash endpoint
+    """
+
+    def test_on_mined_transaction(self, client):
+        # Arrange
+        node_state.blockchain.add_transaction('Chancellor on brink')
+        transaction = node_state.blockchain.add_transaction(
+            'of second bailout')
+        node_state.blockchain.mine()
+        transaction_hash = validation.get_transaction_hash(transaction)
+        # Act
+        response = client.get(f'/transactions/{transaction_hash}')
+        # Assert
+        assert response.status_code == 200
+        assert response.json == {
+            'transaction': {'data': 'of second bailout'},
+            'block_index': 2,
+            'position': 1,
+        }
+
+    def test_on_pending_transaction(self, client):
+        # Arrange
+        transaction = node_state.blockchain.add_transaction(
+            'Chancellor on brink')
+        transaction_hash = validation.get_transaction_hash(transaction)
+        # Act
+        response = client.get(f'/transactions/{transaction_hash}')
+        # Assert
+        assert response.status_code == 200
+        assert response.json == {
+            'transaction': {'data': 'Chancellor on brink'},
+            'block_index': None,
+            'position': None,
+        }
+
+    def test_on_stored_chain(self, client, tmp_path):
+        # Arrange
+        with BlockStore(str(tmp_path)) as store:
+            node_state.blockchain = Blockchain(store=store)
+            transaction = node_state.blockchain.add_transaction(
+                'Chancellor on brink')
+            node_state.blockchain.mine()
+            transaction_hash = validation.get_transaction_hash(transaction)
+            # Act
+            response = client.get(f'/transactions/{transaction_hash}')
+            # Assert
+            assert response.status_code == 200
+            assert response.json['block_index'] == 2
+
+    def test_missing_transaction(self, client):
+        # Act
+        response = client.get(f'/transactions/{64 * "a"}')
+        # Assert
+        assert response.status_code == 404
+        assert response.json == {'error': 'Transaction not found'}
+
+
+class TestChainHeightEndpoint(object):
+    """
+    Test the chain height endpoint
+    """
+
+    def test_on_genesis_block(self, client):
+        # Arrange
+        expected_hash = node_state.blockchain.get_block_hash(1)
+        # Act
+        response = client.get('/chain/height')
+        # Assert
+        assert response.status_code == 200
+        assert response.json == {'height': 1, 'last_hash': expected_hash}
+
+
+class TestHeadersEndpoint(object):
+    """
+    Test the headers endpoint
+    """
+
+    def test_range(self, client):
+        # Arrange
+        for block in range(4):
+            node_state.blockchain.add_transaction(f'Block {block}')
+            node_state.blockchain.mine()
+        # Act
+        response = client.get('/headers?from=2&to=3')
+        # Assert
+        assert response.status_code == 200
+        assert (response.json['headers'] ==
+                node_state.blockchain.get_headers(2, 3))
+
+    def test_page_size(self, client):
+        # Arrange
+        for block in range(4):
+            node_state.blockchain.add_transaction(f'Block {block}')
+            node_state.blockchain.mine()
+        with mock.patch.object(sut_app, 'MAX_HEADERS', 2):
+            # Act
+            response = client.get('/headers?from=2')
+        # Assert
+        assert response.status_code == 200
+        assert len(response.json['headers']) == 2
+
+
+class TestSyncEndpoint(object):
+    """
+    Test the header-first sync
+    """
+
+    @staticmethod
+    def serve(peer, requested_blocks):
+        """
+        Answer the requests of the sync with the chain of a peer
+        """
+
+        def get(url, params=None, timeout=None):
+            params = params or {}
+            response = mock.Mock(status_code=200)
+            if url.endswith('/chain/height'):
+                response.json.return_value = {
+                    'height': len(peer.get_chain()),
+                }
+            elif url.endswith('/headers'):
+                response.json.return_value = {
+                    'headers': peer.get_headers(params['from'],
+                                                params['to']),
+                }
+            else:
+                blocks = [block.to_dict()
+                          for block in peer.get_chain()[params['from'] - 1:]]
+                requested_blocks.extend(blocks)
+                response.json.return_value = {'chain': blocks}
+            return response
+
+        return get
+
+    def test_fork_bodies_only(self, client):
+        # Arrange
+        for block in range(40):
+            node_state.blockchain.add_transaction(f'Shared block {block}')
+            node_state.blockchain.mine()
+        peer = copy.deepcopy(node_state.blockchain)
+        for block in range(3):
+            peer.add_transaction(f'Block {block} of the peer')
+            peer.mine()
+        node_state.blockchain.add_transaction('Our block')
+        node_state.blockchain.mine()
+        node_state.known_nodes = {'localhost:8081'}
+        requested_blocks = []
+        with mock.patch('requests.Session.get',
+                        side_effect=self.serve(peer, requested_blocks)):
+            # Act
+            response = client.post('/nodes/sync')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['status'] == 'Chain replaced'
+        assert response.json['height'] == 44
+        assert len(requested_blocks) == 3
+        assert node_state.blockchain.get_chain() == peer.get_chain()
+        assert node_state.blockchain.is_valid() == True
+
+    def test_on_shorter_peer(self, client):
+        # Arrange
+        peer = copy.deepcopy(node_state.blockchain)
+        node_state.blockchain.add_transaction('Our block')
+        node_state.blockchain.mine()
+        node_state.known_nodes = {'localhost:8081'}
+        requested_blocks = []
+        with mock.patch('requests.Session.get',
+                        side_effect=self.serve(peer, requested_blocks)):
+            # Act
+            response = client.post('/nodes/sync')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['status'] == 'Chain not replaced - master'
+        assert requested_blocks == []
+
+
 class TestRegisterKnownNodeFunction(object):
     """
     Test the register_known_node function
@@ -393,7 +953,7 @@ class TestRegisterKnownNodeFunction(object):
         # Assert
         with client:
             sut_app.register_known_node(test_url)
-            assert extracted_test_url in g.known_nodes
+            assert extracted_test_url in node_state.known_nodes
 
     def test_path_url_address(self, client):
         # Arrange
@@ -403,7 +963,7 @@ class TestRegisterKnownNodeFunction(object):
         # Assert
         with client:
             sut_app.register_known_node(test_url)
-            assert extracted_test_url in g.known_nodes
+            assert extracted_test_url in node_state.known_nodes
 
 
 class TestRegisterNodesEndpoint(object):
@@ -526,7 +1086,7 @@ class TestDoGossipFunction(object):
         known_nodes = [
             "localhost:8081",
         ]
-        with mock.patch('requests.get') as mock_get:
+        with mock.patch('requests.Session.get') as mock_get:
             mock_get.return_value.status_code = 200
             mock_get.return_value.json.return_value = {
                 "chain": "sample value"
@@ -541,7 +1101,7 @@ class TestDoGossipFunction(object):
         known_nodes = [
             "localhost:8081",
         ]
-        with mock.patch('requests.get') as mock_get:
+        with mock.patch('requests.Session.get') as mock_get:
             mock_get.return_value.status_code = 500
             # Act
             retrieved_value = sut_app.do_gossip(known_nodes)
@@ -553,13 +1113,235 @@ class TestDoGossipFunction(object):
         known_nodes = [
             "localhost:8081",
         ]
-        with mock.patch('requests.get') as mock_get:
+        with mock.patch('requests.Session.get') as mock_get:
             mock_get.side_effect = Exception()
             # Act
             retrieved_value = sut_app.do_gossip(known_nodes)
             # Assert
             assert retrieved_value == []
 
+    def test_timeout_is_passed(self):
+        # Arrange
+        known_nodes = [
+            "localhost:8081",
+        ]
+        with mock.patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 500
+            # Act
+            sut_app.do_gossip(known_nodes, timeout=0.5)
+            # Assert
+            mock_get.assert_called_once_with('http://localhost:8081/chain',
+                                             timeout=0.5)
+
+    def test_slow_node_is_left_behind(self):
+        # Arrange
+        known_nodes = [
+            "localhost:8081",
+            "localhost:8082",
+        ]
+        release = threading.Event()
+
+        def get(url, timeout):
+            if '8082' in url:
+                release.wait(5)
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {"chain": url}
+            return response
+
+        with mock.patch('requests.Session.get', side_effect=get):
+            # Act
+            start_time = time.perf_counter()
+            retrieved_value = sut_app.do_gossip(known_nodes, deadline=0.2)
+            elapsed_time = time.perf_counter() - start_time
+            release.set()
+            # Assert
+            assert retrieved_value == ["http://localhost:8081/chain"]
+            assert elapsed_time < 2
+
+    def test_late_chains_are_closed(self):
+        # Arrange
+        known_nodes = [
+            "localhost:8081",
+        ]
+        release = threading.Event()
+        late_chain = mock.Mock()
+        closed = threading.Event()
+        late_chain.close.side_effect = closed.set
+
+        def fetch(node, timeout):
+            release.wait(5)
+            return late_chain
+
+        # Act
+        retrieved_value = sut_app.do_gossip(known_nodes,
+                                            deadline=0.1,
+                                            fetch=fetch)
+        release.set()
+        # Assert
+        assert retrieved_value == []
+        assert closed.wait(5)
+
+    def test_nodes_are_asked_in_parallel(self):
+        # Arrange
+        known_nodes = [f"localhost:{8081 + node}" for node in range(8)]
+        barrier = threading.Barrier(4, timeout=5)
+        lock = threading.Lock()
+        asked_together = []
+        active = [0, 0]
+
+        def get(url, timeout):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            asked_together.append(barrier.wait() is not None)
+            with lock:
+                active[0] -= 1
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {"chain": url}
+            return response
+
+        with mock.patch('requests.Session.get', side_effect=get):
+            # Act
+            retrieved_value = sut_app.do_gossip(known_nodes, max_workers=4)
+            # Assert
+            # Eight requests, in two rounds of four at the same time
+            assert sorted(retrieved_value) == [f"http://{node}/chain"
+                                               for node in known_nodes]
+            assert asked_together == 8 * [True]
+            # Never more than four at the same time
+            assert active[1] == 4
+
+
+class TestFetchChainStreamFunction(object):
+    """
+    Test the streamed fetch of the chain of a node
+    """
+
+    def test_ndjson_response(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(3).get_chain()
+        lines = [line.rstrip(b'\n') for line in ndjson.dump_blocks(blocks)]
+        with mock.patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.headers = {
+                'Content-Type': 'application/x-ndjson',
+            }
+            mock_get.return_value.iter_lines.return_value = iter(lines)
+            # Act
+            retrieved_value = sut_app.fetch_chain_stream('localhost:8081')
+            # Assert
+            assert isinstance(retrieved_value, sut_app.ChainStream)
+            assert retrieved_value.expires_at is None
+            assert list(retrieved_value) == blocks
+            mock_get.assert_called_once_with(
+                'http://localhost:8081/chain',
+                params={'format': 'ndjson'},
+                stream=True,
+                timeout=sut_app.GOSSIP_TIMEOUT)
+
+    def test_json_response(self):
+        # Arrange
+        with mock.patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.headers = {
+                'Content-Type': 'application/json',
+            }
+            mock_get.return_value.json.return_value = {
+                "chain": "sample value"
+            }
+            # Act
+            retrieved_value = sut_app.fetch_chain_stream('localhost:8081')
+            # Assert
+            assert retrieved_value == "sample value"
+
+    def test_invalid_response(self):
+        # Arrange
+        with mock.patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 500
+            # Act
+            retrieved_value = sut_app.fetch_chain_stream('localhost:8081')
+            # Assert
+            assert retrieved_value is None
+            mock_get.return_value.close.assert_called_once()
+
+
+class TestChainStream(object):
+    """
+    Test the chain streamed from a node
+    """
+
+    def test_announced_height(self):
+        # Arrange
+        response = mock.Mock()
+        response.headers = {'X-Chain-Height': '23'}
+        # Act
+        retrieved_value = operator.length_hint(sut_app.ChainStream(response))
+        # Assert
+        assert retrieved_value == 23
+
+    def test_missing_height(self):
+        # Arrange
+        response = mock.Mock()
+        response.headers = {}
+        # Act
+        retrieved_value = operator.length_hint(sut_app.ChainStream(response),
+                                               -1)
+        # Assert
+        assert retrieved_value == -1
+
+    def test_stops_at_the_deadline(self, w_sample_blocks_f):
+        # Arrange
+        blocks = w_sample_blocks_f(3).get_chain()
+        lines = [line.rstrip(b'\n') for line in ndjson.dump_blocks(blocks)]
+        response = mock.MagicMock()
+        response.headers = {}
+        response.iter_lines.return_value = iter(lines)
+        expires_at = time.monotonic() + 60
+        sut = sut_app.ChainStream(response, expires_at)
+        # Act
+        with mock.patch.object(sut_app, 'monotonic',
+                               side_effect=[0, expires_at]):
+            retrieved_value = list(sut)
+        # Assert
+        assert retrieved_value == blocks[:1]
+        response.__exit__.assert_called_once()
+
+    def test_shorter_chain_is_not_read(self, client):
+        # Arrange
+        node_state.blockchain.add_transaction('Chancellor on brink')
+        node_state.blockchain.mine()
+        response = mock.MagicMock()
+        response.headers = {'X-Chain-Height': '2'}
+        # Act
+        retrieved_value = node_state.blockchain.evaluate_consensus(
+            [sut_app.ChainStream(response)])
+        # Assert
+        assert retrieved_value == False
+        response.iter_lines.assert_not_called()
+        response.close.assert_called_once()
+
+
+class TestSessionsEndpoint(object):
+    """
+    Test the peer sessions endpoint
+    """
+
+    def test_counters(self, client):
+        # Arrange
+        known_nodes = [
+            "localhost:8081",
+        ]
+        with mock.patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 500
+            sut_app.do_gossip(known_nodes)
+            sut_app.do_gossip(known_nodes)
+        # Act
+        response = client.get('/nodes/sessions')
+        # Assert
+        assert response.status_code == 200
+        assert response.json['hits'] >= 1
+        assert response.json['sessions'] >= 1
+
 
 class TestConsensusEndpoint(object):
     """
@@ -570,13 +1352,13 @@ class TestConsensusEndpoint(object):
         # Arrange
         schema = schema_def_evaluate_consensus
         with client:
-            sample_blockchain = g.blockchain.get_chain()
+            sample_blockchain = node_state.blockchain.get_chain()
             mocked_blockchain = mock.Mock()
             mocked_blockchain.evaluate_consensus.return_value = True
             mocked_blockchain.get_chain.return_value = sample_blockchain
-            g.blockchain = mocked_blockchain
-            g.known_nodes = []
-            with mock.patch('requests.get') as mock_get:
+            node_state.blockchain = mocked_blockchain
+            node_state.known_nodes = []
+            with mock.patch('requests.Session.get') as mock_get:
                 mock_get.return_value.status_code = 200
                 mock_get.return_value.json.return_value = sample_blockchain
                 # Act
@@ -589,13 +1371,13 @@ class TestConsensusEndpoint(object):
         # Arrange
         schema = schema_def_evaluate_consensus
         with client:
-            sample_blockchain = g.blockchain.get_chain()
+            sample_blockchain = node_state.blockchain.get_chain()
             mocked_blockchain = mock.Mock()
             mocked_blockchain.evaluate_consensus.return_value = False
             mocked_blockchain.get_chain.return_value = sample_blockchain
-            g.blockchain = mocked_blockchain
-            g.known_nodes = []
-            with mock.patch('requests.get') as mock_get:
+            node_state.blockchain = mocked_blockchain
+            node_state.known_nodes = []
+            with mock.patch('requests.Session.get') as mock_get:
                 mock_get.return_value.status_code = 200
                 mock_get.return_value.json.return_value = sample_blockchain
                 # Act
@@ -603,3 +1385,66 @@ class TestConsensusEndpoint(object):
                 # Assert
                 assert response.status_code == 200
                 validate(instance=response.json, schema=schema)
+
+
+class TestConcurrentClients(object):
+    """
+    Test the node serving many clients at the same time
+    """
+
+    def test_stress(self, node_server):
+        # Arrange
+        clients = 200
+        barrier = threading.Barrier(clients, timeout=30)
+        status_codes = []
+        heights = {}
+
+        def run_client(number):
+            with requests.Session() as session:
+                barrier.wait()
+                seen_heights = heights[number] = []
+                for transaction in range(2):
+                    response = session.post(
+                        f'{node_server}/transactions/new',
+                        json={'data': f'{number} {transaction}'})
+                    status_codes.append(response.status_code)
+                response = session.get(f'{node_server}/chain',
+                                       params={'validity': 'cached'})
+                status_codes.append(response.status_code)
+                seen_heights.append(len(response.json()['chain']))
+                if number % 4 == 0:
+                    # Half of them wait for the Block
+                    wait = 'true' if number % 8 == 0 else 'false'
+                    response = session.post(f'{node_server}/mine',
+                                            params={'wait': wait})
+                    status_codes.append(response.status_code)
+                response = session.get(f'{node_server}/chain/height')
+                status_codes.append(response.status_code)
+                seen_heights.append(response.json()['height'])
+
+        threads = [threading.Thread(target=run_client, args=(number, ))
+                   for number in range(clients)]
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        # Assert
+        assert len(heights) == clients
+        assert set(status_codes) <= {200, 201, 202}
+        # The jobs run in order
+        assert sut_app.get_miner().submit().wait(10) == True
+        # The chain only grows
+        assert all(seen_heights == sorted(seen_heights)
+                   for seen_heights in heights.values())
+        blockchain = node_state.blockchain
+        assert blockchain.is_valid() == True
+        # Every transaction is mined or pending, once
+        mined = [transaction['data']
+                 for block in blockchain.get_chain()[1:]
+                 for transaction in block['transactions']]
+        pending = [transaction['data']
+                   for transaction in blockchain.current_transactions]
+        assert sorted(mined + pending) == sorted(
+            f'{number} {transaction}'
+            for number in range(clients) for transaction in range(2))
@@ -0,0 +1,473 @@
+import asyncio
+import json
+import pytest
+import time
+
+from .. import asgi as SUT
+from ...mark_1 import ndjson
+from ...mark_1.tests.test_blockchain import (sample_transaction_f,
+                                             w_sample_blocks_f)
+from .test_app import node_server, node_state, slow_sealing
+from .test_blockchain import sample_sut
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def node_f(sample_sut):
+    nodes = []
+
+    def _make_node(blockchain=None, **kwargs):
+        node = SUT.Node(blockchain or sample_sut(), **kwargs)
+        nodes.append(node)
+        return node
+
+    yield _make_node
+    for node in nodes:
+        node.close()
+
+
+# Helpers
+
+async def request(node, method, path, query_string=b'', payload=None):
+    """
+    Call the ASGI application of a node
+
+    :return: Status code, dict of headers and body
+    """
+    body = json.dumps(payload).encode() if payload is not None else b''
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await node({
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string,
+    }, receive, send)
+    headers = {name.decode(): value.decode()
+               for name, value in messages[0]['headers']}
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return messages[0]['status'], headers, body
+
+
+def call(node, method, path, query_string=b'', payload=None):
+    status_code, headers, body = asyncio.run(
+        request(node, method, path, query_string, payload))
+    if headers['content-type'] == 'application/json':
+        body = json.loads(body)
+    return status_code, headers, body
+
+
+# Tests
+
+class TestRouting(object):
+    """
+    Test the routes of the node
+    """
+
+    def test_unknown_path(self, node_f):
+        # Act
+        status_code, _, body = call(node_f(), 'GET', '/unknown')
+        # Assert
+        assert status_code == 404
+        assert body == {'error': 'Not found'}
+
+    def test_method_not_allowed(self, node_f):
+        # Act
+        status_code, _, _ = call(node_f(), 'GET', '/mine')
+        # Assert
+        assert status_code == 405
+
+    def test_lifespan(self, node_f):
+        # Arrange
+        node = node_f()
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        # Act
+        asyncio.run(node({'type': 'lifespan'}, receive, send))
+        # Assert
+        assert sent == ['lifespan.startup.complete',
+                        'lifespan.shutdown.complete']
+
+
+class TestMineRoute(object):
+    """
+    Test the mine route
+    """
+
+    def test_wait_for_the_block(self, node_f, sample_transaction_f):
+        # Arrange
+        node = node_f()
+        node.blockchain.add_transaction(**sample_transaction_f())
+        # Act
+        status_code, _, body = call(node, 'POST', '/mine', b'wait=true')
+        # Assert
+        assert status_code == 201
+        assert body['new_block']['index'] == 2
+        assert body['is_valid'] == True
+
+    def test_returns_the_job(self, node_f):
+        # Arrange
+        node = node_f()
+        # Act
+        status_code, headers, body = call(node, 'POST', '/mine')
+        # Assert
+        assert status_code == 202
+        job_id = body['job']['id']
+        assert headers['location'] == f'/mine/jobs/{job_id}'
+        assert node.get_miner().get(job_id).wait(5) == True
+        status_code, _, body = call(node, 'GET', f'/mine/jobs/{job_id}')
+        assert status_code == 200
+        assert body['job']['status'] == 'done'
+        status_code, _, _ = call(node, 'DELETE', f'/mine/jobs/{job_id}')
+        assert status_code == 409
+
+    def test_wait_timeout(self,
+                          node_f,
+                          slow_sealing,
+                          sample_transaction_f,
+                          monkeypatch):
+        # Arrange
+        monkeypatch.setattr(SUT, 'MINE_WAIT_TIMEOUT', 0.5)
+        node = node_f(executor_workers=1)
+        node.blockchain.add_transaction(**sample_transaction_f())
+
+        async def mine_and_ask_height():
+            mining = asyncio.ensure_future(
+                request(node, 'POST', '/mine', b'wait=true'))
+            await asyncio.sleep(0.1)
+            # The only thread of the executor isn't waiting for the job
+            height = await asyncio.wait_for(
+                request(node, 'GET', '/chain/height'), 0.3)
+            return await mining, height
+
+        # Act
+        (status_code, _, body), (height_status_code, _, _) = asyncio.run(
+            mine_and_ask_height())
+        # Assert
+        assert height_status_code == 200
+        assert status_code == 202
+        job = json.loads(body)['job']
+        assert job['status'] in ('queued', 'mining')
+        node.get_miner().cancel(job['id'])
+
+    def test_mining_interval(self, node_f, sample_transaction_f):
+        # Arrange
+        node = node_f(mining_interval=0.01)
+        # Act
+        node.blockchain.add_transaction(**sample_transaction_f())
+        # Assert
+        for _ in range(500):
+            if len(node.blockchain.get_chain()) == 2:
+                break
+            time.sleep(0.01)
+        assert len(node.blockchain.get_chain()) == 2
+        assert node.miner.continuous == True
+
+    def test_unknown_job(self, node_f):
+        # Act
+        status_code, _, _ = call(node_f(), 'GET', '/mine/jobs/unknown')
+        # Assert
+        assert status_code == 404
+
+
+class TestTransactionRoute(object):
+    """
+    Test the transaction route
+    """
+
+    def test_sample_transaction(self, node_f, sample_transaction_f):
+        # Arrange
+        node = node_f()
+        payload = sample_transaction_f()
+        # Act
+        status_code, _, body = call(node, 'POST', '/transactions/new',
+                                    payload=payload)
+        # Assert
+        assert status_code == 201
+        assert body == {'transaction': payload}
+        assert list(node.blockchain.current_transactions) == [payload]
+
+    @pytest.mark.parametrize('payload', [{}, [], None])
+    def test_missing_values(self, node_f, payload):
+        # Act
+        status_code, _, body = call(node_f(), 'POST', '/transactions/new',
+                                    payload=payload)
+        # Assert
+        assert status_code == 400
+        assert body == {'error': 'Missing values'}
+
+    def test_on_full_mempool(self, node_f, sample_transaction_f):
+        # Arrange
+        node = node_f()
+        node.blockchain.current_transactions.max_count = 0
+        # Act
+        status_code, _, body = call(node, 'POST', '/transactions/new',
+                                    payload=sample_transaction_f())
+        # Assert
+        assert status_code == 503
+        assert body == {'error': 'Mempool full'}
+
+
+class TestChainRoute(object):
+    """
+    Test the chain route
+    """
+
+    def test_whole_chain(self, node_f, w_sample_blocks_f):
+        # Arrange
+        blockchain = w_sample_blocks_f(5)
+        node = node_f(blockchain)
+        # Act
+        status_code, _, body = call(node, 'GET', '/chain')
+        # Assert
+        assert status_code == 200
+        assert body['chain'] == json.loads(
+            SUT.encode_json(blockchain.get_chain()))
+        assert body['is_valid'] == True
+
+    def test_range_with_limit(self, node_f, w_sample_blocks_f):
+        # Arrange
+        node = node_f(w_sample_blocks_f(5))
+        # Act
+        status_code, _, body = call(node, 'GET', '/chain',
+                                    b'from=2&limit=2&validity=cached')
+        # Assert
+        assert status_code == 200
+        assert [block['index'] for block in body['chain']] == [2, 3]
+        assert body['next'] == 4
+        assert 'validated_height' in body
+
+    def test_ndjson(self, node_f, w_sample_blocks_f, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(SUT, 'STREAM_BATCH_SIZE', 2)
+        blockchain = w_sample_blocks_f(5)
+        node = node_f(blockchain)
+        # Act
+        status_code, headers, body = call(node, 'GET', '/chain',
+                                          b'format=ndjson')
+        # Assert
+        assert status_code == 200
+        assert headers['content-type'] == ndjson.MIMETYPE
+        assert headers['x-chain-height'] == '6'
+        assert list(ndjson.load_blocks(body.splitlines())) == (
+            blockchain.get_chain())
+
+    def test_height(self, node_f, w_sample_blocks_f):
+        # Arrange
+        blockchain = w_sample_blocks_f(2)
+        # Act
+        status_code, _, body = call(node_f(blockchain), 'GET',
+                                    '/chain/height')
+        # Assert
+        assert status_code == 200
+        assert body == {
+            'height': 3,
+            'last_hash': blockchain.get_block_hash(3),
+        }
+
+
+class TestRegisterNodesRoute(object):
+    """
+    Test the register nodes route
+    """
+
+    def test_nodes(self, node_f):
+        # Arrange
+        node = node_f()
+        payload = {'nodes': ['http://127.0.0.1:5000', '127.0.0.1:5001', '']}
+        # Act
+        status_code, _, body = call(node, 'POST', '/nodes/register',
+                                    payload=payload)
+        # Assert
+        assert status_code == 201
+        assert sorted(body['total_nodes']) == ['127.0.0.1:5000',
+                                               '127.0.0.1:5001']
+        assert body['invalid_nodes'] == ['']
+
+    def test_missing_nodes(self, node_f):
+        # Act
+        status_code, _, _ = call(node_f(), 'POST', '/nodes/register',
+                                 payload={})
+        # Assert
+        assert status_code == 400
+
+
+class TestDoGossipFunction(object):
+    """
+    Test the gossip on non-blocking connections
+    """
+
+    def test_nodes_are_asked_at_the_same_time(self):
+        # Arrange
+        known_nodes = [f'node-{number}:80' for number in range(2000)]
+
+        async def fetch(node, run=None):
+            await asyncio.sleep(0.2)
+            return [node]
+
+        # Act
+        start = time.monotonic()
+        retrieved_value = asyncio.run(SUT.do_gossip(
+            known_nodes, max_connections=len(known_nodes), fetch=fetch))
+        elapsed = time.monotonic() - start
+        # Assert
+        assert len(retrieved_value) == len(known_nodes)
+        assert elapsed < 5
+
+    def test_slow_and_failing_nodes(self):
+        # Arrange
+        async def fetch(node, run=None):
+            if node == 'slow':
+                await asyncio.sleep(5)
+            if node == 'failing':
+                raise ConnectionError('Refused')
+            return [node]
+
+        # Act
+        retrieved_value = asyncio.run(SUT.do_gossip(
+            ['slow', 'failing', 'fast'], timeout=0.2, fetch=fetch))
+        # Assert
+        assert retrieved_value == [['fast']]
+
+    def test_deadline(self):
+        # Arrange
+        async def fetch(node, run=None):
+            await asyncio.sleep(0.5 if node == 'late' else 0)
+            return [node]
+
+        # Act
+        retrieved_value = asyncio.run(SUT.do_gossip(
+            ['late', 'fast'], deadline=0.2, fetch=fetch))
+        # Assert
+        assert retrieved_value == [['fast']]
+
+
+class TestReadBodyFunction(object):
+    """
+    Test the reading of the body of a response
+    """
+
+    @staticmethod
+    def read(data, headers, max_size):
+        async def read_body():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await SUT.read_body(reader, headers, max_size)
+
+        return asyncio.run(read_body())
+
+    @pytest.mark.parametrize('data, headers', [
+        (b'0123456789', {'content-length': '10'}),
+        (b'6\r\n012345\r\n4\r\n6789\r\n0\r\n\r\n',
+         {'transfer-encoding': 'chunked'}),
+        (b'0123456789', {}),
+    ])
+    def test_body(self, data, headers):
+        # Act
+        retrieved_value = self.read(data, headers, 10)
+        # Assert
+        assert retrieved_value == b'0123456789'
+
+    @pytest.mark.parametrize('data, headers', [
+        (b'0123456789', {'content-length': '10'}),
+        (b'6\r\n012345\r\n4\r\n6789\r\n0\r\n\r\n',
+         {'transfer-encoding': 'chunked'}),
+        (b'0123456789', {}),
+    ])
+    def test_body_too_large(self, data, headers):
+        # Act
+        # Assert
+        with pytest.raises(ValueError):
+            self.read(data, headers, 9)
+
+
+class TestWithFlaskNode(object):
+    """
+    Test the peer connections with a Flask node
+    """
+
+    def test_fetch_chain(self, node_server, w_sample_blocks_f):
+        # Arrange
+        node_state.blockchain = w_sample_blocks_f(3)
+        peer = node_server[len('http://'):]
+        # Act
+        retrieved_value = asyncio.run(SUT.fetch_chain(peer))
+        # Assert
+        assert retrieved_value == node_state.blockchain.get_chain()
+
+    def test_fetch_lower_chain(self, node_server, w_sample_blocks_f):
+        # Arrange
+        node_state.blockchain = w_sample_blocks_f(3)
+        peer = node_server[len('http://'):]
+        # Act
+        retrieved_value = asyncio.run(SUT.fetch_chain(peer, min_height=4))
+        # Assert
+        assert retrieved_value is None
+
+    def test_consensus(self, node_f, node_server, w_sample_blocks_f):
+        # Arrange
+        node_state.blockchain = w_sample_blocks_f(3)
+        node = node_f()
+        node.register_known_node(node_server)
+        # Act
+        status_code, _, body = call(node, 'POST', '/nodes/consensus')
+        # Assert
+        assert status_code == 200
+        assert body['status'] == 'Chain replaced'
+        assert node.blockchain.get_chain() == node_state.blockchain.get_chain()
+
+
+class TestConcurrentClients(object):
+    """
+    Test the node serving many clients at the same time
+    """
+
+    def test_stress(self, node_f):
+        # Arrange
+        node = node_f()
+        clients = 1000
+
+        async def run_client(number):
+            responses = [await request(node, 'POST', '/transactions/new',
+                                       payload={'data': f'{number}'})]
+            responses.append(await request(node, 'GET', '/chain/height'))
+            if number % 100 == 0:
+                responses.append(await request(node, 'POST', '/mine'))
+            return [status_code for status_code, _, _ in responses]
+
+        async def run_clients():
+            return await asyncio.gather(*(run_client(number)
+                                          for number in range(clients)))
+
+        # Act
+        status_codes = asyncio.run(run_clients())
+        # Assert
+        assert {status_code
+                for client_status_codes in status_codes
+                for status_code in client_status_codes} <= {200, 201, 202}
+        assert node.get_miner().submit().wait(10) == True
+        blockchain = node.blockchain
+        assert blockchain.is_valid() == True
+        mined = [transaction['data']
+                 for block in blockchain.get_chain()[1:]
+                 for transaction in block['transactions']]
+        pending = [transaction['data']
+                   for transaction in blockchain.current_transactions]
+        assert sorted(mined + pending) == sorted(
+            f'{number}' for number in range(clients))
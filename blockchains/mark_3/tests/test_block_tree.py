@@ -0,0 +1,141 @@
+import pytest
+
+from .. import block_tree as SUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def main_chain_f():
+
+    def _make_main_chain(number, prune_depth=100):
+        tree = SUT.BlockTree(prune_depth)
+        for height in range(1, number + 1):
+            tree.append(f'main {height}')
+        return tree
+
+    return _make_main_chain
+
+
+def add_branch(tree, parent, name, number):
+    node = parent
+    for height in range(1, number + 1):
+        node = tree.add(f'{name} {height}', node, {'name': name})
+    return node
+
+
+# Tests
+
+class TestGetWorkFunction(object):
+    """
+    Test the work of a Block
+    """
+
+    @pytest.mark.parametrize('difficulty, work', [(0, 1), (1, 2), (8, 256)])
+    def test_on_difficulty(self, difficulty, work):
+        # Act
+        retrieved_value = SUT.get_work(difficulty)
+        # Assert
+        assert retrieved_value == work
+
+
+class TestBlockTree(object):
+    """
+    Test the index of the blocks and their forks
+    """
+
+    def test_on_main_chain(self, main_chain_f):
+        # Act
+        tree = main_chain_f(5)
+        # Assert
+        assert len(tree) == 5
+        assert tree.tip.hash == 'main 5'
+        assert tree.tip.height == 5
+        assert tree.tip.work == 5
+        assert tree.tip.parent is tree.get('main 4')
+        assert tree.get_main_node(1).parent is None
+        assert tree.get_main_node(6) is None
+
+    def test_cumulative_work(self):
+        # Arrange
+        tree = SUT.BlockTree()
+        # Act
+        tree.append('genesis', 1)
+        tree.append('heavy', 16)
+        # Assert
+        assert tree.tip.work == 17
+
+    def test_side_branch(self, main_chain_f):
+        # Arrange
+        tree = main_chain_f(5)
+        # Act
+        node = add_branch(tree, tree.get_main_node(3), 'side', 4)
+        # Assert
+        assert node.height == 7
+        assert node.block == {'name': 'side'}
+        assert tree.tip.hash == 'main 5'
+        assert tree.is_main(node) == False
+        assert tree.side_branches_size == 4
+
+    def test_known_block_is_not_added_again(self, main_chain_f):
+        # Arrange
+        tree = main_chain_f(5)
+        # Act
+        node = tree.add('main 4', tree.get_main_node(3), {})
+        # Assert
+        assert node is tree.get_main_node(4)
+        assert len(tree) == 5
+        assert tree.side_branches_size == 0
+
+    def test_find_fork(self, main_chain_f):
+        # Arrange
+        tree = main_chain_f(5)
+        node = add_branch(tree, tree.get_main_node(2), 'side', 6)
+        # Act
+        retrieved_value = tree.find_fork(tree.tip, node)
+        # Assert
+        assert retrieved_value is tree.get_main_node(2)
+
+    def test_find_fork_of_different_genesis(self, main_chain_f):
+        # Arrange
+        tree = main_chain_f(5)
+        node = add_branch(tree, None, 'other', 3)
+        # Act
+        retrieved_value = tree.find_fork(tree.tip, node)
+        # Assert
+        assert retrieved_value is None
+
+    def test_switch_to_a_side_branch(self, main_chain_f):
+        # Arrange
+        tree = main_chain_f(5)
+        old_tip = tree.tip
+        node = add_branch(tree, tree.get_main_node(3), 'side', 4)
+        # Act
+        height, dropped, adopted = tree.switch_to(node)
+        # Assert
+        assert height == 3
+        assert [node.hash for node in dropped] == ['main 4', 'main 5']
+        assert [node.hash for node in adopted] == [f'side {height}'
+                                                   for height in range(1, 5)]
+        assert tree.tip is node
+        assert tree.is_main(old_tip) == False
+        assert tree.side_branches_size == 2
+        # And back
+        height, dropped, adopted = tree.switch_to(old_tip)
+        assert height == 3
+        assert len(dropped) == 4
+        assert tree.tip is old_tip
+
+    def test_prune_deep_side_branches(self, main_chain_f):
+        # Arrange
+        tree = main_chain_f(10, prune_depth=5)
+        add_branch(tree, tree.get_main_node(2), 'deep', 6)
+        add_branch(tree, tree.get_main_node(7), 'recent', 2)
+        # Act
+        retrieved_value = tree.prune()
+        # Assert
+        assert retrieved_value == 6
+        assert 'deep 6' not in tree
+        assert 'recent 2' in tree
+        assert len(tree) == 12
+        assert tree.side_branches_size == 2
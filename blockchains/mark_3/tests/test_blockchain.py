@@ -1,7 +1,16 @@
+import copy
 import pytest
 import random
+import threading
 
+from unittest import mock
+
+from ..block_tree import BlockTree
 from ..blockchain import Blockchain as BlockchainSUT
+from ...mark_1 import validation
+from ...mark_1.chain_index import ChainIndex
+from ...mark_1.mempool import Mempool, REJECT_NEWEST
+from ...mark_1.storage import BlockStore, StaleSnapshotError
 from ...mark_1.tests import test_blockchain as TestMark1
 from ...mark_1.tests.test_blockchain import (sample_transaction_f,
                                              w_sample_blocks_f)
@@ -16,10 +25,41 @@ def sample_sut():
     return _make_sample_sut
 
 
+@pytest.fixture(scope="function")
+def forked_chains_f(w_sample_blocks_f):
+
+    def _make_forked_chains(shared, ours, theirs):
+        """
+        Two blockchains sharing the first blocks, then mining their own
+        """
+        sut = w_sample_blocks_f(shared)
+        peer = copy.deepcopy(sut)
+        for blockchain, number in ((sut, ours), (peer, theirs)):
+            for block in range(number):
+                blockchain.add_transaction(f'Block {block} of {number}')
+                blockchain.mine()
+        return sut, peer
+
+    return _make_forked_chains
+
+
 class TestIsValidMethod(TestMark1.TestIsValidMethod):
     pass
 
 
+class TestIsValidWatermark(TestMark1.TestIsValidWatermark):
+
+    def test_on_adopted_block_manipulated(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(2, 1, 3)
+        sut.evaluate_consensus([peer.get_chain()])
+        # Act
+        sut.get_chain()[-2]['transactions'][0]['data'] = 'Tampered'
+        retrieved_value = sut.is_valid()
+        # Assert
+        assert retrieved_value == False
+
+
 class TestEvaluateConsensus(object):
     """
     Test the consensus algorithm
@@ -58,3 +98,697 @@ class TestEvaluateConsensus(object):
         retrieved_value = sut.evaluate_consensus([shorter_chain.get_chain()])
         # Assert
         assert retrieved_value == False
+
+    def test_on_streamed_chain(self, sample_sut, w_sample_blocks_f):
+        # Arrange
+        sut = sample_sut()
+        longer_chain = w_sample_blocks_f(3).get_chain()
+        streamed_chain = (block.to_dict() for block in longer_chain)
+        # Act
+        retrieved_value = sut.evaluate_consensus([streamed_chain])
+        # Assert
+        assert retrieved_value == True
+        assert sut.get_chain() == longer_chain
+
+    def test_replaced_chain_is_validated(self,
+                                         sample_sut,
+                                         w_sample_blocks_f):
+        # Arrange
+        sut = sample_sut()
+        sut.is_valid()
+        longer_chain = w_sample_blocks_f(3)
+        # Act
+        sut.evaluate_consensus([longer_chain.get_chain()])
+        # Assert
+        assert sut._validated_height == len(longer_chain.get_chain())
+        assert sut.is_valid() == True
+
+
+class TestStreamingConsensus(object):
+    """
+    Test the validation of the candidate chains while they are read
+    """
+
+    @staticmethod
+    def stream(blocks, read_blocks):
+        for block in blocks:
+            read_blocks.append(block)
+            yield block.to_dict()
+
+    def test_shared_prefix_is_not_validated(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(20, 1, 3)
+        sut.is_valid()
+        with mock.patch.object(validation, 'get_hash_of',
+                               wraps=validation.get_hash_of) as mock_hash:
+            # Act
+            retrieved_value = sut.evaluate_consensus([peer.get_chain()])
+            # Assert
+            assert retrieved_value == True
+            # The blocks after the fork point only
+            assert mock_hash.call_count == 3
+        assert sut.get_chain() == peer.get_chain()
+        assert sut.is_valid() == True
+
+    def test_stops_reading_at_a_bad_link(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 10)
+        blocks = copy.deepcopy(peer.get_chain())
+        blocks[6]['previous_hash'] = 64 * '0'
+        read_blocks = []
+        expected_chain = list(sut.get_chain())
+        # Act
+        retrieved_value = sut.evaluate_consensus(
+            [self.stream(blocks, read_blocks)])
+        # Assert
+        assert retrieved_value == False
+        assert len(read_blocks) == 7
+        assert sut.get_chain() == expected_chain
+
+    def test_skips_a_chain_announced_shorter(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 2, 1)
+        chain = mock.MagicMock()
+        chain.__len__.return_value = len(peer.get_chain())
+        # Act
+        retrieved_value = sut.evaluate_consensus([chain])
+        # Assert
+        assert retrieved_value == False
+        chain.__iter__.assert_not_called()
+        chain.close.assert_called_once()
+
+    def test_on_corrupted_own_chain(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 1)
+        sut._chain[1]['timestamp'] = 0.0
+        # Act
+        retrieved_value = sut.evaluate_consensus([peer.get_chain()])
+        # Assert
+        assert retrieved_value == True
+        assert sut.get_chain() == peer.get_chain()
+        assert sut.is_valid() == True
+
+    def test_longest_of_many(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 2)
+        longer_peer = copy.deepcopy(peer)
+        longer_peer.add_transaction('One more block')
+        longer_peer.mine()
+        # Act
+        retrieved_value = sut.evaluate_consensus([peer.get_chain(),
+                                                  longer_peer.get_chain(),
+                                                  peer.get_chain()])
+        # Assert
+        assert retrieved_value == True
+        assert sut.get_chain() == longer_peer.get_chain()
+
+
+class TestParallelConsensus(object):
+    """
+    Test the validation of the candidate chains across processes
+    """
+
+    @pytest.mark.parametrize('tampered_block', [None, 5, 150, -1])
+    def test_same_result_as_sequential(self, forked_chains_f, tampered_block):
+        # Arrange
+        sut, peer = forked_chains_f(3, 1, 300)
+        shorter_peer = copy.deepcopy(peer)
+        shorter_peer._chain.pop()
+        chains = [shorter_peer.get_chain(), copy.deepcopy(peer.get_chain())]
+        if tampered_block is not None:
+            chains[1][tampered_block]['previous_hash'] = 64 * '0'
+        sequential_sut = copy.deepcopy(sut)
+        sut.validation_processes = 2
+        # Act
+        retrieved_value = sut.evaluate_consensus(copy.deepcopy(chains))
+        # Assert
+        assert retrieved_value == sequential_sut.evaluate_consensus(chains)
+        assert retrieved_value == True
+        assert sut.get_chain() == sequential_sut.get_chain()
+        expected_chain = (peer if tampered_block is None else shorter_peer)
+        assert sut.get_chain() == expected_chain.get_chain()
+        assert sut.is_valid() == True
+
+    def test_on_invalid_chains(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 1, 300)
+        chain = copy.deepcopy(peer.get_chain())
+        chain[200]['previous_hash'] = 64 * '0'
+        expected_chain = list(sut.get_chain())
+        sut.validation_processes = 3
+        # Act
+        retrieved_value = sut.evaluate_consensus([chain])
+        # Assert
+        assert retrieved_value == False
+        assert sut.get_chain() == expected_chain
+
+    def test_splits_a_long_chain(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 300)
+        sut.is_valid()
+        sut.validation_processes = 2
+        with mock.patch.object(validation, 'find_invalid_links',
+                               wraps=validation.find_invalid_links) as mock_find:
+            # Act
+            retrieved_value = sut.evaluate_consensus([peer.get_chain()])
+            # Assert
+            assert retrieved_value == True
+            # Linked to the last shared Block
+            linked_chains = mock_find.call_args[0][0]
+            assert len(linked_chains) == 1
+            assert len(linked_chains[0]) == 301
+        assert sut.get_chain() == peer.get_chain()
+
+
+class TestForkChoice(object):
+    """
+    Test the choice of the tip with the most work in the block tree
+    """
+
+    def test_reorganization_keeps_the_shared_blocks(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(20, 2, 3)
+        chain = sut._blocks
+        shared_blocks = chain[:20]
+        # Act
+        retrieved_value = sut.evaluate_consensus([peer.get_chain()])
+        # Assert
+        assert retrieved_value == True
+        assert sut._blocks is chain
+        assert all(block is shared_block
+                   for block, shared_block in zip(chain, shared_blocks))
+        assert sut.get_chain() == peer.get_chain()
+
+    def test_branch_without_its_fork_point(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 2, 3)
+        blocks = peer.get_chain()[5:]
+        # Act
+        retrieved_value = sut._add_branch(len(sut.get_chain()) + 1, blocks)
+        # Assert
+        assert retrieved_value is None
+        assert all(sut._tree.get(peer.get_hash_of(block)) is None
+                   for block in blocks)
+
+    def test_dropped_blocks_stay_in_a_side_branch(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(5, 2, 3)
+        dropped_hashes = [sut.get_hash_of(block)
+                          for block in sut.get_chain()[-2:]]
+        # Act
+        sut.evaluate_consensus([peer.get_chain()])
+        # Assert
+        for block_hash in dropped_hashes:
+            node = sut._tree.get(block_hash)
+            assert node is not None
+            assert sut._tree.is_main(node) == False
+        assert sut._tree.tip.hash == peer.get_hash_of(peer.last_block)
+
+    def test_switch_back_to_a_side_branch(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(5, 2, 3)
+        old_branch = copy.deepcopy(sut)
+        for block in range(2):
+            old_branch.add_transaction(f'Block {block}')
+            old_branch.mine()
+        sut.evaluate_consensus([peer.get_chain()])
+        # Act
+        retrieved_value = sut.evaluate_consensus([old_branch.get_chain()])
+        # Assert
+        assert retrieved_value == True
+        assert sut.get_chain() == old_branch.get_chain()
+        assert sut._tree.tip.height == len(old_branch.get_chain())
+        assert sut.is_valid() == True
+
+    def test_cumulative_work(self, sample_sut):
+        # Arrange
+        sut = sample_sut(difficulty=4)
+        peer = copy.deepcopy(sut)
+        for block in range(2):
+            peer.add_transaction(f'Block {block}')
+            peer.mine()
+        # Act
+        retrieved_value = sut.evaluate_consensus([peer.get_chain()])
+        # Assert
+        assert retrieved_value == True
+        assert sut._tree.tip.work == 3 * 16
+
+    def test_prunes_deep_side_branches(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 1, 2)
+        sut.prune_depth = 2
+        sut.evaluate_consensus([peer.get_chain()])
+        assert sut._tree.side_branches_size == 1
+        # Act
+        for block in range(2):
+            sut.add_transaction(f'Block {block}')
+            sut.mine()
+        # Assert
+        assert sut._tree.side_branches_size == 0
+        assert len(sut._tree) == len(sut.get_chain())
+
+    def test_index_follows_the_mined_blocks(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 1)
+        sut.evaluate_consensus([peer.get_chain()])
+        # Act
+        sut.add_transaction('Mined on the new tip')
+        block = sut.mine()
+        # Assert
+        assert sut._tree.tip.hash == sut.get_hash_of(block)
+        assert sut._tree.tip.height == len(sut.get_chain())
+
+    def test_lookup_index_follows_the_reorganization(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 2, 3)
+        dropped_block = sut.last_block
+        dropped_transaction_hash = validation.get_transaction_hash(
+            dropped_block['transactions'][0])
+        sut.get_block_index(sut.get_hash_of(dropped_block))
+        # Act
+        sut.evaluate_consensus([peer.get_chain()])
+        # Assert
+        assert sut.get_block_index(sut.get_hash_of(dropped_block)) == None
+        assert sut.get_transaction_location(dropped_transaction_hash) == None
+        last_block = peer.last_block
+        assert (sut.get_block_index(peer.get_hash_of(last_block)) ==
+                len(peer.get_chain()))
+        assert sut.get_transaction_location(
+            validation.get_transaction_hash(
+                last_block['transactions'][0])) == (len(peer.get_chain()), 0)
+        assert len(sut._index) == len(peer.get_chain())
+
+    def test_index_leaves_out_a_broken_chain(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 0)
+        sut._chain[1]['timestamp'] = 0.0
+        # Act
+        retrieved_value = sut._tree
+        # Assert
+        assert retrieved_value.tip.height == 2
+        assert len(retrieved_value) == 2
+
+
+class TestGetHeadersMethod(object):
+    """
+    Test the headers of a range of blocks
+    """
+
+    def test_on_range(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(5)
+        # Act
+        retrieved_value = sut.get_headers(2, 4)
+        # Assert
+        assert [header['index'] for header in retrieved_value] == [2, 3, 4]
+        assert all(header['hash'] == sut.get_block_hash(header['index'])
+                   for header in retrieved_value)
+        assert retrieved_value[0]['previous_hash'] == sut.get_block_hash(1)
+
+    def test_on_open_range(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(5)
+        # Act
+        retrieved_value = sut.get_headers(5, 100)
+        # Assert
+        assert [header['index'] for header in retrieved_value] == [5, 6]
+
+
+class TestFindForkPointMethod(object):
+    """
+    Test the search of the last Block shared with a peer
+    """
+
+    def test_on_forked_chains(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 2, 3)
+        headers = peer.get_headers(1)
+        # Act
+        retrieved_value = sut.find_fork_point(headers)
+        # Assert
+        assert retrieved_value == 5
+
+    def test_on_fork_before_the_headers(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 3, 3)
+        headers = peer.get_headers(7)
+        # Act
+        retrieved_value = sut.find_fork_point(headers)
+        # Assert
+        assert retrieved_value is None
+
+    def test_on_different_genesis(self, sample_sut, w_sample_blocks_f):
+        # Arrange
+        sut = sample_sut()
+        peer = w_sample_blocks_f(3)
+        # Act
+        retrieved_value = sut.find_fork_point(peer.get_headers(1))
+        # Assert
+        assert retrieved_value == 0
+
+
+class TestAdoptBlocksMethod(object):
+    """
+    Test the adoption of the blocks of a peer after the fork point
+    """
+
+    def test_on_longer_fork(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 2, 3)
+        sut.is_valid()
+        blocks = peer.get_chain()[5:]
+        with mock.patch.object(validation, 'get_hash_of',
+                               wraps=validation.get_hash_of) as mock_hash:
+            # Act
+            retrieved_value = sut.adopt_blocks(5, blocks)
+            # Assert
+            assert retrieved_value == True
+            # The new blocks only
+            assert mock_hash.call_count == len(blocks)
+        assert sut.get_chain() == peer.get_chain()
+        assert sut._validated_height == len(peer.get_chain())
+        assert sut.is_valid() == True
+
+    def test_on_shorter_fork(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 3, 2)
+        expected_chain = list(sut.get_chain())
+        # Act
+        retrieved_value = sut.adopt_blocks(5, peer.get_chain()[5:])
+        # Assert
+        assert retrieved_value == False
+        assert sut.get_chain() == expected_chain
+
+    def test_on_fork_point_missing_from_the_tree(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 2, 3)
+        expected_chain = list(sut.get_chain())
+        # Act
+        with mock.patch.object(BlockTree, 'get_main_node',
+                               return_value=None):
+            retrieved_value = sut.adopt_blocks(5, peer.get_chain()[5:])
+        # Assert
+        assert retrieved_value == False
+        assert sut.get_chain() == expected_chain
+        assert sut._tree.get(peer.get_hash_of(peer.last_block)) is None
+
+    def test_on_broken_link(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(4, 1, 3)
+        blocks = copy.deepcopy(peer.get_chain()[5:])
+        blocks[1]['previous_hash'] = 64 * '0'
+        # Act
+        retrieved_value = sut.adopt_blocks(5, blocks)
+        # Assert
+        assert retrieved_value == False
+
+    def test_on_different_genesis(self, sample_sut, w_sample_blocks_f):
+        # Arrange
+        sut = sample_sut()
+        peer = w_sample_blocks_f(3)
+        # Act
+        retrieved_value = sut.adopt_blocks(0, peer.get_chain())
+        # Assert
+        assert retrieved_value == True
+        assert sut.get_chain() == peer.get_chain()
+
+    def test_on_stored_chain(self, forked_chains_f, tmp_path):
+        # Arrange
+        sut, peer = forked_chains_f(4, 2, 3)
+        with BlockStore(str(tmp_path)) as store:
+            stored_sut = BlockchainSUT(store=store)
+            stored_sut._chain = sut.get_chain()
+            # Act
+            retrieved_value = stored_sut.adopt_blocks(5,
+                                                      peer.get_chain()[5:])
+            # Assert
+            assert retrieved_value == True
+            assert list(store) == peer.get_chain()
+
+
+class TestChainSnapshots(object):
+    """
+    Test the snapshots of the chain read by the node
+    """
+
+    def test_chain_range(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(4)
+        # Act
+        retrieved_value = sut.get_chain_range(2, 3)
+        # Assert
+        assert retrieved_value == (5, 5, sut.get_chain()[1:3])
+
+    def test_chain_range_with_cached_validity(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(4)
+        sut.is_valid()
+        sut.add_transaction('Not validated yet')
+        sut._new_block()
+        # Act
+        height, validated_height, _ = sut.get_chain_range(validate=False)
+        # Assert
+        assert (height, validated_height) == (6, 5)
+
+    def test_chain_range_of_a_stored_chain(self, w_sample_blocks_f, tmp_path):
+        # Arrange
+        with BlockStore(str(tmp_path)) as store:
+            sut = BlockchainSUT(store=store)
+            sut._chain = w_sample_blocks_f(3).get_chain()
+            # Act
+            retrieved_value = sut.get_chain_range(3)
+            # Assert
+            assert retrieved_value == (4, 4, list(store.iter_raw(2)))
+
+    def test_stream_of_a_replaced_stored_chain(self,
+                                               forked_chains_f,
+                                               tmp_path):
+        # Arrange
+        sut, peer = forked_chains_f(2, 3, 4)
+        with BlockStore(str(tmp_path)) as store:
+            stored_sut = BlockchainSUT(store=store)
+            stored_sut._chain = sut.get_chain()
+            height, lines = stored_sut.stream_chain()
+            next(lines)
+            next(lines)
+            # Act
+            stored_sut.evaluate_consensus([peer.get_chain()])
+            # Assert
+            assert height == 6
+            with pytest.raises(StaleSnapshotError):
+                next(lines)
+
+    def test_pop_block(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(1)
+        last_block = sut.last_block
+        # Act
+        retrieved_value = sut.pop_block()
+        # Assert
+        assert retrieved_value == last_block
+        assert len(sut.get_chain()) == 1
+        assert sut.pop_block() is None
+
+
+class TestConcurrency(object):
+    """
+    Test the Blockchain shared by many threads
+    """
+
+    def test_proof_of_work_does_not_block(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        sut.add_transaction('Mined')
+        sealing = threading.Event()
+        sealed = threading.Event()
+
+        def seal_block(self, block, stop_event):
+            sealing.set()
+            return sealed.wait(5)
+
+        with mock.patch.object(BlockchainSUT, '_seal_block',
+                               autospec=True, side_effect=seal_block):
+            miner = threading.Thread(target=sut.mine)
+            miner.start()
+            sealing.wait(5)
+            # Act
+            chain = sut.get_chain()
+            transaction = sut.add_transaction('Pending')
+            sealed.set()
+            miner.join(5)
+        # Assert
+        assert len(chain) == 1
+        assert transaction == {'data': 'Pending'}
+        assert len(sut.get_chain()) == 2
+        assert list(sut.current_transactions) == [{'data': 'Pending'}]
+
+    def test_pop_block_waits_for_the_reorganization(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 1, 2)
+        popped = []
+        waiting = []
+
+        def peer_chain():
+            popper = threading.Thread(
+                target=lambda: popped.append(sut.pop_block()))
+            popper.start()
+            popper.join(0.2)
+            waiting.append(popper)
+            yield from peer.get_chain()
+
+        # Act
+        retrieved_value = sut.evaluate_consensus([peer_chain()])
+        waiting[0].join(5)
+        # Assert
+        assert retrieved_value == True
+        assert popped == [peer.last_block]
+        assert sut.get_chain() == peer.get_chain()[:-1]
+
+    def test_transaction_found_and_read_together(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(3)
+        last_block = sut.last_block
+        transaction = last_block['transactions'][0]
+        popped = []
+        waiting = []
+
+        def get_transaction_location(self, transaction_hash):
+            popper = threading.Thread(
+                target=lambda: popped.append(sut.pop_block()))
+            popper.start()
+            popper.join(0.2)
+            waiting.append(popper)
+            return get_location(self, transaction_hash)
+
+        get_location = ChainIndex.get_transaction_location
+        with mock.patch.object(ChainIndex, 'get_transaction_location',
+                               autospec=True,
+                               side_effect=get_transaction_location):
+            # Act
+            retrieved_value = sut.get_transaction(
+                validation.get_transaction_hash(transaction))
+        waiting[0].join(5)
+        # Assert
+        assert retrieved_value == (transaction, 4, 0)
+        assert popped == [last_block]
+
+    def test_block_of_a_moved_chain_is_dropped(self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 2)
+        sut.add_transaction('Mined too late')
+
+        def seal_block(self, block, stop_event):
+            # The chain moves while mining
+            sut.evaluate_consensus([peer.get_chain()])
+            return not stop_event.is_set()
+
+        with mock.patch.object(BlockchainSUT, '_seal_block',
+                               autospec=True, side_effect=seal_block):
+            # Act
+            retrieved_value = sut.mine()
+        # Assert
+        assert retrieved_value is None
+        assert sut.get_chain() == peer.get_chain()
+        assert list(sut.current_transactions) == [{'data': 'Mined too late'}]
+
+    def test_failed_sealing(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        sut.add_transaction('Not mined')
+
+        with mock.patch.object(BlockchainSUT, '_seal_block',
+                               side_effect=RuntimeError('Pool died')):
+            # Act
+            with pytest.raises(RuntimeError, match='Pool died'):
+                sut.mine()
+        # Assert
+        assert len(sut.get_chain()) == 1
+        assert list(sut.current_transactions) == [{'data': 'Not mined'}]
+        assert sut.cancel_mining() == 0
+
+    def test_transactions_of_a_dropped_block_stay_the_oldest(
+            self, forked_chains_f):
+        # Arrange
+        sut, peer = forked_chains_f(3, 0, 2)
+        sut._mempool = Mempool(max_count=1, eviction=REJECT_NEWEST)
+        sut.add_transaction('Mined too late')
+
+        def seal_block(self, block, stop_event):
+            sut.add_transaction('Newer')
+            sut.evaluate_consensus([peer.get_chain()])
+            return not stop_event.is_set()
+
+        with mock.patch.object(BlockchainSUT, '_seal_block',
+                               autospec=True, side_effect=seal_block):
+            # Act
+            sut.mine()
+        # Assert
+        assert list(sut.current_transactions) == [{'data': 'Mined too late'},
+                                                  {'data': 'Newer'}]
+
+    def test_validation_does_not_block_the_readers(self, w_sample_blocks_f):
+        # Arrange
+        sut = w_sample_blocks_f(2)
+        # Validated again from the genesis
+        sut._chain
+        validating = threading.Event()
+        validated = threading.Event()
+        check_chain = BlockchainSUT._check_chain
+
+        def slow_check_chain(self):
+            validating.set()
+            validated.wait(5)
+            return check_chain(self)
+
+        with mock.patch.object(BlockchainSUT, '_check_chain',
+                               autospec=True, side_effect=slow_check_chain):
+            validator = threading.Thread(target=sut.is_valid)
+            validator.start()
+            validating.wait(5)
+            # Act
+            retrieved_value = sut.get_tip()
+            validated.set()
+            validator.join(5)
+        # Assert
+        assert retrieved_value[0] == 3
+        assert sut.get_validated_height() == 3
+
+    def test_snapshots_while_writing(self, sample_sut):
+        # Arrange
+        sut = sample_sut()
+        writers = readers = 50
+        barrier = threading.Barrier(writers + readers, timeout=5)
+        errors = []
+
+        def write(number):
+            barrier.wait()
+            for transaction in range(5):
+                sut.add_transaction(f'{number} {transaction}')
+            sut.mine()
+
+        def read():
+            barrier.wait()
+            for _ in range(5):
+                chain = sut.get_chain()
+                if validation.find_invalid_link(chain) is not None:
+                    errors.append(len(chain))
+
+        threads = ([threading.Thread(target=write, args=(number, ))
+                    for number in range(writers)] +
+                   [threading.Thread(target=read) for _ in range(readers)])
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        # Assert
+        assert errors == []
+        assert sut.is_valid() == True
+        mined = [transaction['data']
+                 for block in sut.get_chain()[1:]
+                 for transaction in block['transactions']]
+        pending = [transaction['data']
+                   for transaction in sut.current_transactions]
+        assert sorted(mined + pending) == sorted(
+            f'{number} {transaction}'
+            for number in range(writers) for transaction in range(5))
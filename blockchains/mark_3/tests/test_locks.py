@@ -0,0 +1,130 @@
+import pytest
+import threading
+
+from ..locks import ReadWriteLock as ReadWriteLockSUT
+
+
+# Helpers
+
+def start(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+# Tests
+
+class TestReadWriteLock(object):
+    """
+    Test the lock shared by the readers and held alone by a writer
+    """
+
+    def test_readers_share_the_lock(self):
+        # Arrange
+        sut = ReadWriteLockSUT()
+        readers = 5
+        barrier = threading.Barrier(readers, timeout=5)
+        errors = []
+
+        def read():
+            with sut.read():
+                try:
+                    # Every reader holds the lock at the same time
+                    barrier.wait()
+                except threading.BrokenBarrierError as e:
+                    errors.append(e)
+
+        # Act
+        threads = [start(read) for _ in range(readers)]
+        for thread in threads:
+            thread.join(5)
+        # Assert
+        assert errors == []
+
+    def test_writer_waits_for_the_readers(self):
+        # Arrange
+        sut = ReadWriteLockSUT()
+        written = threading.Event()
+
+        def write():
+            with sut.write():
+                written.set()
+
+        # Act
+        with sut.read():
+            thread = start(write)
+            # Assert
+            assert written.wait(0.1) == False
+        thread.join(5)
+        assert written.is_set()
+
+    def test_waiting_writer_goes_before_new_readers(self):
+        # Arrange
+        sut = ReadWriteLockSUT()
+        order = []
+
+        def write():
+            with sut.write():
+                order.append('writer')
+
+        def read():
+            with sut.read():
+                order.append('reader')
+
+        # Act
+        with sut.read():
+            writer = start(write)
+            while not sut._waiting_writers:
+                pass
+            reader = start(read)
+            reader.join(0.1)
+        writer.join(5)
+        reader.join(5)
+        # Assert
+        assert order == ['writer', 'reader']
+
+    def test_writer_takes_the_lock_again_and_reads(self):
+        # Arrange
+        sut = ReadWriteLockSUT()
+        # Act
+        with sut.write():
+            with sut.write():
+                with sut.read():
+                    pass
+        # Assert
+        with sut.write():
+            pass
+        assert sut._writer is None
+        assert sut._readers == 0
+
+    def test_reader_takes_the_lock_again_with_a_waiting_writer(self):
+        # Arrange
+        sut = ReadWriteLockSUT()
+        written = threading.Event()
+
+        def write():
+            with sut.write():
+                written.set()
+
+        # Act
+        with sut.read():
+            thread = start(write)
+            while not sut._waiting_writers:
+                pass
+            # Doesn't wait for the writer waiting for it
+            with sut.read():
+                pass
+        thread.join(5)
+        # Assert
+        assert written.is_set()
+
+    def test_reader_cannot_write(self):
+        # Arrange
+        sut = ReadWriteLockSUT()
+        # Act
+        with sut.read():
+            with pytest.raises(RuntimeError):
+                sut.acquire_write()
+        # Assert
+        with sut.write():
+            pass
@@ -0,0 +1,206 @@
+import pytest
+import threading
+
+from unittest import mock
+
+from .. import miner as SUT
+from ..blockchain import Blockchain
+from .test_blockchain import forked_chains_f, sample_sut
+from ...mark_1.tests.test_blockchain import (sample_transaction_f,
+                                             w_sample_blocks_f)
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def scheduler_f():
+    schedulers = []
+
+    def _make_scheduler(blockchain, **kwargs):
+        scheduler = SUT.MiningScheduler(blockchain, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield _make_scheduler
+    for scheduler in schedulers:
+        scheduler.stop(timeout=5)
+
+
+def seal_until_stopped(self, block, stop_event):
+    """
+    A Proof of Work never found, until cancelled
+    """
+    return not stop_event.wait(5)
+
+
+# Tests
+
+class TestMiningScheduler(object):
+    """
+    Test the mining in the background
+    """
+
+    def test_mines_a_job(self, sample_sut, scheduler_f):
+        # Arrange
+        blockchain = sample_sut()
+        blockchain.add_transaction('Mined')
+        sut = scheduler_f(blockchain)
+        # Act
+        job = sut.submit()
+        # Assert
+        assert job.wait(5) == True
+        assert job.status == SUT.JOB_DONE
+        assert job.block['transactions'] == [{'data': 'Mined'}]
+        assert job.is_valid == True
+        assert job.started >= job.created
+        assert job.finished >= job.started
+        assert sut.get(job.id) is job
+        assert sut.get_stats()['mined'] == 1
+
+    def test_nothing_to_mine(self, sample_sut, scheduler_f):
+        # Arrange
+        sut = scheduler_f(sample_sut())
+        # Act
+        job = sut.submit()
+        # Assert
+        assert job.wait(5) == True
+        assert job.status == SUT.JOB_DONE
+        assert job.block is None
+        assert sut.get_stats()['mined'] == 0
+
+    def test_queued_job_is_shared(self, sample_sut, scheduler_f):
+        # Arrange
+        blockchain = sample_sut()
+        blockchain.add_transaction('Mined')
+        sut = scheduler_f(blockchain)
+        with mock.patch.object(Blockchain, '_seal_block', autospec=True,
+                               side_effect=seal_until_stopped):
+            mining_job = sut.submit()
+            while mining_job.status == SUT.JOB_QUEUED:
+                pass
+            # Act
+            job = sut.submit()
+            # Assert
+            assert sut.submit() is job
+            assert job is not mining_job
+            assert sut.get_stats()['queued'] == 1
+            assert sut.get_stats()['mining'] == mining_job.id
+
+    def test_cancel(self, sample_sut, scheduler_f):
+        # Arrange
+        blockchain = sample_sut()
+        blockchain.add_transaction('Mined')
+        sut = scheduler_f(blockchain)
+        with mock.patch.object(Blockchain, '_seal_block', autospec=True,
+                               side_effect=seal_until_stopped):
+            mining_job = sut.submit()
+            while mining_job.status == SUT.JOB_QUEUED:
+                pass
+            queued_job = sut.submit()
+            # Act
+            sut.cancel(queued_job.id)
+            sut.cancel(mining_job.id)
+            # Assert
+            assert queued_job.status == SUT.JOB_CANCELLED
+            assert mining_job.wait(5) == True
+            assert mining_job.status == SUT.JOB_CANCELLED
+        assert list(blockchain.current_transactions) == [{'data': 'Mined'}]
+        assert len(blockchain.get_chain()) == 1
+        assert sut.get_stats()['cancelled'] == 2
+
+    def test_cancelled_by_a_reorganization(self,
+                                           forked_chains_f,
+                                           scheduler_f):
+        # Arrange
+        blockchain, peer = forked_chains_f(3, 0, 2)
+        blockchain.add_transaction('Mined too late')
+        sut = scheduler_f(blockchain)
+        with mock.patch.object(Blockchain, '_seal_block', autospec=True,
+                               side_effect=seal_until_stopped):
+            job = sut.submit()
+            while job.status == SUT.JOB_QUEUED:
+                pass
+            # Act
+            replaced = blockchain.evaluate_consensus([peer.get_chain()])
+            # Assert
+            assert replaced == True
+            assert job.wait(5) == True
+            assert job.status == SUT.JOB_CANCELLED
+        assert blockchain.get_chain() == peer.get_chain()
+        assert list(blockchain.current_transactions) == [
+            {'data': 'Mined too late'}]
+
+    def test_failed_job(self, sample_sut, scheduler_f):
+        # Arrange
+        blockchain = sample_sut()
+        sut = scheduler_f(blockchain)
+        with mock.patch.object(Blockchain, 'mine', autospec=True,
+                               side_effect=ValueError('Broken')):
+            # Act
+            job = sut.submit()
+            # Assert
+            assert job.wait(5) == True
+        assert job.status == SUT.JOB_FAILED
+        assert job.error == 'ValueError: Broken'
+        assert sut.get_stats()['failed'] == 1
+
+    def test_continuous_mining(self, sample_sut, scheduler_f):
+        # Arrange
+        blockchain = sample_sut()
+        sut = scheduler_f(blockchain, continuous=True, interval=0.01)
+        sut.start()
+        # Act
+        blockchain.add_transaction('Mined without asking')
+        # Assert
+        for _ in range(500):
+            if len(blockchain.get_chain()) == 2:
+                break
+            threading.Event().wait(0.01)
+        assert blockchain.last_block['transactions'] == [
+            {'data': 'Mined without asking'}]
+        assert len(sut) == 1
+
+    def test_finished_jobs_are_forgotten(self, sample_sut, scheduler_f):
+        # Arrange
+        sut = scheduler_f(sample_sut(), max_jobs=2)
+        jobs = []
+        # Act
+        for _ in range(4):
+            jobs.append(sut.submit())
+            jobs[-1].wait(5)
+        sut.submit().wait(5)
+        # Assert
+        assert len(sut) == 3
+        assert sut.get(jobs[0].id) is None
+        assert sut.get(jobs[-1].id) is jobs[-1]
+
+    def test_stop(self, sample_sut, scheduler_f):
+        # Arrange
+        blockchain = sample_sut()
+        blockchain.add_transaction('Mined')
+        sut = scheduler_f(blockchain)
+        with mock.patch.object(Blockchain, '_seal_block', autospec=True,
+                               side_effect=seal_until_stopped):
+            job = sut.submit()
+            while job.status == SUT.JOB_QUEUED:
+                pass
+            # Act
+            sut.stop(timeout=5)
+        # Assert
+        assert job.status == SUT.JOB_CANCELLED
+        assert sut._thread is None
+
+    def test_done_callback(self, sample_sut, scheduler_f):
+        # Arrange
+        sut = scheduler_f(sample_sut())
+        finished = []
+        with mock.patch.object(Blockchain, '_seal_block', autospec=True,
+                               side_effect=seal_until_stopped):
+            job = sut.submit()
+            job.add_done_callback(finished.append)
+            # Act
+            sut.cancel(job.id)
+            job.wait(5)
+        job.add_done_callback(finished.append)
+        # Assert
+        assert finished == [job, job]
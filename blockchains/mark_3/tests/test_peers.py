@@ -0,0 +1,112 @@
+import pytest
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from ..peers import PeerSessions as PeerSessionsSUT
+
+
+# Fixtures
+
+@pytest.fixture(scope="function")
+def keep_alive_peer():
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            connections.append(self.client_address)
+            super().setup()
+
+        def do_GET(self):
+            body = b'{"chain": []}'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'127.0.0.1:{server.server_address[1]}', connections
+    server.shutdown()
+    server.server_close()
+
+
+# Tests
+
+class TestGetMethod(object):
+    """
+    Test the sessions returned for the peers
+    """
+
+    def test_session_is_reused(self):
+        # Arrange
+        sut = PeerSessionsSUT()
+        # Act
+        first_session = sut.get('localhost:8081')
+        second_session = sut.get('localhost:8081')
+        # Assert
+        assert first_session is second_session
+        assert sut.get_stats() == {
+            'hits': 1,
+            'misses': 1,
+            'evictions': 0,
+            'sessions': 1,
+        }
+
+    def test_one_session_per_peer(self):
+        # Arrange
+        sut = PeerSessionsSUT()
+        # Act
+        first_session = sut.get('localhost:8081')
+        second_session = sut.get('localhost:8082')
+        # Assert
+        assert first_session is not second_session
+        assert len(sut) == 2
+
+    def test_least_recently_used_is_evicted(self):
+        # Arrange
+        sut = PeerSessionsSUT(max_peers=2)
+        first_session = sut.get('localhost:8081')
+        sut.get('localhost:8082')
+        sut.get('localhost:8081')
+        # Act
+        sut.get('localhost:8083')
+        # Assert
+        assert len(sut) == 2
+        assert sut.evictions == 1
+        assert sut.get('localhost:8081') is first_session
+
+    def test_stale_session_is_evicted(self):
+        # Arrange
+        sut = PeerSessionsSUT(max_idle=60)
+        with mock.patch('blockchains.mark_3.peers.monotonic',
+                        return_value=0):
+            stale_session = sut.get('localhost:8081')
+        with mock.patch('blockchains.mark_3.peers.monotonic',
+                        return_value=61):
+            # Act
+            retrieved_value = sut.get('localhost:8081')
+        # Assert
+        assert retrieved_value is not stale_session
+        assert sut.evictions == 1
+        assert sut.misses == 2
+
+    def test_connection_is_kept_alive(self, keep_alive_peer):
+        # Arrange
+        peer, connections = keep_alive_peer
+        sut = PeerSessionsSUT()
+        # Act
+        for request in range(3):  # pylint: disable=unused-variable
+            response = sut.get(peer).get(f'http://{peer}/chain', timeout=5)
+            assert response.status_code == 200
+        sut.close()
+        # Assert
+        assert len(connections) == 1
+        assert len(sut) == 0